@@ -0,0 +1,281 @@
+"""
+Benchmarks for the Python pipeline stages.
+
+For every corpus size a synthetic corpus (see `synthetic_corpus.py`) is generated
+in a temporary directory, then:
+
+- `functions`: `clean_text`, `to_ascii_text`, `_deep_clean` and the JSON parse and
+  write of the cleaner (with the `json_codec` backend in use) are timed over a sample of the corpus (best of `--repeat` runs);
+- `clean`: `cleaner.main` runs end to end on the whole corpus, followed by an
+  incremental re-run that should find nothing to do;
+- `enrich` (with `--enrich N`): N cleaned articles are enriched by each engine
+  against `stub_ollama_server.py` with the given latency and slots. The adaptive
+  rate controller starts (and stays capped) at `--rate-limit-rps`, by default high
+  enough that it never throttles, so the results measure the stub's latency and
+  slots and the engine rather than the controller's ramp-up. The other enrichment
+  settings (MAX_WORKERS, OLLAMA_CONCURRENCY, TOKENS_PER_MINUTE, ...) are read from
+  the environment as in production; the controller settings in effect are
+  recorded with each run.
+
+Results are printed (or written with `--output`) as JSON; `--compare` prints
+the change of every timing against an earlier results file.
+
+    python benchmarks/bench_pipeline.py --sizes 1000 10000 --workers 4 --output bench.json
+    python benchmarks/bench_pipeline.py --sizes 1000 --enrich 200 --latency 0.2 --slots 4 --compare bench.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.append(str(REPO_ROOT / "data_cleaner"))
+import cleaner  # noqa: E402
+import json_codec  # noqa: E402
+from synthetic_corpus import SCHEMAS, generate  # noqa: E402
+
+
+def _best_of(repeat: int, run) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def _timing(calls: int, seconds: float, input_bytes: int = 0) -> dict:
+    result = {"calls": calls, "seconds": round(seconds, 6),
+              "us_per_call": round(seconds / calls * 1e6, 2) if calls else None}
+    if input_bytes:
+        result["mb_per_s"] = round(input_bytes / 1024 / 1024 / seconds, 2) if seconds else None
+    return result
+
+
+def _raw_files(root: Path) -> list[tuple[Path, Path]]:
+    """`(file, articles_dir)` for every raw article under `root`, in a stable order."""
+    files = []
+    for source_dir in sorted(root.iterdir()):
+        articles_dir = source_dir / "articles"
+        if articles_dir.is_dir():
+            files.extend((path, articles_dir) for path in sorted(articles_dir.rglob("*.json")))
+    return files
+
+
+def bench_functions(root: Path, sample: int, repeat: int) -> dict:
+    files = _raw_files(root)
+    # Spread the sample over the corpus so both schemas are represented
+    step = max(1, len(files) // sample)
+    files = files[::step][:sample]
+    raw_files = [path.read_bytes() for path, _ in files]
+    bodies = [json_codec.decode_raw_article(data).body for data in raw_files]
+    raw_bytes = sum(len(data) for data in raw_files)
+    records = [cleaner._transform_file(path, articles_dir, articles_dir, return_record=True)[3]
+               for path, articles_dir in files]
+    body_bytes = sum(len(body.encode("utf-8")) for body in bodies)
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        out_path = Path(out_dir) / "article.json"
+
+        def write_all():
+            for record in records:
+                with open(out_path, "wb") as f:
+                    f.write(json_codec.dumps_article(record))
+
+        write_seconds = _best_of(repeat, write_all)
+    record_bytes = sum(len(json_codec.dumps_article(record)) for record in records)
+
+    return {
+        "json_parse": _timing(len(raw_files),
+                              _best_of(repeat, lambda: [json_codec.decode_raw_article(d) for d in raw_files]),
+                              raw_bytes),
+        "clean_text": _timing(len(bodies), _best_of(repeat, lambda: [cleaner.clean_text(b) for b in bodies]),
+                              body_bytes),
+        "to_ascii_text": _timing(len(bodies), _best_of(repeat, lambda: [cleaner.to_ascii_text(b) for b in bodies]),
+                                 body_bytes),
+        "_deep_clean": _timing(len(records), _best_of(repeat, lambda: [cleaner._deep_clean(r) for r in records])),
+        "json_write": _timing(len(records), write_seconds, record_bytes),
+    }
+
+
+def _reset_outputs(root: Path):
+    shutil.rmtree(root / "progress", ignore_errors=True)
+    for source_dir in root.iterdir():
+        for subdir in ("transformed_articles", "transformed_store", "transformed_articles_ner"):
+            shutil.rmtree(source_dir / subdir, ignore_errors=True)
+
+
+def bench_clean(root: Path, count: int, workers: int, output_format: str, dedupe: bool) -> dict:
+    _reset_outputs(root)
+    args = dict(workers=workers, output_format=output_format, dedupe=dedupe)
+    with contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        cleaner.main(str(root), **args)
+        seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        cleaner.main(str(root), **args)
+        rerun_seconds = time.perf_counter() - started
+    return {"workers": workers, "output_format": output_format, "dedupe": dedupe,
+            "seconds": round(seconds, 3), "articles_per_s": round(count / seconds, 1),
+            "incremental_rerun_seconds": round(rerun_seconds, 3)}
+
+
+def bench_enrich(count: int, schema: str, seed: int, engines: list[str], latency: float, slots: int,
+                 batch_tokens: int, rate_limit_rps: float) -> list[dict]:
+    # stub_ollama_server and enricher are imported lazily: only this stage needs the enrichment dependencies
+    sys.path.append(str(REPO_ROOT / "data_enrichment"))
+    from stub_ollama_server import start_stub_server
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        generate(root, count, schema, seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            cleaner.main(str(root), dedupe=False)
+        for engine in engines:
+            server, state = start_stub_server(latency=latency, slots=slots)
+            os.environ.update({
+                "ENRICHMENT_PROVIDER": "ollama",
+                "OLLAMA_API_URL": f"http://127.0.0.1:{server.server_address[1]}",
+                "RESPONSE_CACHE_PATH": "off",
+                "ENTITY_GRAPH_PATH": "off",
+                "ENTITY_ALIASES_PATH": "off",
+                "RATE_LIMIT_INITIAL_RPS": str(rate_limit_rps),
+                "RATE_LIMIT_MAX_RPS": str(rate_limit_rps),
+            })
+            sys.modules.pop("enricher", None)  # fresh module state (clients, rate controller) per run
+            import enricher
+            enricher.INPUT_BASE_DIR = enricher.OUTPUT_BASE_DIR = root
+            enricher.SOURCES = [d.name for d in root.iterdir() if d.is_dir() and d.name != "progress"]
+            enricher.ENRICHMENT_ENGINE = engine
+            enricher.BATCH_TOKEN_BUDGET = batch_tokens
+            for source in enricher.SOURCES:
+                shutil.rmtree(root / source / enricher.OUTPUT_SUBDIR, ignore_errors=True)
+
+            started = time.perf_counter()
+            enricher.main()
+            seconds = time.perf_counter() - started
+            server.shutdown()
+            enriched = sum(1 for _ in root.glob(f"*/{enricher.OUTPUT_SUBDIR}/**/*.json"))
+            stats = state.snapshot()
+            results.append({"engine": engine, "articles": enriched, "seconds": round(seconds, 3),
+                            "articles_per_s": round(enriched / seconds, 2), "requests": stats["requests"],
+                            "peak_in_flight": stats["peak_in_flight"], "stub_latency_s": latency,
+                            "stub_slots": slots, "batch_tokens": batch_tokens,
+                            "rate_control": {"initial_rps": enricher.RATE_LIMIT_INITIAL_RPS,
+                                             "max_rps": enricher.RATE_LIMIT_MAX_RPS,
+                                             "tokens_per_minute": enricher.TOKENS_PER_MINUTE,
+                                             "target_latency_s": enricher.TARGET_LATENCY_SECONDS}})
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(value, prefix: str = "") -> dict:
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(_flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+        return flat
+    if isinstance(value, list):
+        flat = {}
+        for item in value:
+            # Runs are matched by what they measured, not by position
+            label = item.get("size") or item.get("engine") if isinstance(item, dict) else None
+            flat.update(_flatten(item, f"{prefix}[{label}]"))
+        return flat
+    return {prefix: value}
+
+
+def compare(baseline: dict, current: dict):
+    """Prints every timing present in both results, with its relative change."""
+    before, after = _flatten(baseline["runs"]), _flatten(current["runs"])
+    for key in sorted(before.keys() & after.keys()):
+        if not key.endswith(("seconds", "us_per_call")) or not before[key] or after[key] is None:
+            continue
+        change = (after[key] - before[key]) / before[key]
+        print(f"{key:60} {before[key]:>12} → {after[key]:>12}  {change:+.1%}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the cleaner and the enricher on synthetic data.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000], help="Corpus sizes (default: 1000).")
+    parser.add_argument("--schema", choices=SCHEMAS, default="both", help="Raw schema of the corpus.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--sample", type=int, default=1000, help="Articles used for the per-function timings.")
+    parser.add_argument("--repeat", type=int, default=3, help="Per-function timings keep the best of N runs.")
+    parser.add_argument("--workers", type=int, default=1, help="Cleaner worker processes.")
+    parser.add_argument("--output-format", choices=cleaner.OUTPUT_FORMATS, default="files")
+    parser.add_argument("--no-dedupe", action="store_true", help="Benchmark the cleaner without near-duplicates.")
+    parser.add_argument("--enrich", type=int, default=0, metavar="N", help="Also enrich N articles (default: 0).")
+    parser.add_argument("--engines", nargs="+", choices=("threads", "async"), default=["threads", "async"])
+    parser.add_argument("--latency", type=float, default=0.2, help="Stub model latency per request, in seconds.")
+    parser.add_argument("--slots", type=int, default=4, help="Requests the stub model serves at once.")
+    parser.add_argument("--batch-tokens", type=int, default=int(os.environ.get("ENRICHMENT_BATCH_TOKENS", 0)),
+                        help="ENRICHMENT_BATCH_TOKENS for the enrichment runs (default: 0, no batching).")
+    parser.add_argument("--rate-limit-rps", type=float, default=1000.0,
+                        help="RATE_LIMIT_INITIAL_RPS and RATE_LIMIT_MAX_RPS for the enrichment runs "
+                             "(default: 1000, so the rate controller doesn't throttle the stub).")
+    parser.add_argument("--output", help="Write the results to this file instead of stdout.")
+    parser.add_argument("--compare", metavar="BASELINE", help="Print changes against an earlier results file.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, force=True)
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "cleaner_version": cleaner.CLEANER_VERSION,
+            "json_backend": json_codec.BACKEND,
+            "args": vars(args),
+        },
+        "runs": [],
+    }
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            started = time.perf_counter()
+            corpus_bytes = generate(root, size, args.schema, args.seed)
+            run = {"size": size, "schema": args.schema, "corpus_mb": round(corpus_bytes / 1024 / 1024, 1),
+                   "generate_seconds": round(time.perf_counter() - started, 3)}
+            print(f"⏱️  {size} articles: per-function timings...", file=sys.stderr)
+            run["functions"] = bench_functions(root, args.sample, args.repeat)
+            print(f"⏱️  {size} articles: cleaning end to end...", file=sys.stderr)
+            run["clean"] = bench_clean(root, size, args.workers, args.output_format, not args.no_dedupe)
+        results["runs"].append(run)
+    if args.enrich:
+        print(f"⏱️  Enriching {args.enrich} articles...", file=sys.stderr)
+        results["runs"].append({"size": f"enrich-{args.enrich}",
+                                "enrich": bench_enrich(args.enrich, args.schema, args.seed, args.engines,
+                                                       args.latency, args.slots, args.batch_tokens,
+                                                       args.rate_limit_rps)})
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n", encoding="utf-8")
+        print(f"✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), results)
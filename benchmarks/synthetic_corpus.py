@@ -0,0 +1,148 @@
+"""
+Synthetic raw-article corpus for benchmarks.
+
+Writes articles in the scraper's layout, `<root>/<source>/articles/YYYY/MM/DD/<date>_<hash>.json`,
+in either raw schema the cleaner accepts:
+
+- `flat` (source dir `flat`): the APP/Dawn scraper output, with `title`, `content`
+  (a string), `source`, `link`, `retrievedAt`, `date_published`, ...
+- `nested` (source dir `nested`): `metadata`, `source_info` and `content.article_body`.
+
+Bodies use a Zipf-distributed vocabulary with APP-like (~350 words) and
+Dawn-like (~750 words) lengths. They carry the artifacts `clean_text` exists
+for: smart punctuation, soft hyphens (raw and `&shy;`), zero-width characters,
+non-ASCII names, paragraph breaks and the occasional ad snippet. The same seed
+always produces the same corpus.
+
+    python synthetic_corpus.py /tmp/bench_data --count 10000 --schema both
+"""
+import argparse
+import hashlib
+import json
+import random
+from datetime import date, timedelta
+from pathlib import Path
+
+SCHEMAS = ("flat", "nested", "both")
+_SYLLABLES = ("ka", "ra", "mi", "to", "sha", "ban", "dar", "is", "la", "mad", "pur", "nu", "gal", "zer", "on",
+              "tan", "al", "ham", "bad", "ki", "sta", "re", "po", "lit", "gov", "ern", "ment", "na", "tion", "al")
+_NAMES = ("Shehbaz Sharif", "Imran Khan", "Asif Ali Zardari", "Maryam Nawaz", "Bilawal Bhutto Zardari",
+          "Ishaq Dar", "Mohsin Naqvi", "Islamabad", "Karachi", "Lahore", "Peshawar", "Quetta", "Zürich",
+          "São Paulo", "Ankara", "Beijing", "Senate", "National Assembly", "State Bank of Pakistan", "PTI")
+_AD_SNIPPET = "(adsbygoogle=window.adsbygoogle||[]).push({});"
+
+
+class CorpusGenerator:
+    """Deterministic article factory; `article(i, schema)` returns `(source, rel_path, record)`."""
+
+    def __init__(self, seed: int = 1, dirty_rate: float = 0.02, start: date = date(2025, 1, 1), days: int = 365):
+        self.rng = random.Random(seed)
+        self.dirty_rate = dirty_rate
+        self.start = start
+        self.days = days
+        vocabulary = {self.rng.choice(_SYLLABLES) + self.rng.choice(_SYLLABLES) + self.rng.choice(("", *_SYLLABLES))
+                      for _ in range(6000)}
+        self.vocabulary = sorted(vocabulary)
+        self.rng.shuffle(self.vocabulary)
+        # Zipf-like frequencies, so common words repeat as they do in news text
+        self.cum_weights = []
+        total = 0.0
+        for rank in range(1, len(self.vocabulary) + 1):
+            total += 1.0 / rank
+            self.cum_weights.append(total)
+
+    def _word(self) -> str:
+        rng = self.rng
+        if rng.random() < 0.03:
+            return rng.choice(_NAMES)
+        word = rng.choices(self.vocabulary, cum_weights=self.cum_weights)[0]
+        if rng.random() < self.dirty_rate:
+            artifact = rng.randrange(5)
+            middle = len(word) // 2
+            if artifact == 0:
+                word = word[:middle] + "\u00ad" + word[middle:]  # soft hyphen
+            elif artifact == 1:
+                word = word[:middle] + "&shy;" + word[middle:]
+            elif artifact == 2:
+                word += "\u200b"  # zero-width space
+            elif artifact == 3:
+                word = f"“{word}”"  # smart quotes
+            else:
+                word = f"{word} —"  # em dash
+        return word
+
+    def body(self, mean_words: int, paragraph_break: str) -> str:
+        rng = self.rng
+        words = max(40, int(rng.lognormvariate(0, 0.4) * mean_words))
+        paragraphs, sentence = [], []
+        for i in range(words):
+            sentence.append(self._word())
+            if len(sentence) >= rng.randint(12, 28) or i == words - 1:
+                text = " ".join(sentence)
+                paragraphs.append(text[0].upper() + text[1:] + ".")
+                sentence = []
+        if rng.random() < 0.1:
+            paragraphs.insert(rng.randrange(len(paragraphs)), _AD_SNIPPET)
+        return paragraph_break.join(paragraphs)
+
+    def article(self, i: int, schema: str) -> tuple[str, str, dict]:
+        rng = self.rng
+        day = self.start + timedelta(days=i % self.days)
+        article_hash = hashlib.md5(f"{schema}-{i}".encode()).hexdigest()
+        rel_path = f"{day:%Y/%m/%d}/{day.isoformat()}_{article_hash}.json"
+        title = " ".join(self._word() for _ in range(rng.randint(6, 14))).capitalize()
+        published = f"{day.isoformat()}T{rng.randrange(24):02d}:{rng.randrange(60):02d}:00.000Z"
+        link = f"https://example.com/news/{article_hash}"
+        categories = rng.sample(("National", "Business", "World", "Sports", "Pakistan"), rng.randint(0, 2))
+        if schema == "flat":
+            record = {
+                "title": title,
+                "author": None,
+                "content": self.body(350, "\n"),
+                "tags": [],
+                "categories": categories,
+                "image": None,
+                "retrievedAt": f"{day.isoformat()}T23:00:00.000Z",
+                "source": "APP",
+                "link": link,
+                "dateList": day.isoformat(),
+                "date_published": published,
+            }
+        else:
+            record = {
+                "source_info": {"source_name": "DAWN", "source_link": link,
+                                "retrieved_at": f"{day.isoformat()}T23:00:00.000Z"},
+                "metadata": {"title": title, "author": rng.choice((None, "Staff Reporter")),
+                             "date_published": published, "image_url": None, "categories": categories},
+                "content": {"article_body": self.body(750, "\n\n")},
+            }
+        return schema, rel_path, record
+
+
+def generate(root, count: int, schema: str = "both", seed: int = 1, dirty_rate: float = 0.02) -> int:
+    """Writes `count` articles under `root` and returns the number of bytes written."""
+    generator = CorpusGenerator(seed=seed, dirty_rate=dirty_rate)
+    root = Path(root)
+    written = 0
+    for i in range(count):
+        article_schema = schema if schema != "both" else SCHEMAS[i % 2]
+        source, rel_path, record = generator.article(i, article_schema)
+        path = root / source / "articles" / rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = json.dumps(record, indent=2, ensure_ascii=False).encode("utf-8")
+        path.write_bytes(data)
+        written += len(data)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic raw-article corpus.")
+    parser.add_argument("root", help="Data root to write into (e.g. /tmp/bench_data).")
+    parser.add_argument("--count", type=int, default=1000)
+    parser.add_argument("--schema", choices=SCHEMAS, default="both")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--dirty-rate", type=float, default=0.02, help="Share of words carrying an artifact.")
+    args = parser.parse_args()
+
+    size = generate(args.root, args.count, args.schema, args.seed, args.dirty_rate)
+    print(f"✅ Wrote {args.count} article(s), {size / 1024 / 1024:.1f} MB, to {args.root}")
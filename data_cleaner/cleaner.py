@@ -1,12 +1,30 @@
 import shutil
 import argparse
-import json
 import re
 import math
 from pathlib import Path
 import sys
 import unicodedata
 import codecs
+import hashlib
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Shared pipeline modules live in ../data_common in the repo and next to this script in the image
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'data_common'))
+from article_store import ArticleStore, SHARD_GRANULARITIES  # noqa: E402
+from file_inventory import FileInventory, walk_json_files  # noqa: E402
+import json_codec  # noqa: E402
+from partition import Partition  # noqa: E402
+from near_duplicates import NearDuplicateIndex, month_of, signature as near_duplicate_signature  # noqa: E402
+from search_index import SearchIndex  # noqa: E402
+import corpus_stats  # noqa: E402
+from corpus_stats import ArticleFeatures, CorpusStats, count_words, normalize_categories  # noqa: E402
+from stage_metrics import StageMetrics, metrics_dir  # noqa: E402
 
 # Characters that are invisible or formatting controls commonly leaking from web copy
 # We strip these to avoid artifacts like "PakisSHYtan" (U+00AD soft hyphen embedded in words).
@@ -40,13 +58,80 @@ _TRANSLATE_MAP = {
     ord("\u00A0"): " ",   # NO-BREAK SPACE → regular space
 }
 
+# Deletions and mappings touch disjoint code points, so a single combined table
+# gives the same result as applying them one after the other.
+_INVISIBLE_TRANSLATE_MAP = {**_INVISIBLE_DELETE_MAP, **_TRANSLATE_MAP}
+
+# Map common typographic punctuation to ASCII
+_SMART_PUNCTUATION_MAP = {
+    ord("\u2018"): "'",  # left single quote
+    ord("\u2019"): "'",  # right single quote / apostrophe
+    ord("\u201A"): "'",  # single low-9 quote
+    ord("\u201B"): "'",  # single high-reversed-9 quote
+    ord("\u201C"): '"',  # left double quote
+    ord("\u201D"): '"',  # right double quote
+    ord("\u201E"): '"',  # double low-9 quote
+    ord("\u2026"): "...", # ellipsis
+    ord("\u2013"): "-",  # en dash
+    ord("\u2014"): "-",  # em dash
+    ord("\u2212"): "-",  # minus sign
+    ord("\u00B7"): "-",  # middle dot → dash
+    ord("\u2022"): "-",  # bullet → dash
+    ord("\u00AB"): '"',  # «
+    ord("\u00BB"): '"',  # »
+    ord("\u00A0"): " ",  # NBSP → space
+    ord("\u2010"): "-",  # hyphen
+    ord("\u2011"): "-",  # non-breaking hyphen
+}
+
 # Precompiled regex patterns for cleaning
-_RE_HTML_SHY = re.compile(r"(?:&shy;|&#173;)", flags=re.IGNORECASE)
 _RE_LITERAL_SHY_INNER = re.compile(r"(?i)(?<=\w)shy(?=\w)")
 _RE_INTRAWORD_HYPHENS = re.compile(r"(?<=\w)[\u00AD\u2010\u2011](?=\w)")
 _RE_GOOGLE_ADS = re.compile(r"\(adsbygoogle=window\.adsbygoogle\|\|\[\]\)\.push\(\{\}\);")
-_RE_NEWLINES_TABS = re.compile(r"[\n\t]+")
-_RE_WHITESPACE = re.compile(r"\s+")
+_RE_SHY_ANY = re.compile(r"shy", flags=re.IGNORECASE)
+# Any whitespace that `' '.join(text.split())` would change: leading/trailing,
+# consecutive, or anything other than a plain space.
+_RE_IRREGULAR_WHITESPACE = re.compile(r"^\s|\s$|\s\s|[^\S ]")
+_INTRAWORD_HYPHEN_CHARS = ("\u00AD", "\u2010", "\u2011")
+
+# Bump whenever a change to the transformation should re-clean previously cleaned
+# files; the manifest of every source is invalidated when this differs.
+CLEANER_VERSION = "3"
+
+# Incremental state lives next to the scraper's progress files (data/progress/...)
+MANIFEST_SUBDIR = Path("progress") / "cleaner"
+# Optional hand-over file: paths (files or YYYY/MM/DD directories, relative to the
+# data root) that changed since the last run. When present, no full walk is done.
+CHANGED_PATHS_FILE = MANIFEST_SUBDIR / "changed_paths.txt"
+# Persist the manifest every N results so an interrupted run keeps its progress
+MANIFEST_SAVE_EVERY = 1000
+# Commit search index additions every N articles: an open write transaction locks out the
+# enricher, which indexes every article it saves (see search_index.py)
+SEARCH_INDEX_COMMIT_EVERY = 25
+
+# Output backends: one pretty-printed JSON file per article, or consolidated JSONL shards
+OUTPUT_FORMATS = ("files", "jsonl")
+STORE_SUBDIR = "transformed_store"
+# Near-duplicate index shared by all sources, one file per month (see near_duplicates.py)
+NEAR_DUPLICATES_SUBDIR = Path("progress") / "near_duplicates"
+
+
+def _is_clean(text: str) -> bool:
+    """
+    Conservative check that `clean_text(text)` would return `text` unchanged.
+
+    Holds for ASCII strings with no escape sequences, no soft-hyphen residue,
+    no ad snippet and already-collapsed whitespace. This is what lets us skip
+    a second cleaning pass over fields that have already been cleaned.
+    """
+    return (
+        text.isascii()
+        and "\\" not in text
+        and "&#173;" not in text
+        and "adsbygoogle" not in text
+        and _RE_SHY_ANY.search(text) is None
+        and _RE_IRREGULAR_WHITESPACE.search(text) is None
+    )
 
 
 def normalize_invisible_chars(text: str) -> str:
@@ -60,10 +145,8 @@ def normalize_invisible_chars(text: str) -> str:
     """
     if not isinstance(text, str):
         return ""
-    # Fast path: delete listed invisibles
-    text = text.translate(_INVISIBLE_DELETE_MAP)
-    # Normalize certain spacing characters
-    text = text.translate(_TRANSLATE_MAP)
+    # Fast path: delete listed invisibles and normalize certain spacing characters
+    text = text.translate(_INVISIBLE_TRANSLATE_MAP)
     # Normalize general presentation forms
     text = unicodedata.normalize("NFKC", text)
     return text
@@ -77,9 +160,14 @@ def clean_text(text):
     - Replaces HTML soft hyphen entities (&shy; and &#173;) if present.
     - Replaces multiple newlines with a single space.
     - Removes extra whitespace and trims.
+
+    Text that is already clean is returned as-is, so running it again over
+    cleaned fields costs a single scan.
     """
     if not isinstance(text, str):
         return ""
+    if _is_clean(text):
+        return text
 
     # 0. Unescape characters (e.g., convert '\\"' to '"')
     # This is a safe operation that standardizes escape sequences.
@@ -90,24 +178,39 @@ def clean_text(text):
 
     # -0.5 Handle cases where soft hyphen leaked as literal letters "SHY" inside words
     # Some scrapers mistakenly decode `&shy;` to the text "SHY". Remove only when it's in the middle of a word.
-    text = re.sub(r'(?i)(?<=\w)shy(?=\w)', '', text)
+    text = _RE_LITERAL_SHY_INNER.sub('', text)
 
     # 0. Remove invisible formatting characters and normalize Unicode
     text = normalize_invisible_chars(text)
 
     # 0.1 Remove discretionary/nb hyphens that appear inside words (keep real hyphens in compounds)
     # Removes U+00AD (soft hyphen), U+2010 (hyphen), U+2011 (non‑breaking hyphen) only when between word chars
-    text = re.sub(r'(?<=\w)[\u00AD\u2010\u2011](?=\w)', '', text)
-    
+    if any(ch in text for ch in _INTRAWORD_HYPHEN_CHARS):
+        text = _RE_INTRAWORD_HYPHENS.sub('', text)
+
     # 1. Remove Google Ads snippet
-    text = re.sub(r'\(adsbygoogle=window\.adsbygoogle\|\|\[\]\)\.push\({}\);', '', text)
-    
-    # 2. Replace newlines and tabs with a space
-    text = re.sub(r'[\n\t]+', ' ', text)
-    
-    # 3. Remove extra whitespace and trim
-    cleaned_text = re.sub(r'\s+', ' ', text).strip()
-    return cleaned_text
+    if "adsbygoogle" in text:
+        text = _RE_GOOGLE_ADS.sub('', text)
+
+    # 2-3. Collapse newlines, tabs and other whitespace runs to a single space and trim
+    # (str.split() and `\s` agree on what counts as whitespace).
+    return ' '.join(text.split())
+
+
+def _fold_to_ascii(text: str) -> str:
+    """
+    The ASCII half of `to_ascii_text`, for text that has already been through
+    `normalize_invisible_chars` (e.g. the output of `clean_text`).
+    """
+    text = text.translate(_SMART_PUNCTUATION_MAP)
+
+    # Decompose and strip non-ASCII
+    text = unicodedata.normalize("NFKD", text)
+    text = text.encode("ascii", "ignore").decode("ascii", "ignore")
+
+    # Collapse whitespace
+    return ' '.join(text.split())
+
 
 def to_ascii_text(text: str) -> str:
     """
@@ -121,38 +224,7 @@ def to_ascii_text(text: str) -> str:
         return ""
 
     # Normalize invisibles and spacing first
-    text = normalize_invisible_chars(text)
-
-    # Map common typographic punctuation to ASCII
-    smart_map = {
-        "\u2018": "'",  # left single quote
-        "\u2019": "'",  # right single quote / apostrophe
-        "\u201A": "'",  # single low-9 quote
-        "\u201B": "'",  # single high-reversed-9 quote
-        "\u201C": '"',  # left double quote
-        "\u201D": '"',  # right double quote
-        "\u201E": '"',  # double low-9 quote
-        "\u2026": "...", # ellipsis
-        "\u2013": "-",  # en dash
-        "\u2014": "-",  # em dash
-        "\u2212": "-",  # minus sign
-        "\u00B7": "-",  # middle dot → dash
-        "\u2022": "-",  # bullet → dash
-        "\u00AB": '"',  # «
-        "\u00BB": '"',  # »
-        "\u00A0": " ",  # NBSP → space
-        "\u2010": "-",  # hyphen
-        "\u2011": "-",  # non-breaking hyphen
-    }
-    text = text.translate({ord(k): v for k, v in smart_map.items()})
-
-    # Decompose and strip non-ASCII
-    text = unicodedata.normalize("NFKD", text)
-    text = text.encode("ascii", "ignore").decode("ascii", "ignore")
-
-    # Collapse whitespace
-    text = re.sub(r"\s+", " ", text).strip()
-    return text
+    return _fold_to_ascii(normalize_invisible_chars(text))
 
 def get_reading_time_minutes(word_count, words_per_minute=200):
     """Calculates estimated reading time in minutes."""
@@ -161,7 +233,10 @@ def get_reading_time_minutes(word_count, words_per_minute=200):
     return math.ceil(word_count / words_per_minute)
 
 def _deep_clean(obj):
-    """Recursively apply clean_text to all string values inside dicts/lists/tuples."""
+    """
+    Recursively apply clean_text to all string values inside dicts/lists/tuples.
+    Strings that are already clean are passed through by `clean_text`'s fast path.
+    """
     if isinstance(obj, str):
         return clean_text(obj)
     if isinstance(obj, dict):
@@ -173,12 +248,37 @@ def _deep_clean(obj):
     return obj
 
 
-def process_article_file(file_path: Path, base_input_dir: Path, base_output_dir: Path):
+def _lap(timings: Dict[str, float], phase: str, started: float) -> float:
+    """Records the time since `started` as `phase` and returns the current clock."""
+    now = time.perf_counter()
+    timings[phase] = now - started
+    return now
+
+
+def _transform_file(file_path: Path, base_input_dir: Path, base_output_dir: Path,
+                    known_hash: Optional[str] = None, return_record: bool = False,
+                    with_signature: bool = False, timings: Optional[Dict[str, float]] = None
+                    ) -> Tuple[str, Optional[str], Optional[str], Optional[dict], Optional[List[int]],
+                               Optional[ArticleFeatures]]:
     """
     Reads an article JSON, cleans and transforms it into the new,
-    enriched structure, and saves it. This function no longer checks for
-    the output file's existence, as that logic is now handled in the main loop.
+    enriched structure, and saves it.
+
+    Returns a `(status, message, content_hash, record, signature, features)` tuple instead of printing so
+    that it can run inside a worker process; status is one of 'written', 'unchanged',
+    'skipped' or 'failed'. If the file's SHA-256 equals `known_hash` and its output
+    already exists, nothing is rewritten and 'unchanged' is returned.
+
+    With `return_record` the transformed dict is returned instead of written, so the
+    caller can append it to an `ArticleStore` (the caller then vouches for `known_hash`).
+    With `with_signature` the near-duplicate signature of the cleaned body is returned
+    as well (see `near_duplicates.py`). `features` (word count, lengths, categories) is
+    set for 'written' articles and feeds the corpus statistics. The seconds spent in each phase (read, hash,
+    parse, clean, ascii, transform, signature, serialize, write) are stored in `timings`.
     """
+    if timings is None:
+        timings = {}
+    started = time.perf_counter()
     try:
         # Determine the output path
         relative_path = file_path.relative_to(base_input_dir)
@@ -186,51 +286,51 @@ def process_article_file(file_path: Path, base_input_dir: Path, base_output_dir:
         
         # Defensively check for empty files before trying to parse
         if file_path.stat().st_size == 0:
-            print(f"⚠️  Skipping empty file: {file_path}")
-            return
+            return 'skipped', f"⚠️  Skipping empty file: {file_path}", None, None, None, None
+
+        raw_bytes = file_path.read_bytes()
+        started = _lap(timings, 'read', started)
+        content_hash = hashlib.sha256(raw_bytes).hexdigest()
+        started = _lap(timings, 'hash', started)
+        if content_hash == known_hash and (return_record or output_path.exists()):
+            # Only the timestamp changed (e.g. the file was re-saved with the same content)
+            return 'unchanged', None, content_hash, None, None, None
 
-        with open(file_path, 'r', encoding='utf-8') as f:
-            original_data = json.load(f)
+        # Both raw schemas (flat and nested) are normalized into one RawArticle
+        article = json_codec.decode_raw_article(raw_bytes)
+        started = _lap(timings, 'parse', started)
 
         # --- Transformation ---
         
-        # 1. Clean the core content (handle both flat and nested schemas)
-        raw_content = original_data.get('content')
-        if isinstance(raw_content, dict):
-            raw_body = raw_content.get('article_body')
-        else:
-            raw_body = raw_content
-        # Clean text (Unicode-preserving), then convert to ASCII-safe for article_body only
-        cleaned_body_unicode = clean_text(raw_body)
-        cleaned_body = to_ascii_text(cleaned_body_unicode)
-
-        # Title might be nested under metadata in some schemas
-        raw_title = original_data.get('title')
-        if raw_title is None and isinstance(original_data.get('metadata'), dict):
-            raw_title = original_data['metadata'].get('title')
-        cleaned_title = clean_text(raw_title)
+        # 1. Clean the core content
+        # Clean text (Unicode-preserving), then convert to ASCII-safe for article_body only.
+        # clean_text has already removed invisibles and NFKC-normalized, so only the ASCII fold remains.
+        cleaned_body_unicode = clean_text(article.body)
+        started = _lap(timings, 'clean', started)
+        cleaned_body = _fold_to_ascii(cleaned_body_unicode)
+        started = _lap(timings, 'ascii', started)
+
+        cleaned_title = clean_text(article.title)
         
         # 2. Perform simple enrichments
-        word_count = len(cleaned_body.split()) if isinstance(cleaned_body, str) else 0
+        # cleaned_body is ASCII with single spaces, so counting the separators avoids building a word list
+        word_count = count_words(cleaned_body) if isinstance(cleaned_body, str) else 0
         reading_time = get_reading_time_minutes(word_count)
         
         # 3. Build the new, structured dictionary
         transformed_data = {
             "article_id": file_path.stem, # Use filename as ID
             "source_info": {
-                "source_name": (original_data.get('source')
-                                  or (original_data.get('source_info') or {}).get('source_name')),
-                "source_link": (original_data.get('link')
-                                  or (original_data.get('source_info') or {}).get('source_link')),
-                "retrieved_at": (original_data.get('retrievedAt')
-                                  or (original_data.get('source_info') or {}).get('retrieved_at'))
+                "source_name": article.source_name,
+                "source_link": article.source_link,
+                "retrieved_at": article.retrieved_at
             },
             "metadata": {
                 "title": cleaned_title,
-                "author": original_data.get('author') or (original_data.get('metadata') or {}).get('author'),
-                "date_published": original_data.get('date_published') or (original_data.get('metadata') or {}).get('date_published'),
-                "image_url": original_data.get('image') or (original_data.get('metadata') or {}).get('image_url'),
-                "categories": original_data.get('categories') or (original_data.get('metadata') or {}).get('categories', []),
+                "author": article.author,
+                "date_published": article.date_published,
+                "image_url": article.image_url,
+                "categories": article.categories,
                 "word_count": word_count,
                 "reading_time_minutes": reading_time
             },
@@ -248,31 +348,278 @@ def process_article_file(file_path: Path, base_input_dir: Path, base_output_dir:
         
         # Deep clean all string values before saving
         transformed_data = _deep_clean(transformed_data)
+        started = _lap(timings, 'transform', started)
         
         # --- End Transformation ---
 
+        features = ArticleFeatures(word_count, len(cleaned_body), len(cleaned_title.split()), reading_time,
+                                   normalize_categories(article.categories))
+        signature = None
+        if with_signature:
+            signature = near_duplicate_signature(cleaned_body)
+            started = _lap(timings, 'signature', started)
+
+        if return_record:
+            return 'written', None, content_hash, transformed_data, signature, features
+
+        data = json_codec.dumps_article(transformed_data)
+        started = _lap(timings, 'serialize', started)
+
         # Ensure the output directory exists
         output_path.parent.mkdir(parents=True, exist_ok=True)
 
-        # Write the NEW, transformed data
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(transformed_data, f, indent=2, ensure_ascii=False)
-        
-        # This print statement is being removed to reduce log noise.
-        # A summary will be provided by the main loop.
-        # print(f"✅ Transformed and saved: {output_path}")
+        # Write the NEW, transformed data (temp file + rename, so a killed run never leaves half a file)
+        json_codec.write_atomic(output_path, data)
+        _lap(timings, 'write', started)
 
-    except json.JSONDecodeError:
-        print(f"❌ Error decoding JSON from: {file_path}")
+        return 'written', None, content_hash, None, signature, features
+
+    except json_codec.DecodeError:
+        return 'failed', f"❌ Error decoding JSON from: {file_path}", content_hash, None, None, None
     except Exception as e:
-        print(f"❌ An unexpected error occurred processing {file_path}: {e}")
+        return 'failed', f"❌ An unexpected error occurred processing {file_path}: {e}", None, None, None, None
+
+
+TransformTask = Tuple[Path, Path, Path, Optional[str], bool, bool]
+TransformResult = Tuple[Path, str, Optional[str], Optional[str], Optional[dict], Optional[List[int]],
+                        Optional[ArticleFeatures], Dict[str, float]]
+
+
+def _transform_task(task: TransformTask) -> TransformResult:
+    """Process-pool entry point: unpacks a task tuple and tags the result with its file and phase timings."""
+    file_path = task[0]
+    timings = {}
+    return (file_path, *_transform_file(*task, timings=timings), timings)
+
+
+def _transform_chunk(tasks: List[TransformTask]) -> List[TransformResult]:
+    """Process-pool entry point for a chunk of tasks, so the per-task IPC cost is amortised."""
+    return [_transform_task(task) for task in tasks]
+
+
+def process_article_file(file_path: Path, base_input_dir: Path, base_output_dir: Path,
+                         store: Optional[ArticleStore] = None) -> str:
+    """
+    Reads an article JSON, cleans and transforms it into the new,
+    enriched structure, and saves it. This function no longer checks for
+    the output file's existence, as that logic is now handled in the main loop.
+
+    If `store` is given the article is appended to that `ArticleStore` instead of
+    being written as `base_output_dir/<relative path>`.
+
+    Returns the status reported by `_transform_file` and prints any message.
+    """
+    status, message, _, record, _, _ = _transform_file(file_path, base_input_dir, base_output_dir,
+                                                       return_record=store is not None)
+    if record is not None:
+        store.put(file_path.relative_to(base_input_dir).as_posix(), record)
+    if message:
+        print(message)
+    return status
+
+
+def _tag_duplicate(record: dict, cluster_id: str) -> dict:
+    """Returns `record` with `duplicate_of` right after `article_id`."""
+    tagged = {"article_id": record.get("article_id"), "duplicate_of": cluster_id}
+    tagged.update((key, value) for key, value in record.items() if key not in tagged)
+    return tagged
+
+
+def _tag_duplicate_file(output_path: Path, cluster_id: str):
+    record = json_codec.load_file(output_path)
+    json_codec.write_article(output_path, _tag_duplicate(record, cluster_id))
+
+
+def _run_transform_tasks(tasks: Iterable[TransformTask], total: int, workers: int,
+                         mp_context=None) -> Iterator[TransformResult]:
+    """
+    Yields `(file_path, status, message, content_hash, record, signature, features, timings)` for every task, either in-process or
+    spread over a process pool. Results are consumed in the parent so progress
+    output and counters stay in one place. `mp_context` picks the pool's start method.
+    """
+    if workers <= 1:
+        yield from map(_transform_task, tasks)
+        return
+
+    # Hand out work in chunks so the per-task IPC cost is amortised, while still
+    # leaving several chunks per worker to balance uneven article sizes. Only a
+    # window of chunks is submitted at a time (`executor.map` would queue every
+    # task up front), so memory stays flat however many files are pending.
+    chunksize = max(1, min(64, total // (workers * 4)))
+    tasks = iter(tasks)
+    chunks = iter(lambda: list(islice(tasks, chunksize)), [])
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as executor:
+        window = deque(executor.submit(_transform_chunk, chunk) for chunk in islice(chunks, workers * 4))
+        while window:
+            results = window.popleft().result()
+            for chunk in islice(chunks, 1):
+                window.append(executor.submit(_transform_chunk, chunk))
+            yield from results
+
+
+def _iter_changed_files(articles_dir: Path, changed: List[Path],
+                        partition: Partition) -> Iterator[Tuple[str, Path, os.stat_result]]:
+    """Same as `walk_json_files`, but limited to the hand-over paths of one source."""
+    for rel in changed:
+        path = articles_dir / rel
+        if path.is_dir():
+            prefix = '' if rel == Path('.') else f"{rel.as_posix()}/"
+            yield from walk_json_files(path, prefix, partition)
+        elif path.suffix == '.json' and path.is_file() and partition.includes(rel.as_posix()):
+            yield rel.as_posix(), path, path.stat()
+
+
+def _read_changed_paths(base_path: Path, list_file: Path) -> Dict[str, List[Path]]:
+    """
+    Parses a hand-over file (one path per line, '#' comments allowed) into
+    `{source: [path relative to <source>/articles, ...]}`. Paths may be absolute
+    or relative to the data root and may point at files or day directories.
+    """
+    changed: Dict[str, List[Path]] = {}
+    for line in list_file.read_text(encoding='utf-8').splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        path = Path(line)
+        if path.is_absolute():
+            try:
+                path = path.relative_to(base_path)
+            except ValueError:
+                print(f"⚠️  Ignoring changed path outside the data root: {line}")
+                continue
+        parts = path.parts
+        if len(parts) < 2 or parts[1] != 'articles':
+            print(f"⚠️  Ignoring changed path that is not under <source>/articles: {line}")
+            continue
+        changed.setdefault(parts[0], []).append(Path(*parts[2:]))
+    return changed
+
+
+def _load_manifest(manifest_path: Path) -> Optional[dict]:
+    """Loads a source manifest, or returns None if it is missing or unreadable."""
+    try:
+        manifest = json_codec.load_file(manifest_path)
+    except FileNotFoundError:
+        return None
+    except (json_codec.DecodeError, OSError) as e:
+        print(f"⚠️  Ignoring unreadable manifest {manifest_path}: {e}")
+        return None
+    if not isinstance(manifest, dict) or not isinstance(manifest.get('files'), dict):
+        print(f"⚠️  Ignoring malformed manifest {manifest_path}")
+        return None
+    return manifest
+
+
+def _partition_manifest_path(manifest_path: Path, partition: Partition) -> Path:
+    """`<source>_manifest.json` -> `<source>_manifest.<partition tag>.json`"""
+    return manifest_path.with_name(f"{manifest_path.stem}.{partition.tag()}{manifest_path.suffix}")
+
 
-def main(data_root_dir: str, force_source: str = None):
+def _merge_partition_manifests(manifest_path: Path, files: Dict[str, list],
+                               only: Optional[Path] = None) -> List[Path]:
+    """
+    Adds the entries of the manifests written by partitioned runs (oldest first, so
+    newer entries win) to `files`, or only those of `only`. Returns the merged paths.
+    """
+    if only is not None:
+        paths = [only] if only.is_file() else []
+    else:
+        paths = sorted(manifest_path.parent.glob(f"{manifest_path.stem}.*{manifest_path.suffix}"),
+                       key=lambda path: path.stat().st_mtime_ns)
+    merged = []
+    for path in paths:
+        partial = _load_manifest(path)
+        if partial is not None and partial.get('cleaner_version') == CLEANER_VERSION:
+            files.update(partial['files'])
+            merged.append(path)
+    return merged
+
+
+def _save_manifest(manifest_path: Path, files: Dict[str, list], partition: Optional[Partition] = None):
+    """
+    Writes the manifest through a temp file + rename so a crash never leaves it half-written.
+    With a `partition`, only its entries are written.
+    """
+    if partition is not None:
+        files = {rel: entry for rel, entry in files.items() if partition.includes(rel)}
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    json_codec.write_atomic(manifest_path, json_codec.dumps({"cleaner_version": CLEANER_VERSION, "files": files}))
+
+
+def main(data_root_dir: str, force_source: str = None, workers: int = 1, changed_list: str = None,
+         output_format: str = "files", shard_by: str = "day", dedupe: bool = True,
+         on_article: Optional[Callable[[str, str, Optional[dict]], None]] = None, mp_context=None,
+         rescan: bool = False, partition: Optional[Partition] = None, stats: bool = True,
+         search_index: Optional[SearchIndex] = None):
     """
     Main function to walk through the data directory and process all articles.
+
+    Each source keeps a manifest under `data/progress/cleaner/` recording the mtime,
+    size and SHA-256 of every raw file together with `CLEANER_VERSION`, so only new
+    or changed files are cleaned. If `changed_list` names an existing hand-over file,
+    only the paths it lists are examined instead of walking the whole tree; the file
+    is removed once the run completes.
+
+    Otherwise the raw tree is listed through a `FileInventory` (see `file_inventory.py`),
+    which only re-lists the directories whose mtime moved since the last run. `rescan`
+    (implied by `force_source`) lists and stats every file again, e.g. after raw files
+    were edited in place.
+
+    A `partition` limits the run to a date range and/or a hash shard (see `partition.py`),
+    so several cleaners can split a backfill; only the matching day directories are
+    walked, and `force_source` only deletes the partition's outputs. A partitioned run
+    keeps its progress in `<source>_manifest.<partition>.json`, so concurrent runs never
+    overwrite each other's manifest; the next unpartitioned run merges those files.
+
+    With `workers` > 1 the files of each source are transformed in a process pool.
+    With `output_format='jsonl'` articles are appended to daily or monthly shards in
+    `<source>/transformed_store` (see `article_store.py`) instead of one file each.
+    With `dedupe`, every cleaned article is added to the cross-source near-duplicate
+    index and near-duplicates get a `duplicate_of` cluster id (see `near_duplicates.py`).
+
+    `on_article(source, rel_path, record)` is called in this process for every article
+    as soon as its output is written (`record` is None for 'files' output, so read it
+    from `transformed_articles/<rel_path>`). A blocking callback slows the cleaner
+    down, which is how the streaming pipeline applies backpressure.
+
+    Once a search index has been built (see `search_index.py`), every written
+    article is added to it as well; pass `search_index` to share an open index with
+    another stage in this process (it is then left open). With `stats` (and numpy installed), each written
+    article's word count, lengths and categories are recorded in per-month tables
+    under `data/progress/corpus_stats/` (see `corpus_stats.py`).
+
+    Per-phase timings and file counts are written to `data/progress/metrics/cleaner.json`
+    and `cleaner.prom` while the run progresses (see `stage_metrics.py`).
     """
     print("🚀 Starting data transformation process...")
+    partition = partition or Partition()
+    if not partition.is_everything:
+        print(f"Limited to {partition.describe()}.")
+        if partition.shard_count > 1 and dedupe:
+            print("⚠️  Shards share the near-duplicate index; run them one at a time, or with --no-dedupe, "
+                  "to keep every shard's entries.")
+    use_store = output_format == "jsonl"
+    if use_store:
+        print(f"Writing to consolidated JSONL store, sharded by {shard_by}.")
+    if workers > 1:
+        print(f"Using a pool of {workers} worker processes.")
     base_path = Path(data_root_dir)
+
+    changed_paths = None
+    changed_list_path = Path(changed_list) if changed_list else None
+    if changed_list_path and changed_list_path.is_file():
+        changed_paths = _read_changed_paths(base_path, changed_list_path)
+        print(f"Using changed-path hand-over: {changed_list_path}")
+    elif changed_list_path:
+        print(f"No changed-path hand-over at {changed_list_path}; scanning all articles.")
+
+    duplicate_index = NearDuplicateIndex(base_path / NEAR_DUPLICATES_SUBDIR) if dedupe else None
+    if stats and not corpus_stats.HAVE_NUMPY:
+        print("⚠️  numpy is not installed; skipping corpus statistics.")
+        stats = False
+    if stats and partition.shard_count > 1:
+        print("⚠️  Shards share the corpus statistics; two shards saving the same month at once can lose rows "
+              "(repair with `corpus_stats.py --rebuild`).")
     
     # Determine which sources to process
     if force_source:
@@ -286,48 +633,215 @@ def main(data_root_dir: str, force_source: str = None):
             return
         print(f"Found sources: {', '.join(sources_to_process)}")
 
+    own_search_index = search_index is None
+    if own_search_index:
+        search_index = SearchIndex.open_existing(base_path)
+    indexed = 0
+    stage = 'cleaner' if partition.is_everything else f"cleaner.{partition.tag()}"
+    metrics = StageMetrics(stage, metrics_dir(base_path))
     for source in sources_to_process:
         articles_dir = base_path / source / 'articles'
         transformed_articles_dir = base_path / source / 'transformed_articles'
+        store_dir = base_path / source / STORE_SUBDIR
+        # Each backend tracks its own progress, so switching formats re-cleans into the new one
+        manifest_name = f"{source}_store_manifest.json" if use_store else f"{source}_manifest.json"
+        manifest_path = base_path / MANIFEST_SUBDIR / manifest_name
+        # Partitioned runs record their progress separately (see `main`'s docstring)
+        progress_path, progress_partition = manifest_path, None
+        if not partition.is_everything:
+            progress_path, progress_partition = _partition_manifest_path(manifest_path, partition), partition
 
         if not articles_dir.is_dir():
             print(f"⚠️  Source '{source}' articles directory not found at '{articles_dir}'. Skipping.")
             continue
             
-        if force_source and transformed_articles_dir.exists():
+        if force_source and transformed_articles_dir.exists() and partition.is_everything:
             print(f"🔥 Force option enabled. Deleting existing transformed data for '{source}'...")
             shutil.rmtree(transformed_articles_dir)
             print(f"🗑️  Deleted: {transformed_articles_dir}")
+        elif force_source and transformed_articles_dir.exists():
+            print(f"🔥 Force option enabled. Deleting transformed data for '{source}', {partition.describe()}...")
+            removed = 0
+            for _, path, _ in walk_json_files(transformed_articles_dir, partition=partition):
+                path.unlink()
+                removed += 1
+            print(f"🗑️  Deleted {removed} file(s) from {transformed_articles_dir}")
+        if force_source and stats and partition.is_everything:
+            shutil.rmtree(base_path / corpus_stats.STATS_SUBDIR / source, ignore_errors=True)
+        if force_source and use_store and store_dir.exists():
+            if partition.is_everything:
+                shutil.rmtree(store_dir)
+                print(f"🗑️  Deleted: {store_dir}")
+            else:
+                print("   Re-cleaned articles are appended to the store and supersede their stored copies.")
 
         print(f"\n🔎 Processing source: {source}")
+        store = ArticleStore(store_dir, shard_by=shard_by) if use_store else None
+        source_stats = CorpusStats(base_path / corpus_stats.STATS_SUBDIR, source) if stats else None
+
+        # 1. Load what previous runs already cleaned
+        manifest = None if force_source and partition.is_everything else _load_manifest(manifest_path)
+        adopted = set()
+        if manifest is None:
+            files = {}
+            if not force_source and use_store:
+                adopted = {rel for _, _, _, rel in store.entries().values()}
+            elif not force_source and transformed_articles_dir.is_dir():
+                # First run with a manifest: treat existing outputs as cleaned (one-off walk)
+                adopted = {rel for rel, _, _ in walk_json_files(transformed_articles_dir)}
+            if adopted:
+                print(f"   No manifest yet; adopting {len(adopted)} existing transformed file(s).")
+        elif manifest.get('cleaner_version') != CLEANER_VERSION:
+            files = {}
+            print(f"   Cleaner version changed ({manifest.get('cleaner_version')} → {CLEANER_VERSION}); re-cleaning all articles.")
+        else:
+            files = manifest['files']
+        merged_manifests = []
+        if not (force_source and progress_partition is None):
+            only = None if progress_partition is None else progress_path
+            merged_manifests = _merge_partition_manifests(manifest_path, files, only)
+        if force_source and progress_partition is not None:
+            files = {rel: entry for rel, entry in files.items() if not partition.includes(rel)}
+
+        # 2. Candidate files: the hand-over list if we have one, otherwise a single walk of the tree
+        full_walk = changed_paths is None or bool(force_source)
+        inventory = None
+        if full_walk:
+            inventory = FileInventory.for_tree(base_path, articles_dir)
+            candidates = inventory.walk(rescan=rescan or bool(force_source), partition=partition)
+        else:
+            candidates = _iter_changed_files(articles_dir, changed_paths.get(source, []), partition)
+
+        # 3. Keep only files that are new or whose mtime/size differ from the manifest
+        #    (as `rel -> (mtime_ns, size, known_hash)`; paths are rebuilt as tasks are handed out)
+        seen = set()
+        pending: Dict[str, Tuple[int, int, Optional[str]]] = {}
+        for rel, path, st in candidates:
+            seen.add(rel)
+            entry = files.get(rel)
+            if entry is not None and entry[0] == st.st_mtime_ns and entry[1] == st.st_size:
+                continue
+            if entry is None and rel in adopted:
+                files[rel] = [st.st_mtime_ns, st.st_size, None, 'written']
+                continue
+            known_hash = entry[2] if entry is not None else None
+            if use_store and path.stem not in store:
+                known_hash = None  # the hash can only vouch for an output that exists
+            pending[rel] = (st.st_mtime_ns, st.st_size, known_hash)
+
+        if full_walk:
+            # Forget raw files that no longer exist
+            for rel in files.keys() - seen:
+                if partition.includes(rel):
+                    del files[rel]
+                    if source_stats is not None:
+                        source_stats.remove(rel)
+            inventory.save()
+            print(f"   Listed {len(seen)} raw file(s): {inventory.describe()}.")
+
+        total_files = len(pending)
         
-        # 1. Get all source file paths
-        all_source_files = {p.relative_to(articles_dir): p for p in articles_dir.rglob('*.json')}
-        
-        # 2. Get all destination file paths
-        transformed_articles_dir.mkdir(parents=True, exist_ok=True) # Ensure dir exists
-        all_dest_files = {p.relative_to(transformed_articles_dir): p for p in transformed_articles_dir.rglob('*.json')}
-        
-        # 3. Calculate the difference
-        files_to_process_relative = all_source_files.keys() - all_dest_files.keys()
-        
-        # 4. Get the full paths for the files that need processing
-        files_to_process = [all_source_files[rel_path] for rel_path in files_to_process_relative]
-        
-        total_files = len(files_to_process)
-        
-        if not files_to_process:
+        if not pending:
+            if source_stats is not None:
+                source_stats.save()
+            _save_manifest(progress_path, files, progress_partition)
+            if progress_partition is None:
+                for path in merged_manifests:
+                    path.unlink()  # folded into the source manifest
             print("   ✅ No new articles to process. All transformed files are up to date.")
             continue
 
-        print(f"   Found {total_files} new article(s) to process.")
+        print(f"   Found {total_files} new or changed article(s) to process.")
+        transformed_articles_dir.mkdir(parents=True, exist_ok=True) # Ensure dir exists
 
-        # Now, loop through the smaller list and process one by one.
-        for i, file_path in enumerate(files_to_process):
+        # Process the smaller list; progress, counts and the manifest are handled in this (parent) process.
+        tasks = ((articles_dir / rel, articles_dir, transformed_articles_dir, known_hash, use_store, dedupe)
+                 for rel, (_, _, known_hash) in pending.items())
+        counts = {'written': 0, 'unchanged': 0, 'skipped': 0, 'failed': 0}
+        duplicates = 0
+        results = _run_transform_tasks(tasks, total_files, workers, mp_context)
+        for i, (file_path, status, message, content_hash, record, signature, features, timings) in enumerate(results):
             # Provide some progress feedback
-            print(f"   [{i+1}/{total_files}] Processing: {file_path.name}")
-            process_article_file(file_path, articles_dir, transformed_articles_dir)
-
+            print(f"   [{i+1}/{total_files}] Processed: {file_path.name}")
+            if message:
+                print(message)
+            counts[status] += 1
+            metrics.observe_phases(timings)
+            metrics.count('files')
+            metrics.count(f'files_{status}')
+
+            rel = file_path.relative_to(articles_dir).as_posix()
+            mtime_ns, size, _ = pending[rel]
+            cluster_id = None
+            if signature is not None:
+                with metrics.timer('dedupe'):
+                    cluster_id = duplicate_index.assign(f"{source}/{rel[:-len('.json')]}", month_of(rel), signature)
+                if cluster_id is not None:
+                    duplicates += 1
+                    metrics.count('near_duplicates')
+                    print(f"   🔁 Near-duplicate of {cluster_id}")
+                    if record is not None:
+                        record = _tag_duplicate(record, cluster_id)
+                    else:
+                        _tag_duplicate_file(transformed_articles_dir / rel, cluster_id)
+            if record is not None:
+                with metrics.timer('store_write'):
+                    store.put(rel, record)
+            if source_stats is not None and features is not None:
+                source_stats.add(rel, features, duplicate=cluster_id is not None)
+            if search_index is not None and status == 'written':
+                with metrics.timer('index'):
+                    search_index.add_cleaned(base_path, source, rel, record)
+                    indexed += 1
+                    if indexed % SEARCH_INDEX_COMMIT_EVERY == 0:
+                        search_index.commit()
+            if on_article is not None and status == 'written':
+                on_article(source, rel, record)
+            if status == 'failed' and content_hash is None:
+                # Not a problem with the content (e.g. an I/O error): retry on the next run
+                files.pop(rel, None)
+            else:
+                files[rel] = [mtime_ns, size, content_hash, status]
+            if (i + 1) % MANIFEST_SAVE_EVERY == 0:
+                if store is not None:
+                    store.flush()  # the manifest must never get ahead of the stored data
+                if duplicate_index is not None:
+                    duplicate_index.save()
+                if search_index is not None:
+                    search_index.commit()
+                if source_stats is not None:
+                    with metrics.timer('stats'):
+                        source_stats.save()
+                _save_manifest(progress_path, files, progress_partition)
+            metrics.maybe_write()
+
+        if store is not None:
+            store.close()
+        if duplicate_index is not None:
+            duplicate_index.save()
+        if search_index is not None:
+            search_index.commit()
+        if source_stats is not None:
+            with metrics.timer('stats'):
+                source_stats.save()
+            print(f"   📐 Corpus stats: {source_stats.describe()}.")
+        _save_manifest(progress_path, files, progress_partition)
+        if progress_partition is None:
+            for path in merged_manifests:
+                path.unlink()  # folded into the source manifest
+        print(f"   📊 Summary for '{source}': {counts['written']} transformed, {counts['unchanged']} unchanged, "
+              f"{counts['skipped']} skipped, {counts['failed']} failed, {duplicates} near-duplicate(s).")
+
+    if changed_paths is not None and partition.is_everything:
+        # The hand-over has been consumed; the next run without one falls back to a full walk
+        changed_list_path.unlink()
+    elif changed_paths is not None:
+        print(f"Keeping {changed_list_path}: this run only covered {partition.describe()}.")
+
+    if search_index is not None and own_search_index:
+        search_index.close()
+    metrics.write()
+    print(f"\n📈 Metrics: {metrics.describe()}")
     print("\n✅ Data transformation process completed.")
 
 if __name__ == '__main__':
@@ -344,6 +858,75 @@ if __name__ == '__main__':
         type=str,
         help="Force reprocessing of a specific source (e.g., 'app' or 'dawn') by deleting its existing transformed data."
     )
+    parser.add_argument(
+        '--workers',
+        metavar='N',
+        type=int,
+        default=int(os.environ.get('CLEANER_WORKERS', 1)),
+        help="Number of worker processes used to transform files (default: 1, or $CLEANER_WORKERS). "
+             "Use 0 to use one worker per CPU core."
+    )
+    parser.add_argument(
+        '--changed-list',
+        metavar='FILE',
+        type=str,
+        help="Hand-over file listing changed raw article paths (files or YYYY/MM/DD directories, relative to "
+             f"the data root). If it exists, only those paths are examined, e.g. <data_dir>/{CHANGED_PATHS_FILE.as_posix()}."
+    )
+    parser.add_argument(
+        '--output-format',
+        choices=OUTPUT_FORMATS,
+        default=os.environ.get('CLEANER_OUTPUT_FORMAT', 'files'),
+        help="'files' writes one JSON per article to transformed_articles/ (default); "
+             f"'jsonl' appends compact records to sharded files in {STORE_SUBDIR}/."
+    )
+    parser.add_argument(
+        '--shard-by',
+        choices=SHARD_GRANULARITIES,
+        default=os.environ.get('CLEANER_SHARD_BY', 'day'),
+        help="Shard granularity for --output-format jsonl (default: day)."
+    )
+    parser.add_argument(
+        '--no-dedupe',
+        action='store_true',
+        default=os.environ.get('CLEANER_DEDUPE', '1') == '0',
+        help="Don't build the near-duplicate index or tag articles with 'duplicate_of' (or set CLEANER_DEDUPE=0)."
+    )
+    parser.add_argument(
+        '--no-stats',
+        action='store_true',
+        default=os.environ.get('CLEANER_STATS', '1') == '0',
+        help="Don't record per-article word counts and categories for corpus_stats.py (or set CLEANER_STATS=0)."
+    )
+    parser.add_argument(
+        '--rescan',
+        action='store_true',
+        help="Ignore the cached directory listings and stat every raw file (use after editing raw files in place)."
+    )
+    parser.add_argument(
+        '--from',
+        dest='date_from',
+        metavar='YYYY-MM-DD',
+        help="Only process articles dated on or after this day (only matching YYYY/MM/DD directories are walked)."
+    )
+    parser.add_argument(
+        '--to',
+        dest='date_to',
+        metavar='YYYY-MM-DD',
+        help="Only process articles dated on or before this day."
+    )
+    parser.add_argument(
+        '--shard',
+        metavar='I/N',
+        help="Only process the articles whose id hashes to shard I of N (0-based), so N runs split the work."
+    )
     
     args = parser.parse_args()
-    main(data_root_dir=args.data_dir, force_source=args.force)
\ No newline at end of file
+    try:
+        partition = Partition(args.date_from, args.date_to, args.shard)
+    except ValueError as e:
+        parser.error(str(e))
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    main(data_root_dir=args.data_dir, force_source=args.force, workers=workers, changed_list=args.changed_list,
+         output_format=args.output_format, shard_by=args.shard_by, dedupe=not args.no_dedupe,
+         rescan=args.rescan, partition=partition, stats=not args.no_stats)
\ No newline at end of file
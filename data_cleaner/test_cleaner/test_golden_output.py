@@ -0,0 +1,34 @@
+"""
+Golden-output check for `cleaner.py`.
+
+Every raw article JSON in this folder is run through `process_article_file` and the
+result must be byte-identical to the file of the same name in `./golden/`.
+Run with: python -m pytest data_cleaner/test_cleaner
+
+If a change to the cleaner is *meant* to alter the output, regenerate the golden
+files from the new code and review the diff before committing them.
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+HERE = Path(__file__).resolve().parent
+GOLDEN_DIR = HERE / 'golden'
+
+# Make `cleaner.py` in the parent folder importable (same approach as test_cleaner.ipynb)
+sys.path.insert(0, str(HERE.parent))
+from cleaner import process_article_file  # noqa: E402
+
+RAW_FILES = sorted(HERE.glob('*.json'))
+
+
+@pytest.mark.filterwarnings("ignore::DeprecationWarning")
+@pytest.mark.parametrize('raw_file', RAW_FILES, ids=[p.name for p in RAW_FILES])
+def test_output_matches_golden(raw_file: Path, tmp_path: Path):
+    status = process_article_file(raw_file, HERE, tmp_path)
+
+    assert status == 'written'
+    produced = (tmp_path / raw_file.name).read_bytes()
+    expected = (GOLDEN_DIR / raw_file.name).read_bytes()
+    assert produced == expected
@@ -0,0 +1,114 @@
+"""
+Regression checks for the cleaner's content-hash manifest (incremental runs).
+Run with: python -m pytest data_cleaner/test_cleaner
+"""
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+HERE = Path(__file__).resolve().parent
+
+# Make `cleaner.py` in the parent folder importable (same approach as test_cleaner.ipynb)
+sys.path.insert(0, str(HERE.parent))
+import cleaner  # noqa: E402
+
+RAW_FILES = sorted(HERE.glob('2025-*.json'))
+
+
+@pytest.fixture
+def data_root(tmp_path: Path, monkeypatch) -> Path:
+    # Every run lists the tree again, so these checks don't depend on the inventory cache
+    monkeypatch.setenv('FILE_INVENTORY', 'off')
+    for i, raw_file in enumerate(RAW_FILES):
+        target = tmp_path / 'dawn' / 'articles' / '2025' / '01' / f'{i + 1:02d}' / raw_file.name
+        target.parent.mkdir(parents=True)
+        shutil.copy(raw_file, target)
+    return tmp_path
+
+
+def run(data_root: Path, **kwargs):
+    cleaner.main(str(data_root), dedupe=False, stats=False, **kwargs)
+
+
+def manifest(data_root: Path) -> dict:
+    return json.loads((data_root / cleaner.MANIFEST_SUBDIR / 'dawn_manifest.json').read_text())
+
+
+def outputs(data_root: Path) -> dict:
+    out_dir = data_root / 'dawn' / 'transformed_articles'
+    return {p.relative_to(out_dir).as_posix(): p.stat().st_mtime_ns for p in out_dir.rglob('*.json')}
+
+
+def test_second_run_rewrites_nothing(data_root: Path, capsys):
+    run(data_root)
+    first = outputs(data_root)
+    assert len(first) == len(RAW_FILES)
+    assert all(entry[3] == 'written' for entry in manifest(data_root)['files'].values())
+
+    run(data_root)
+    assert outputs(data_root) == first
+    assert "No new articles to process" in capsys.readouterr().out
+
+
+def test_same_content_with_new_mtime_is_not_rewritten(data_root: Path):
+    run(data_root)
+    first = outputs(data_root)
+    rel, entry = next(iter(manifest(data_root)['files'].items()))
+    raw = data_root / 'dawn' / 'articles' / rel
+    os.utime(raw, ns=(entry[0] + 10**9, entry[0] + 10**9))
+
+    run(data_root)
+    assert outputs(data_root) == first
+    updated = manifest(data_root)['files'][rel]
+    assert updated[0] == entry[0] + 10**9
+    assert updated[2] == entry[2]
+
+
+def test_changed_content_is_cleaned_again(data_root: Path):
+    run(data_root)
+    first = outputs(data_root)
+    rel, entry = next(iter(manifest(data_root)['files'].items()))
+    raw = data_root / 'dawn' / 'articles' / rel
+    raw.write_bytes(raw.read_bytes() + b'\n')  # same article, different bytes
+
+    run(data_root)
+    second = outputs(data_root)
+    assert second[rel] != first[rel]
+    assert {k: v for k, v in second.items() if k != rel} == {k: v for k, v in first.items() if k != rel}
+    assert manifest(data_root)['files'][rel][2] != entry[2]
+
+
+def test_removed_raw_files_leave_the_manifest(data_root: Path):
+    run(data_root)
+    rel = next(iter(manifest(data_root)['files']))
+    (data_root / 'dawn' / 'articles' / rel).unlink()
+
+    run(data_root)
+    assert rel not in manifest(data_root)['files']
+    assert len(manifest(data_root)['files']) == len(RAW_FILES) - 1
+
+
+def test_missing_output_is_rewritten_despite_matching_hash(data_root: Path):
+    run(data_root)
+    rel, entry = next(iter(manifest(data_root)['files'].items()))
+    (data_root / 'dawn' / 'transformed_articles' / rel).unlink()
+    raw = data_root / 'dawn' / 'articles' / rel
+    os.utime(raw, ns=(entry[0] + 10**9, entry[0] + 10**9))
+
+    run(data_root)
+    assert (data_root / 'dawn' / 'transformed_articles' / rel).is_file()
+
+
+def test_cleaner_version_change_cleans_everything_again(data_root: Path, monkeypatch):
+    run(data_root)
+    first = outputs(data_root)
+    monkeypatch.setattr(cleaner, 'CLEANER_VERSION', cleaner.CLEANER_VERSION + '-next')
+
+    run(data_root)
+    second = outputs(data_root)
+    assert all(second[rel] != first[rel] for rel in first)
+    assert manifest(data_root)['cleaner_version'] == cleaner.CLEANER_VERSION
@@ -0,0 +1,39 @@
+"""
+Regression checks for `near_duplicates.NearDuplicateIndex`.
+Run with: python -m pytest data_cleaner/test_cleaner
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+HERE = Path(__file__).resolve().parent
+
+# near_duplicates.py lives in ../../data_common, next to cleaner.py in the image
+sys.path.insert(0, str(HERE.parent.parent / 'data_common'))
+import near_duplicates  # noqa: E402
+from near_duplicates import NearDuplicateIndex, month_of, signature  # noqa: E402
+
+BODY = " ".join(f"word{i} appears in the shared story body" for i in range(40))
+EDITED_BODY = BODY.replace("word3 ", "changed ")
+
+
+def test_reindexed_representative_is_not_its_own_duplicate(tmp_path: Path):
+    index = NearDuplicateIndex(tmp_path)
+    rel_a, rel_b = "2025/03/01/a.json", "2025/03/02/b.json"
+
+    assert index.assign("app/2025/03/01/a", month_of(rel_a), signature(BODY)) is None
+    assert index.assign("dawn/2025/03/02/b", month_of(rel_b), signature(BODY)) == "app/2025/03/01/a"
+
+    # The representative's raw file changed and it is cleaned again
+    assert index.assign("app/2025/03/01/a", month_of(rel_a), signature(EDITED_BODY)) is None
+
+
+@pytest.mark.parametrize('text', [BODY, EDITED_BODY, "Ünïcode words and 1234 numbers " * 20, "a b c d e " * 200])
+def test_numpy_and_python_signatures_match(text: str):
+    np = pytest.importorskip('numpy')
+    assert near_duplicates.np is np
+    tokens = near_duplicates._token_hashes(text)
+
+    assert near_duplicates._signature_numpy(tokens) == near_duplicates._signature_python(tokens)
+    assert signature(text) == near_duplicates._signature_python(tokens)
@@ -0,0 +1,214 @@
+"""
+Consolidated storage for transformed articles.
+
+Instead of one pretty-printed JSON file per article, records are appended as
+compact JSON lines to daily or monthly shards:
+
+    <root>/YYYY/MM/YYYY-MM-DD.jsonl    (shard_by='day')
+    <root>/YYYY/YYYY-MM.jsonl          (shard_by='month')
+
+Every shard has an `.idx` sidecar with one `article_id<TAB>offset<TAB>length<TAB>rel_path`
+line per record, so a single article can be read with one seek. Re-writing an
+article appends a new line; the index always points at the latest copy.
+Shards can be exported to Parquet (requires pyarrow) for columnar analytics.
+"""
+import argparse
+import json
+import os
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+
+import json_codec
+
+SHARD_SUFFIX = ".jsonl"
+INDEX_SUFFIX = ".idx"
+SHARD_GRANULARITIES = ("day", "month")
+
+# (shard path relative to the store root, byte offset, byte length, original relative path)
+IndexEntry = Tuple[str, int, int, str]
+
+
+def shard_for(rel_path: str, shard_by: str = "day") -> str:
+    """
+    Maps an article's `YYYY/MM/DD/<id>.json` relative path to its shard path.
+    Paths that don't follow the date layout go to `misc.jsonl`.
+    """
+    parts = Path(rel_path).parts
+    if len(parts) >= 4 and all(p.isdigit() for p in parts[:3]):
+        year, month, day = parts[:3]
+        if shard_by == "month":
+            return f"{year}/{year}-{month}{SHARD_SUFFIX}"
+        return f"{year}/{month}/{year}-{month}-{day}{SHARD_SUFFIX}"
+    return f"misc{SHARD_SUFFIX}"
+
+
+class ArticleStore:
+    """
+    Append-only JSONL article store with a per-shard offset index.
+
+    Intended for a single writer process (the cleaner funnels all writes through
+    its parent process); any number of readers can open the same root.
+    """
+
+    def __init__(self, root, shard_by: str = "day"):
+        if shard_by not in SHARD_GRANULARITIES:
+            raise ValueError(f"shard_by must be one of {SHARD_GRANULARITIES}, got '{shard_by}'")
+        self.root = Path(root)
+        self.shard_by = shard_by
+        self._index: Optional[Dict[str, IndexEntry]] = None
+        self._writers: Dict[str, Tuple[BinaryIO, BinaryIO]] = {}
+
+    # --- Index ---
+
+    def _load_index(self) -> Dict[str, IndexEntry]:
+        if self._index is None:
+            index: Dict[str, IndexEntry] = {}
+            if self.root.is_dir():
+                # Sorted so that, if an id ever lands in two shards, the later shard wins
+                for idx_path in sorted(self.root.rglob(f"*{INDEX_SUFFIX}")):
+                    shard = idx_path.relative_to(self.root).as_posix()[:-len(INDEX_SUFFIX)]
+                    shard_path = self.root / shard
+                    data_size = shard_path.stat().st_size if shard_path.exists() else 0
+                    with open(idx_path, "r", encoding="utf-8") as f:
+                        for line in f:
+                            fields = line.rstrip("\n").split("\t")
+                            if len(fields) != 4:
+                                continue  # partially written line from an interrupted run
+                            article_id, offset, length, rel_path = fields
+                            offset, length = int(offset), int(length)
+                            if offset + length > data_size:
+                                continue  # the OS persisted the index line but not its data before a crash
+                            index[article_id] = (shard, offset, length, rel_path)
+            self._index = index
+        return self._index
+
+    def __contains__(self, article_id: str) -> bool:
+        return article_id in self._load_index()
+
+    def __len__(self) -> int:
+        return len(self._load_index())
+
+    def entries(self) -> Dict[str, IndexEntry]:
+        """Returns `{article_id: (shard, offset, length, rel_path)}` for the latest copy of every article."""
+        return dict(self._load_index())
+
+    # --- Writing ---
+
+    def _writer(self, shard: str) -> Tuple[BinaryIO, BinaryIO]:
+        handles = self._writers.get(shard)
+        if handles is None:
+            shard_path = self.root / shard
+            shard_path.parent.mkdir(parents=True, exist_ok=True)
+            handles = (open(shard_path, "ab"), open(f"{shard_path}{INDEX_SUFFIX}", "ab"))
+            self._writers[shard] = handles
+        return handles
+
+    def put(self, rel_path: str, record: dict) -> None:
+        """Appends `record` (which must carry an `article_id`) to the shard for `rel_path`."""
+        article_id = record["article_id"]
+        shard = shard_for(rel_path, self.shard_by)
+        data_f, idx_f = self._writer(shard)
+        line = json_codec.dumps(record) + b"\n"
+        offset = data_f.tell()
+        data_f.write(line)
+        # Hand the data to the OS before the index line that points at it, so a crash of this
+        # process can only orphan data. After an OS crash the index may still be ahead of the
+        # data file; `_load_index` skips entries past its end.
+        data_f.flush()
+        idx_f.write(f"{article_id}\t{offset}\t{len(line)}\t{rel_path}\n".encode("utf-8"))
+        self._load_index()[article_id] = (shard, offset, len(line), rel_path)
+
+    def flush(self) -> None:
+        for data_f, idx_f in self._writers.values():
+            data_f.flush()
+            idx_f.flush()
+
+    def close(self) -> None:
+        for data_f, idx_f in self._writers.values():
+            data_f.close()
+            idx_f.close()
+        self._writers.clear()
+
+    def __enter__(self) -> "ArticleStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # --- Reading ---
+
+    def get(self, article_id: str) -> Optional[dict]:
+        """Returns the latest stored copy of an article, or None if it isn't in the store."""
+        entry = self._load_index().get(article_id)
+        if entry is None:
+            return None
+        shard, offset, length, _ = entry
+        if shard in self._writers:
+            self._writers[shard][0].flush()
+        with open(self.root / shard, "rb") as f:
+            f.seek(offset)
+            return json_codec.loads(f.read(length))
+
+    def iter_records(self) -> Iterator[Tuple[str, dict]]:
+        """
+        Yields `(rel_path, record)` for the latest copy of every article, one shard
+        at a time and in file order, so each shard is read sequentially only once.
+        """
+        self.flush()
+        by_shard: Dict[str, list] = {}
+        for shard, offset, length, rel_path in self._load_index().values():
+            by_shard.setdefault(shard, []).append((offset, length, rel_path))
+        for shard in sorted(by_shard):
+            with open(self.root / shard, "rb") as f:
+                for offset, length, rel_path in sorted(by_shard[shard]):
+                    f.seek(offset)
+                    yield rel_path, json_codec.loads(f.read(length))
+
+    # --- Export ---
+
+    def export_parquet(self, shard: Optional[str] = None) -> list:
+        """
+        Writes `<shard>.parquet` next to each JSONL shard (or just `shard`) with the
+        latest copy of each article. Nested objects become Parquet struct columns.
+        Requires pyarrow; returns the written paths.
+        """
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Parquet export requires the 'pyarrow' package (pip install pyarrow).") from e
+
+        by_shard: Dict[str, list] = {}
+        for article_id, (entry_shard, _, _, _) in self._load_index().items():
+            if shard is None or entry_shard == shard:
+                by_shard.setdefault(entry_shard, []).append(article_id)
+
+        written = []
+        for entry_shard, article_ids in sorted(by_shard.items()):
+            records = [self.get(article_id) for article_id in sorted(article_ids)]
+            out_path = (self.root / entry_shard).with_suffix(".parquet")
+            tmp_path = out_path.with_name(out_path.name + ".tmp")
+            pq.write_table(pa.Table.from_pylist(records), tmp_path)
+            os.replace(tmp_path, out_path)
+            written.append(out_path)
+        return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or export a consolidated article store.")
+    parser.add_argument("store_dir", help="Store root, e.g. /app/data/dawn/transformed_store")
+    parser.add_argument("--get", metavar="ARTICLE_ID", help="Print one article as JSON.")
+    parser.add_argument("--export-parquet", action="store_true", help="Write a .parquet file next to every shard.")
+    args = parser.parse_args()
+
+    store = ArticleStore(args.store_dir)
+    if args.get:
+        article = store.get(args.get)
+        if article is None:
+            raise SystemExit(f"Article '{args.get}' not found in {args.store_dir}")
+        print(json.dumps(article, indent=2, ensure_ascii=False))
+    elif args.export_parquet:
+        for path in store.export_parquet():
+            print(f"✅ Wrote {path}")
+    else:
+        print(f"{len(store)} article(s) in {args.store_dir}")
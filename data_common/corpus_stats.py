@@ -0,0 +1,333 @@
+"""
+Corpus statistics collected while cleaning.
+
+The cleaner hands every article it writes to `CorpusStats` as a small tuple of
+numeric features: word count, body length, title length, reading time, and its
+categories and near-duplicate flag. They are kept as NumPy columns, one table
+per source and month, in `<data root>/progress/corpus_stats/<source>/YYYY-MM.npz`:
+
+    rel_path             str     YYYY/MM/DD/<id>.json (sorted)
+    day                  uint8   day of the month (0 outside the date layout)
+    word_count           uint32
+    body_chars           uint32
+    title_words          uint16
+    reading_time_minutes uint16
+    duplicate            bool    tagged `duplicate_of` by the near-duplicate index
+    categories           str     the month's category vocabulary
+    category_matrix      bool    articles x categories
+
+Reports (words per day, length distributions, category counts, ...) are then
+vectorized reductions over a few small files instead of a pass over every article.
+A re-cleaned article replaces its row; a removed raw file drops it. Tables are
+merged with what is on disk when they are saved, so concurrent runs only race if
+they save the same month at the same moment.
+
+Requires numpy; without it the cleaner skips the statistics. Articles cleaned
+before the statistics existed are added with `--rebuild`.
+
+    python corpus_stats.py /app/data                        # per source and month
+    python corpus_stats.py /app/data --source dawn --daily  # words per day
+    python corpus_stats.py /app/data --lengths --categories 10
+    python corpus_stats.py /app/data --rebuild              # backfill from transformed_articles/
+"""
+import argparse
+import io
+import json
+import shutil
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional: the cleaner skips the statistics without it
+    np = None
+
+from file_inventory import walk_json_files
+import json_codec
+from near_duplicates import month_of
+
+STATS_SUBDIR = Path("progress") / "corpus_stats"
+STATS_VERSION = 1
+HAVE_NUMPY = np is not None
+# Upper edges of the word-count buckets reported by `--lengths`
+LENGTH_BINS = (100, 250, 500, 1000, 2000, 5000)
+
+_NUMERIC_COLUMNS = (("day", "uint8"), ("word_count", "uint32"), ("body_chars", "uint32"),
+                    ("title_words", "uint16"), ("reading_time_minutes", "uint16"), ("duplicate", "bool"))
+
+
+class ArticleFeatures(NamedTuple):
+    """What the cleaner measures per article; cheap to send back from a worker process."""
+    word_count: int
+    body_chars: int
+    title_words: int
+    reading_time_minutes: int
+    categories: Tuple[str, ...]
+
+
+def count_words(text: str) -> int:
+    """Words in whitespace-normalized text (single spaces, trimmed) without building a list."""
+    return text.count(" ") + 1 if text else 0
+
+
+def normalize_categories(categories) -> Tuple[str, ...]:
+    if isinstance(categories, str):
+        categories = [categories]
+    if not isinstance(categories, list):
+        return ()
+    return tuple(sorted({c.strip() for c in categories if isinstance(c, str) and c.strip()}))
+
+
+def _day_of(rel_path: str) -> int:
+    parts = rel_path.split("/")
+    return int(parts[2]) if len(parts) >= 4 and parts[2].isdigit() else 0
+
+
+def _empty_table() -> Dict[str, "np.ndarray"]:
+    table = {"rel_path": np.array([], dtype="U1"), "categories": np.array([], dtype="U1"),
+             "category_matrix": np.zeros((0, 0), dtype=bool)}
+    for name, dtype in _NUMERIC_COLUMNS:
+        table[name] = np.array([], dtype=dtype)
+    return table
+
+
+def load_table(path: Path) -> Optional[Dict[str, "np.ndarray"]]:
+    """The columns of one month table, or None if it is missing or from another version."""
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != STATS_VERSION:
+                return None
+            return {name: data[name] for name in data.files if name != "version"}
+    except FileNotFoundError:
+        return None
+
+
+def _write_table(path: Path, table: Dict[str, "np.ndarray"]):
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, version=np.array(STATS_VERSION), **table)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    json_codec.write_atomic(path, buffer.getvalue())
+
+
+def _merge(table: Dict[str, "np.ndarray"], rows: Dict[str, Tuple[ArticleFeatures, bool]],
+           removed: Set[str]) -> Dict[str, "np.ndarray"]:
+    """`table` without the rows in `removed` or `rows`, plus `rows`, sorted by path."""
+    keep = ~np.isin(table["rel_path"], list(removed | rows.keys()))
+    paths = sorted(rows)
+    vocabulary = sorted(set(table["categories"].tolist())
+                        | {c for features, _ in rows.values() for c in features.categories})
+    column_of = {category: i for i, category in enumerate(vocabulary)}
+
+    new_columns = {
+        "rel_path": np.array(paths, dtype=str),
+        "day": np.array([_day_of(p) for p in paths], dtype="uint8"),
+        "word_count": np.array([rows[p][0].word_count for p in paths], dtype="uint32"),
+        "body_chars": np.array([rows[p][0].body_chars for p in paths], dtype="uint32"),
+        "title_words": np.array([rows[p][0].title_words for p in paths], dtype="uint16"),
+        "reading_time_minutes": np.array([rows[p][0].reading_time_minutes for p in paths], dtype="uint16"),
+        "duplicate": np.array([rows[p][1] for p in paths], dtype=bool),
+    }
+    merged = {name: np.concatenate([table[name][keep], new_columns[name]]).astype(dtype)
+              for name, dtype in (("rel_path", str),) + _NUMERIC_COLUMNS}
+
+    matrix = np.zeros((int(keep.sum()) + len(paths), len(vocabulary)), dtype=bool)
+    old_columns = [column_of[c] for c in table["categories"].tolist()]
+    if old_columns:
+        matrix[:int(keep.sum()), old_columns] = table["category_matrix"][keep]
+    for row, p in enumerate(paths, start=int(keep.sum())):
+        matrix[row, [column_of[c] for c in rows[p][0].categories]] = True
+
+    order = np.argsort(merged["rel_path"], kind="stable")
+    merged = {name: column[order] for name, column in merged.items()}
+    merged["categories"] = np.array(vocabulary, dtype=str)
+    merged["category_matrix"] = matrix[order]
+    return merged
+
+
+class CorpusStats:
+    """
+    Pending feature rows of one source, written into its month tables by `save`.
+    """
+
+    def __init__(self, root, source: str):
+        if np is None:
+            raise RuntimeError("Corpus statistics require the 'numpy' package (pip install numpy).")
+        self.root = Path(root)
+        self.source = source
+        # month -> {rel_path: (features, duplicate)} and month -> {rel_path} to drop
+        self._rows: Dict[str, Dict[str, Tuple[ArticleFeatures, bool]]] = {}
+        self._removed: Dict[str, Set[str]] = {}
+        self.rows_saved = 0
+        self.months_saved = set()
+
+    def month_path(self, month: str) -> Path:
+        return self.root / self.source / f"{month}.npz"
+
+    def add(self, rel_path: str, features: ArticleFeatures, duplicate: bool = False):
+        month = month_of(rel_path)
+        self._rows.setdefault(month, {})[rel_path] = (features, duplicate)
+        self._removed.get(month, set()).discard(rel_path)
+
+    def remove(self, rel_path: str):
+        month = month_of(rel_path)
+        self._removed.setdefault(month, set()).add(rel_path)
+        self._rows.get(month, {}).pop(rel_path, None)
+
+    def save(self):
+        """Merges the pending rows into their month tables (atomically, one file per month)."""
+        for month in sorted(self._rows.keys() | self._removed.keys()):
+            rows, removed = self._rows.get(month, {}), self._removed.get(month, set())
+            path = self.month_path(month)
+            table = load_table(path)
+            if table is None:
+                if not rows:
+                    continue
+                table = _empty_table()
+            _write_table(path, _merge(table, rows, removed))
+            self.rows_saved += len(rows)
+            self.months_saved.add(month)
+        self._rows.clear()
+        self._removed.clear()
+
+    def describe(self) -> str:
+        return f"{self.rows_saved} article(s) recorded in {len(self.months_saved)} month table(s)"
+
+
+# --- Reporting ---
+
+def iter_tables(root, sources: Optional[List[str]] = None, month_from: Optional[str] = None,
+                month_to: Optional[str] = None) -> Iterator[Tuple[str, str, Dict[str, "np.ndarray"]]]:
+    """Yields `(source, month, table)` for every month table under `root`, in order."""
+    root = Path(root)
+    if not root.is_dir():
+        return
+    for source_dir in sorted(p for p in root.iterdir() if p.is_dir()):
+        if sources and source_dir.name not in sources:
+            continue
+        for path in sorted(source_dir.glob("*.npz")):
+            month = path.stem
+            if (month_from and month < month_from) or (month_to and month > month_to):
+                continue
+            table = load_table(path)
+            if table is not None:
+                yield source_dir.name, month, table
+
+
+def summarize(table: Dict[str, "np.ndarray"]) -> dict:
+    """Aggregates of one table (or of several joined with `concat_tables`)."""
+    words = table["word_count"].astype(np.int64)
+    n = len(words)
+    summary = {
+        "articles": n,
+        "duplicates": int(table["duplicate"].sum()),
+        "words": int(words.sum()),
+        "words_mean": float(words.mean()) if n else 0.0,
+        "words_median": float(np.median(words)) if n else 0.0,
+        "words_p90": float(np.percentile(words, 90)) if n else 0.0,
+        "reading_minutes": int(table["reading_time_minutes"].sum()),
+        "articles_per_day": np.bincount(table["day"], minlength=32)[1:].tolist(),
+        "words_per_day": np.bincount(table["day"], weights=words, minlength=32)[1:].astype(np.int64).tolist(),
+    }
+    counts, _ = np.histogram(words, bins=(0,) + LENGTH_BINS + (np.iinfo(np.uint32).max,))
+    summary["length_buckets"] = dict(zip([f"<{edge}" for edge in LENGTH_BINS] + [f">={LENGTH_BINS[-1]}"],
+                                         counts.tolist()))
+    per_category = table["category_matrix"].sum(axis=0) if n else np.zeros(0, dtype=np.int64)
+    summary["categories"] = {category: int(count) for category, count
+                             in sorted(zip(table["categories"].tolist(), per_category.tolist()),
+                                       key=lambda item: -item[1]) if count}
+    return summary
+
+
+def rebuild(data_root, sources: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    Recreates the tables of every source from its transformed_articles/ (one pass
+    over the files). Returns `{source: description}`.
+    """
+    data_root = Path(data_root)
+    root = data_root / STATS_SUBDIR
+    results = {}
+    for source_dir in sorted(p for p in data_root.iterdir() if p.is_dir() and p.name != "progress"):
+        transformed = source_dir / "transformed_articles"
+        if (sources and source_dir.name not in sources) or not transformed.is_dir():
+            continue
+        shutil.rmtree(root / source_dir.name, ignore_errors=True)
+        stats = CorpusStats(root, source_dir.name)
+        for rel, path, _ in walk_json_files(transformed):
+            try:
+                record = json_codec.load_file(path)
+            except (OSError, json_codec.DecodeError) as e:
+                print(f"⚠️  Skipping unreadable {path}: {e}")
+                continue
+            metadata = record.get("metadata") or {}
+            body = (record.get("content") or {}).get("article_body") or ""
+            stats.add(rel, ArticleFeatures(
+                word_count=int(metadata.get("word_count") or 0),
+                body_chars=len(body),
+                title_words=count_words(metadata.get("title") or ""),
+                reading_time_minutes=int(metadata.get("reading_time_minutes") or 0),
+                categories=normalize_categories(metadata.get("categories")),
+            ), duplicate=bool(record.get("duplicate_of")))
+        stats.save()
+        results[source_dir.name] = stats.describe()
+    return results
+
+
+def export_parquet(root, sources: Optional[List[str]] = None) -> List[Path]:
+    """Writes `<month>.parquet` next to each table, with categories as a list column. Requires pyarrow."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet export requires the 'pyarrow' package (pip install pyarrow).") from e
+    written = []
+    for source, month, table in iter_tables(root, sources):
+        vocabulary = table["categories"]
+        columns = {name: table[name] for name, _ in (("rel_path", None),) + _NUMERIC_COLUMNS}
+        columns["categories"] = pa.array([vocabulary[row].tolist() for row in table["category_matrix"]],
+                                         type=pa.list_(pa.string()))
+        path = Path(root) / source / f"{month}.parquet"
+        pq.write_table(pa.table(columns), path)
+        written.append(path)
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report corpus statistics collected by the cleaner.")
+    parser.add_argument("data_dir", nargs="?", default="/app/data", help="The data root (e.g., /app/data).")
+    parser.add_argument("--source", action="append", help="Only this source (repeatable).")
+    parser.add_argument("--from", dest="month_from", metavar="YYYY-MM", help="First month to report.")
+    parser.add_argument("--to", dest="month_to", metavar="YYYY-MM", help="Last month to report.")
+    parser.add_argument("--daily", action="store_true", help="Print articles and words per day.")
+    parser.add_argument("--lengths", action="store_true", help="Print the word-count distribution.")
+    parser.add_argument("--categories", type=int, default=0, metavar="N", help="Print the N most common categories.")
+    parser.add_argument("--json", action="store_true", help="Print every summary as JSON lines.")
+    parser.add_argument("--rebuild", action="store_true", help="Recreate the tables from transformed_articles/.")
+    parser.add_argument("--export-parquet", action="store_true", help="Write a Parquet copy of every table.")
+    args = parser.parse_args()
+
+    if np is None:
+        parser.error("corpus statistics require numpy (pip install numpy)")
+    stats_root = Path(args.data_dir) / STATS_SUBDIR
+    if args.rebuild:
+        for source, description in rebuild(args.data_dir, args.source).items():
+            print(f"{source}: {description}")
+    if args.export_parquet:
+        print(f"Wrote {len(export_parquet(stats_root, args.source))} Parquet file(s).")
+
+    for source, month, table in iter_tables(stats_root, args.source, args.month_from, args.month_to):
+        summary = summarize(table)
+        if args.json:
+            print(json.dumps(dict(summary, source=source, month=month)))
+            continue
+        print(f"{source} {month}: {summary['articles']} articles ({summary['duplicates']} near-duplicates), "
+              f"{summary['words']:,} words; per article mean {summary['words_mean']:.0f}, "
+              f"median {summary['words_median']:.0f}, p90 {summary['words_p90']:.0f}")
+        if args.daily:
+            for day, (count, words) in enumerate(zip(summary["articles_per_day"], summary["words_per_day"]), 1):
+                if count:
+                    print(f"  {month}-{day:02d}: {count} articles, {words:,} words")
+        if args.lengths:
+            print("  words: " + ", ".join(f"{bucket} {count}" for bucket, count in summary["length_buckets"].items()))
+        if args.categories:
+            top = list(summary["categories"].items())[:args.categories]
+            print("  categories: " + (", ".join(f"{name} {count}" for name, count in top) or "none"))
@@ -0,0 +1,271 @@
+"""
+Cached listings of the article trees (`<source>/<subdir>/YYYY/MM/DD/<file>.json`).
+
+Listing a tree with `glob` + `is_file()` + `exists()` costs several syscalls per
+article, which is slow on a bind-mounted Docker volume. A `FileInventory` walks a
+tree with os.scandir and caches every directory's listing, keyed by that
+directory's mtime. On the next run only one `stat` per directory is needed: a
+directory whose mtime hasn't moved is served from the cache, with the mtime/size
+of its files as they were when it was last scanned. Creating, deleting or renaming
+a file updates its directory's mtime, so new and removed articles are always seen.
+Files are yielded in path order while the tree is listed (`iter_files`,
+`iter_pending`), so callers can stream them instead of holding every path.
+
+Rewriting a file in place does not touch its directory. Every writer in the
+pipeline either creates new files or replaces them via a temp file + rename
+(`replaceJSON` in utils/helpers.js), but after editing articles by hand pass the
+cleaner's `--rescan`, or hand the paths over with `--changed-list`.
+
+A directory modified within `RACY_SECONDS` of a scan is scanned again next time,
+so coarse mtime resolution can't hide a file added right after a listing.
+
+Caches live in `<data root>/progress/inventory/<source>__<subdir>.json`;
+FILE_INVENTORY=off disables them (every run scans everything).
+
+    python file_inventory.py /app/data/app/transformed_articles /app/data/app/transformed_articles_ner
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import json_codec
+from partition import Partition
+
+INVENTORY_SUBDIR = Path("progress") / "inventory"
+INVENTORY_VERSION = 1
+RACY_SECONDS = 2.0
+
+
+class FileStat(NamedTuple):
+    """The parts of `os.stat_result` the pipeline compares, under the same names."""
+    st_mtime_ns: int
+    st_size: int
+
+
+def walk_json_files(directory: Path, prefix: str = '',
+                    partition: Optional[Partition] = None) -> Iterator[Tuple[str, Path, os.stat_result]]:
+    """
+    Walks `directory` once with os.scandir and yields `(relative_path, path, stat)`
+    for every *.json file, without caching. `relative_path` is POSIX-style and starts with `prefix`.
+    With a `partition`, directories and files outside it are skipped.
+    """
+    try:
+        entries = list(os.scandir(directory))
+    except (FileNotFoundError, NotADirectoryError):
+        return
+    for entry in entries:
+        if entry.is_dir():
+            rel_dir = f"{prefix}{entry.name}/"
+            if partition is None or partition.includes_dir(rel_dir):
+                yield from walk_json_files(Path(entry.path), rel_dir, partition)
+        elif entry.name.endswith('.json') and entry.is_file():
+            rel = f"{prefix}{entry.name}"
+            if partition is None or partition.includes(rel):
+                yield rel, Path(entry.path), entry.stat()
+
+
+def inventory_path(data_root, tree, setting: Optional[str] = None) -> Optional[Path]:
+    """
+    Cache file of `tree` (a directory under `data_root`), or None when FILE_INVENTORY
+    (or `setting`) is 'off'.
+    """
+    if setting is None:
+        setting = os.environ.get("FILE_INVENTORY", "")
+    if setting.lower() == "off":
+        return None
+    tree, data_root = Path(tree), Path(data_root)
+    try:
+        name = tree.relative_to(data_root).as_posix().replace("/", "__")
+    except ValueError:
+        name = tree.as_posix().strip("/").replace("/", "__")
+    return data_root / INVENTORY_SUBDIR / f"{name}.json"
+
+
+def _ancestors(rel_dir: str) -> Iterator[str]:
+    """'2025/03/01/' -> '2025/', '2025/03/', '2025/03/01/'"""
+    end = rel_dir.find("/")
+    while end != -1:
+        yield rel_dir[:end + 1]
+        end = rel_dir.find("/", end + 1)
+
+
+class FileInventory:
+    """
+    The *.json files under `root`, listed through a per-directory cache. With
+    `with_stats=False` only names are kept (no `stat` per file even when a
+    directory is rescanned), which is all "is there an output yet" checks need.
+    """
+
+    def __init__(self, root, cache_path: Optional[Path] = None, with_stats: bool = True):
+        self.root = Path(root)
+        self.cache_path = Path(cache_path) if cache_path is not None else None
+        self.with_stats = with_stats
+        # relative dir ('' or 'YYYY/MM/') -> [mtime_ns or None, [subdir names], {file name: [mtime_ns, size] or None}]
+        self._dirs: Dict[str, list] = {}
+        self._dirty = False
+        self.dirs_scanned = 0
+        self.dirs_cached = 0
+        self._load()
+
+    @classmethod
+    def for_tree(cls, data_root, tree, with_stats: bool = True) -> "FileInventory":
+        """Inventory of `tree` cached under `<data_root>/progress/inventory` (unless FILE_INVENTORY=off)."""
+        return cls(tree, inventory_path(data_root, tree), with_stats)
+
+    def _load(self):
+        if self.cache_path is None:
+            return
+        try:
+            cached = json_codec.load_file(self.cache_path)
+        except FileNotFoundError:
+            return
+        except (OSError, json_codec.DecodeError) as e:
+            print(f"⚠️  Ignoring unreadable file inventory {self.cache_path}: {e}")
+            return
+        if (isinstance(cached, dict) and cached.get("version") == INVENTORY_VERSION
+                and cached.get("root") == str(self.root) and cached.get("with_stats") == self.with_stats
+                and isinstance(cached.get("dirs"), dict)):
+            self._dirs = cached["dirs"]
+
+    def iter_files(self, rescan: bool = False,
+                   partition: Optional[Partition] = None) -> Iterator[Tuple[str, Optional[FileStat]]]:
+        """
+        Yields `(relative_path, FileStat)` (None without stats) for every *.json file,
+        or only those in `partition`, in path order and while the tree is being listed,
+        so the caller never holds the whole listing. Directories outside the partition's
+        date range are not visited. `rescan` ignores the cache and lists every directory
+        again. The cache is only updated once the iteration is complete.
+        """
+        if partition is not None and partition.is_everything:
+            partition = None
+        started_ns = time.time_ns()
+        dirs: Dict[str, list] = {}
+        pruned = set()
+        self.dirs_scanned = self.dirs_cached = 0
+        yield from self._list(self.root, "", dirs, rescan, started_ns - int(RACY_SECONDS * 1e9), partition, pruned)
+        if pruned:
+            # Keep the cached listings of the directories this partition skipped
+            for rel_dir, entry in self._dirs.items():
+                if rel_dir not in dirs and any(ancestor in pruned for ancestor in _ancestors(rel_dir)):
+                    dirs[rel_dir] = entry
+        if dirs.keys() != self._dirs.keys():
+            self._dirty = True  # directories were removed
+        self._dirs = dirs
+
+    def files(self, rescan: bool = False, partition: Optional[Partition] = None) -> Dict[str, Optional[FileStat]]:
+        """`{relative_path: FileStat}` of `iter_files`."""
+        return dict(self.iter_files(rescan, partition))
+
+    def refresh(self, rescan: bool = False, partition: Optional[Partition] = None):
+        """Brings the listing of `partition` up to date, for `has`, without collecting it."""
+        for _ in self.iter_files(rescan, partition):
+            pass
+
+    def has(self, rel: str) -> bool:
+        """Whether the last listing found `rel` (a relative *.json path)."""
+        rel_dir, _, name = rel.rpartition("/")
+        entry = self._dirs.get(f"{rel_dir}/" if rel_dir else "")
+        return entry is not None and name in entry[2]
+
+    def _list(self, path: Path, rel_dir: str, dirs: Dict[str, list], rescan: bool, trusted_before_ns: int,
+              partition: Optional[Partition], pruned: set) -> Iterator[Tuple[str, Optional[FileStat]]]:
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        cached = self._dirs.get(rel_dir)
+        if not rescan and cached is not None and cached[0] == mtime_ns:
+            entry = cached
+            self.dirs_cached += 1
+        else:
+            subdirs, listed = [], {}
+            try:
+                entries = list(os.scandir(path))
+            except (FileNotFoundError, NotADirectoryError):
+                return
+            for item in entries:
+                if item.is_dir():
+                    subdirs.append(item.name)
+                elif item.name.endswith('.json') and item.is_file():
+                    if not self.with_stats:
+                        listed[item.name] = None
+                        continue
+                    try:
+                        st = item.stat()
+                    except FileNotFoundError:
+                        continue  # removed while we were listing
+                    listed[item.name] = [st.st_mtime_ns, st.st_size]
+            # A directory changed just now may change again within its mtime's resolution
+            entry = [mtime_ns if mtime_ns < trusted_before_ns else None, sorted(subdirs), listed]
+            self.dirs_scanned += 1
+            self._dirty = True
+        dirs[rel_dir] = entry
+        # Files and subdirectories interleaved as their full paths sort ('a.json' < 'a/' < 'b.json')
+        names = sorted([(name, False) for name in entry[2]] + [(f"{subdir}/", True) for subdir in entry[1]])
+        for name, is_dir in names:
+            if is_dir:
+                sub_rel = f"{rel_dir}{name}"
+                if partition is not None and not partition.includes_dir(sub_rel):
+                    pruned.add(sub_rel)
+                    continue
+                yield from self._list(path / name[:-1], sub_rel, dirs, rescan, trusted_before_ns, partition, pruned)
+                continue
+            rel = f"{rel_dir}{name}"
+            if partition is None or partition.includes(rel):
+                stat = entry[2][name]
+                yield rel, FileStat(*stat) if stat is not None else None
+
+    def walk(self, rescan: bool = False,
+             partition: Optional[Partition] = None) -> Iterator[Tuple[str, Path, Optional[FileStat]]]:
+        """Yields `(relative_path, path, stat)` in path order, like `walk_json_files`, while listing."""
+        for rel, stat in self.iter_files(rescan, partition):
+            yield rel, self.root / rel, stat
+
+    def iter_pending(self, done: "FileInventory", rescan: bool = False,
+                     partition: Optional[Partition] = None) -> Iterator[str]:
+        """
+        Relative paths listed here that `done` (e.g. the next stage's output tree) doesn't
+        have, in path order. Only `done`'s cached listing is consulted, never a set of its files.
+        """
+        done.refresh(rescan, partition)
+        for rel, _ in self.iter_files(rescan, partition):
+            if not done.has(rel):
+                yield rel
+
+    def pending(self, done: "FileInventory", rescan: bool = False,
+                partition: Optional[Partition] = None) -> List[str]:
+        """Sorted list of `iter_pending`."""
+        return list(self.iter_pending(done, rescan, partition))
+
+    def save(self):
+        """Writes the cache (if anything changed) through a temp file + rename."""
+        if self.cache_path is None or not self._dirty:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_name(f"{self.cache_path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as f:
+            f.write(json_codec.dumps({"version": INVENTORY_VERSION, "root": str(self.root),
+                                      "with_stats": self.with_stats, "dirs": self._dirs}))
+        os.replace(tmp_path, self.cache_path)
+        self._dirty = False
+
+    def describe(self) -> str:
+        return f"{self.dirs_cached} cached and {self.dirs_scanned} rescanned director(ies) under {self.root}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the *.json files of a tree, or those missing from a second tree.")
+    parser.add_argument("tree", help="Directory to list (e.g. /app/data/app/transformed_articles).")
+    parser.add_argument("done", nargs="?", help="Output tree; print only files it doesn't have yet.")
+    args = parser.parse_args()
+
+    # No cache files here: this is for inspecting a tree, not for maintaining its inventory
+    inventory = FileInventory(args.tree, with_stats=False)
+    if args.done:
+        for rel in inventory.pending(FileInventory(args.done, with_stats=False)):
+            print(rel)
+    else:
+        for rel, _, _ in inventory.walk():
+            print(rel)
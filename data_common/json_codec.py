@@ -0,0 +1,204 @@
+"""
+JSON backend shared by the cleaner and the enricher.
+
+Every article is parsed and written once per stage, so on a full rebuild the
+stdlib `json` module is a noticeable share of the wall time. This module picks
+the fastest installed backend: orjson, then msgspec, then the stdlib. JSON_BACKEND
+(`orjson`, `msgspec` or `json`) forces one.
+
+All backends produce the same bytes as `json.dumps(..., indent=2, ensure_ascii=False)`.
+The one exception is floats in exponent notation (`1e-07` is written as `1e-7`).
+Values a fast backend can't encode (e.g. integers beyond 64 bits) or would write as
+`null` (NaN and Infinity) fall back to the stdlib. Article files stay pretty-printed unless JSON_COMPACT=1. Compact files are
+5-10% smaller and quicker to write, and every reader in the pipeline accepts both.
+
+Article files are written with `write_atomic`: the bytes go to a temp file in the
+same directory, which is then renamed over the target. A process killed mid-write
+leaves at most a stray `.tmp` file, never a truncated article that a later stage
+would count as done. FSYNC_WRITES=1 also syncs each file before the rename, which
+protects against power loss as well, at the cost of one disk flush per article.
+
+Raw scraper records are decoded straight into a `RawArticle` (a `__slots__` class)
+holding only the fields the cleaner uses, whichever raw schema the file follows. With
+msgspec, the other fields are skipped while parsing instead of being built as dicts.
+Transformed articles stay plain dicts: the enricher writes every field back, and a
+struct would drop the ones it doesn't declare.
+"""
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # optional: stdlib json gives the same output, only slower
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:  # optional
+    msgspec = None
+
+_AVAILABLE = {"orjson": orjson is not None, "msgspec": msgspec is not None, "json": True}
+_REQUESTED = os.environ.get("JSON_BACKEND", "").lower()
+if _REQUESTED and _AVAILABLE.get(_REQUESTED):
+    BACKEND = _REQUESTED
+else:
+    BACKEND = next(name for name, available in _AVAILABLE.items() if available)
+COMPACT_OUTPUT = os.environ.get("JSON_COMPACT", "0") == "1"
+FSYNC_WRITES = os.environ.get("FSYNC_WRITES", "0") == "1"
+
+# orjson's error subclasses it; msgspec errors are re-raised as it
+DecodeError = json.JSONDecodeError
+
+# Raised by the fast backends for values they can't represent; the stdlib then decides
+_ENCODE_ERRORS = (TypeError, ValueError, OverflowError)
+_INF = float("inf")
+if msgspec is not None:
+    _msgspec_encoder = msgspec.json.Encoder()
+    _msgspec_decoder = msgspec.json.Decoder()
+    _ENCODE_ERRORS += (msgspec.EncodeError,)
+
+
+def _has_non_finite(obj: Any) -> bool:
+    """Whether `obj` holds a NaN or an infinity, which orjson and msgspec write as `null`."""
+    if isinstance(obj, float):
+        return obj != obj or obj in (_INF, -_INF)
+    if isinstance(obj, dict):
+        return any(_has_non_finite(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_non_finite(value) for value in obj)
+    return False
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Parses a JSON document; raises `DecodeError` if it is invalid."""
+    if BACKEND == "orjson":
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass  # e.g. a lone surrogate escape, which the stdlib accepts; it raises for invalid JSON
+    elif BACKEND == "msgspec":
+        try:
+            return _msgspec_decoder.decode(data)
+        except msgspec.DecodeError:
+            pass
+    return json.loads(data.decode("utf-8") if isinstance(data, bytes) else data)
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """UTF-8 JSON of `obj`: compact by default, or indented by two spaces."""
+    encoded = None
+    try:
+        if BACKEND == "orjson":
+            encoded = orjson.dumps(obj, option=orjson.OPT_INDENT_2) if indent else orjson.dumps(obj)
+        elif BACKEND == "msgspec":
+            encoded = _msgspec_encoder.encode(obj)
+            if indent:
+                encoded = msgspec.json.format(encoded, indent=2)
+    except _ENCODE_ERRORS:
+        pass
+    # Only output with a `null` can hide a NaN, so most documents skip the walk
+    if encoded is not None and not (b"null" in encoded and _has_non_finite(obj)):
+        return encoded
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps_article(obj: Any) -> bytes:
+    """An article file's contents: pretty-printed, or compact with JSON_COMPACT=1."""
+    return dumps(obj, indent=not COMPACT_OUTPUT)
+
+
+def load_file(path: Union[Path, str]) -> Any:
+    with open(path, "rb") as f:
+        return loads(f.read())
+
+
+def write_atomic(path: Union[Path, str], data: bytes):
+    """Replaces `path` with `data` through a temp file + rename (see the module docstring)."""
+    path = Path(path)
+    # Not *.json, so directory walks never pick up a half-written temp file
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            if FSYNC_WRITES:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            tmp_path.unlink()
+        except OSError:
+            pass
+        raise
+
+
+def write_article(path: Union[Path, str], obj: Any):
+    write_atomic(path, dumps_article(obj))
+
+
+class RawArticle:
+    """
+    The fields of a raw scraper record that the cleaner uses, normalized over the flat
+    APP/Dawn schema (`title`, `content`, `source`, ...) and the nested one (`metadata`,
+    `source_info`, `content.article_body`). Flat fields win when both are present.
+    """
+
+    __slots__ = ("title", "body", "source_name", "source_link", "retrieved_at", "author",
+                 "date_published", "image_url", "categories")
+
+    def __init__(self, record):
+        # `record` is a dict or a msgspec struct; both offer `.get`
+        content = record.get('content')
+        self.body = content.get('article_body') if isinstance(content, dict) else content
+        title = record.get('title')
+        if title is None and isinstance(record.get('metadata'), dict):
+            title = record.get('metadata').get('title')
+        self.title = title
+        self.source_name = record.get('source') or (record.get('source_info') or {}).get('source_name')
+        self.source_link = record.get('link') or (record.get('source_info') or {}).get('source_link')
+        self.retrieved_at = record.get('retrievedAt') or (record.get('source_info') or {}).get('retrieved_at')
+        self.author = record.get('author') or (record.get('metadata') or {}).get('author')
+        self.date_published = record.get('date_published') or (record.get('metadata') or {}).get('date_published')
+        self.image_url = record.get('image') or (record.get('metadata') or {}).get('image_url')
+        self.categories = record.get('categories') or (record.get('metadata') or {}).get('categories', [])
+
+
+if msgspec is not None:
+    class _RawRecord(msgspec.Struct):
+        """Raw-record fields read by `RawArticle`; everything else is skipped while decoding."""
+
+        title: Any = None
+        content: Any = None
+        source: Any = None
+        link: Any = None
+        retrievedAt: Any = None
+        author: Any = None
+        date_published: Any = None
+        image: Any = None
+        categories: Any = None
+        metadata: Any = None
+        source_info: Any = None
+
+        def get(self, key: str, default: Any = None) -> Any:
+            return getattr(self, key, default)
+
+    _raw_record_decoder = msgspec.json.Decoder(_RawRecord)
+
+
+def decode_raw_article(data: bytes) -> RawArticle:
+    """Parses a raw scraper file into a `RawArticle`; raises `DecodeError` if it is invalid."""
+    # msgspec decodes into the struct about twice as fast as orjson builds the whole dict
+    if msgspec is not None and (BACKEND == "msgspec" or not _REQUESTED):
+        try:
+            return RawArticle(_raw_record_decoder.decode(data))
+        except msgspec.DecodeError:
+            pass  # invalid, or not an object: the generic path raises the usual error
+    record = loads(data)
+    if not isinstance(record, dict):
+        raise DecodeError("Expected a JSON object", "", 0)
+    return RawArticle(record)
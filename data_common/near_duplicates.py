@@ -0,0 +1,255 @@
+"""
+Near-duplicate detection across sources.
+
+APP wire copy is often republished almost word for word on Dawn. Every cleaned
+article body gets a MinHash signature built with one-permutation hashing: each
+5-word shingle is hashed once, its low bits pick one of `NUM_BINS` bins and the
+minimum per bin is kept. LSH banding over the signature finds candidate
+duplicates without comparing every pair; a candidate whose estimated Jaccard
+similarity reaches the threshold puts the new article in its cluster. The
+cluster id is the key of the first article indexed, `<source>/YYYY/MM/DD/<id>`,
+which the cleaner stores as `duplicate_of` on the other members.
+
+Shingle hashing is vectorized with NumPy when it is installed; the pure-Python
+path produces identical signatures.
+
+The index is persisted per month as `<root>/YYYY-MM.json`. An article is compared
+with its own month and the two neighbouring ones, since a story republished on
+the 1st of a month belongs to the previous month's cluster.
+"""
+import argparse
+import base64
+import json
+import os
+import re
+import struct
+import zlib
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional: the pure-Python path gives the same signatures
+    np = None
+
+INDEX_VERSION = 1
+NUM_BINS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_BINS // BANDS
+SHINGLE_WORDS = 5
+MIN_SHINGLES = 16  # shorter bodies are too small to compare reliably
+DEFAULT_THRESHOLD = 0.7
+EMPTY_BIN = 0xFFFFFFFF
+
+_MASK64 = (1 << 64) - 1
+# One odd 64-bit multiplier per word position, so shingle hashes depend on word order
+_SHINGLE_MULTIPLIERS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9,
+                        0xD6E8FEB86659FD93, 0xFF51AFD7ED558CCD)
+_MIX1 = 0xBF58476D1CE4E5B9
+_MIX2 = 0x94D049BB133111EB
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_SIGNATURE_STRUCT = struct.Struct(f"<{NUM_BINS}I")
+
+Signature = List[int]
+
+
+def month_of(rel_path: str) -> str:
+    """`YYYY/MM/DD/<id>.json` -> `YYYY-MM`; paths outside the date layout map to 'misc'."""
+    parts = Path(rel_path).parts
+    if len(parts) >= 3 and parts[0].isdigit() and parts[1].isdigit():
+        return f"{parts[0]}-{parts[1]}"
+    return "misc"
+
+
+def _neighbouring_months(month: str) -> List[str]:
+    if month == "misc":
+        return [month]
+    year, mon = int(month[:4]), int(month[5:7])
+    prev = f"{year - 1}-12" if mon == 1 else f"{year}-{mon - 1:02d}"
+    nxt = f"{year + 1}-01" if mon == 12 else f"{year}-{mon + 1:02d}"
+    return [prev, month, nxt]
+
+
+def _token_hashes(text: str) -> List[int]:
+    return [zlib.crc32(word.encode("utf-8")) for word in _WORD_RE.findall(text.lower())]
+
+
+def _signature_numpy(tokens: List[int]) -> Signature:
+    t = np.array(tokens, dtype=np.uint64)
+    n = len(tokens) - SHINGLE_WORDS + 1
+    h = np.zeros(n, dtype=np.uint64)
+    for j, multiplier in enumerate(_SHINGLE_MULTIPLIERS):
+        h += t[j:j + n] * np.uint64(multiplier)  # uint64 arithmetic wraps like the & _MASK64 below
+    # splitmix64 finalizer, so the low bits (bin) and high bits (value) are independent
+    h ^= h >> np.uint64(30)
+    h *= np.uint64(_MIX1)
+    h ^= h >> np.uint64(27)
+    h *= np.uint64(_MIX2)
+    h ^= h >> np.uint64(31)
+    signature = np.full(NUM_BINS, EMPTY_BIN, dtype=np.uint64)
+    np.minimum.at(signature, (h & np.uint64(NUM_BINS - 1)).astype(np.intp), h >> np.uint64(32))
+    return signature.tolist()
+
+
+def _signature_python(tokens: List[int]) -> Signature:
+    signature = [EMPTY_BIN] * NUM_BINS
+    for i in range(len(tokens) - SHINGLE_WORDS + 1):
+        h = 0
+        for token, multiplier in zip(tokens[i:i + SHINGLE_WORDS], _SHINGLE_MULTIPLIERS):
+            h += token * multiplier
+        h &= _MASK64
+        h ^= h >> 30
+        h = (h * _MIX1) & _MASK64
+        h ^= h >> 27
+        h = (h * _MIX2) & _MASK64
+        h ^= h >> 31
+        value = h >> 32
+        b = h & (NUM_BINS - 1)
+        if value < signature[b]:
+            signature[b] = value
+    return signature
+
+
+def signature(text: Optional[str]) -> Optional[Signature]:
+    """Returns the MinHash signature of `text`, or None if it is too short to compare."""
+    if not text:
+        return None
+    tokens = _token_hashes(text)
+    if len(tokens) - SHINGLE_WORDS + 1 < MIN_SHINGLES:
+        return None
+    return _signature_numpy(tokens) if np is not None else _signature_python(tokens)
+
+
+def similarity(a: Signature, b: Signature) -> float:
+    """Estimated Jaccard similarity of two signatures; bins empty in both are ignored."""
+    used = matches = 0
+    for x, y in zip(a, b):
+        if x == EMPTY_BIN and y == EMPTY_BIN:
+            continue
+        used += 1
+        matches += x == y
+    return matches / used if used else 0.0
+
+
+def _band_keys(sig: Signature) -> List[Tuple[int, Tuple[int, ...]]]:
+    keys = []
+    for band in range(BANDS):
+        rows = tuple(sig[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+        if any(row != EMPTY_BIN for row in rows):
+            keys.append((band, rows))
+    return keys
+
+
+def _encode(sig: Signature) -> str:
+    return base64.b64encode(_SIGNATURE_STRUCT.pack(*sig)).decode("ascii")
+
+
+def _decode(data: str) -> Signature:
+    return list(_SIGNATURE_STRUCT.unpack(base64.b64decode(data)))
+
+
+class NearDuplicateIndex:
+    """
+    Month-partitioned LSH index of article signatures. Keys are
+    `<source>/YYYY/MM/DD/<id>`; `assign` adds an article and returns the id of the
+    cluster it joins, if any. Months are loaded on first use; `save` writes the
+    months that changed.
+    """
+
+    def __init__(self, root, threshold: float = DEFAULT_THRESHOLD):
+        self.root = Path(root)
+        self.threshold = threshold
+        # month -> {key: [signature, cluster id or None]}
+        self._months: Dict[str, Dict[str, list]] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], List[Tuple[str, str]]] = {}
+        self._dirty = set()
+
+    def _month_path(self, month: str) -> Path:
+        return self.root / f"{month}.json"
+
+    def _load(self, month: str) -> Dict[str, list]:
+        entries = self._months.get(month)
+        if entries is None:
+            entries = {}
+            path = self._month_path(month)
+            if path.is_file():
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == INDEX_VERSION and data.get("num_bins") == NUM_BINS:
+                    entries = {key: [_decode(sig), cluster] for key, (sig, cluster) in data["entries"].items()}
+            self._months[month] = entries
+            for key, (sig, _) in entries.items():
+                for band_key in _band_keys(sig):
+                    self._buckets.setdefault(band_key, []).append((month, key))
+        return entries
+
+    def _remove(self, month: str, key: str):
+        sig, _ = self._months[month].pop(key)
+        for band_key in _band_keys(sig):
+            members = self._buckets.get(band_key)
+            if members and (month, key) in members:
+                members.remove((month, key))
+
+    def assign(self, key: str, month: str, sig: Signature) -> Optional[str]:
+        """
+        Indexes `sig` under `key` (replacing an earlier signature for the same key)
+        and returns the cluster id of its closest near-duplicate, or None. A cluster's
+        representative stays one: its own members are not candidates.
+        """
+        for neighbour in _neighbouring_months(month):
+            self._load(neighbour)
+        if key in self._months[month]:
+            self._remove(month, key)
+
+        best, best_score = None, self.threshold
+        seen = set()
+        for band_key in _band_keys(sig):
+            for candidate in self._buckets.get(band_key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                candidate_sig, candidate_cluster = self._months[candidate[0]][candidate[1]]
+                if candidate_cluster == key:
+                    continue  # `key` is re-indexed as its own cluster's representative
+                score = similarity(sig, candidate_sig)
+                if score >= best_score and (best is None or score > best_score or candidate[1] < best[0]):
+                    best, best_score = (candidate[1], candidate_cluster), score
+
+        cluster = None
+        if best is not None:
+            # Join the candidate's cluster, so every member points at the same representative
+            cluster = best[1] or best[0]
+        self._months[month][key] = [sig, cluster]
+        for band_key in _band_keys(sig):
+            self._buckets.setdefault(band_key, []).append((month, key))
+        self._dirty.add(month)
+        return cluster
+
+    def save(self) -> None:
+        """Writes every month that changed since the last save (atomically)."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        for month in sorted(self._dirty):
+            path = self._month_path(month)
+            tmp_path = path.with_name(path.name + ".tmp")
+            data = {
+                "version": INDEX_VERSION,
+                "num_bins": NUM_BINS,
+                "entries": {key: [_encode(sig), cluster] for key, (sig, cluster) in self._months[month].items()},
+            }
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, path)
+        self._dirty.clear()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize a near-duplicate index.")
+    parser.add_argument("index_dir", help="Index root, e.g. /app/data/progress/near_duplicates")
+    args = parser.parse_args()
+
+    index = NearDuplicateIndex(args.index_dir)
+    for path in sorted(Path(args.index_dir).glob("*.json")):
+        entries = index._load(path.stem)
+        clusters = {cluster for _, cluster in entries.values() if cluster}
+        duplicates = sum(1 for _, cluster in entries.values() if cluster)
+        print(f"{path.stem}: {len(entries)} article(s), {duplicates} near-duplicate(s) in {len(clusters)} cluster(s)")
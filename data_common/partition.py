@@ -0,0 +1,113 @@
+"""
+Date-range and hash partitions of the article trees, for splitting a run over
+several containers or machines.
+
+A `Partition` selects the articles dated `date_from`..`date_to` (inclusive,
+`YYYY-MM-DD`, taken from the `YYYY/MM/DD/` path) and, with a shard `i/N`, the
+ones whose article id hashes to shard `i` of `N` (CRC-32 of the file stem, so
+every stage and every machine agrees). Directory walks skip years, months and
+days outside the range without listing them. With a date range, files outside
+the `YYYY/MM/DD` layout are left out.
+
+    python cleaner.py /app/data --from 2025-03-01 --to 2025-03-31 --shard 0/4
+"""
+import zlib
+from datetime import date
+from typing import Optional, Tuple
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """'i/N' -> (i, N) with 0 <= i < N; raises ValueError otherwise."""
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like 'i/N' (e.g. 0/4), got '{text}'")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be between 0 and {count - 1}, got '{text}'")
+    return index, count
+
+
+def _parse_date(text: Optional[str]) -> Optional[str]:
+    if not text:
+        return None
+    try:
+        return date.fromisoformat(text).isoformat()
+    except ValueError:
+        raise ValueError(f"Dates must be YYYY-MM-DD, got '{text}'")
+
+
+def _date_of(parts) -> Optional[str]:
+    if len(parts) >= 4 and all(p.isdigit() for p in parts[:3]):
+        return "-".join(parts[:3])
+    return None
+
+
+class Partition:
+    """The slice of the corpus one run works on; `Partition()` is all of it."""
+
+    def __init__(self, date_from: Optional[str] = None, date_to: Optional[str] = None,
+                 shard: Optional[str] = None):
+        self.date_from = _parse_date(date_from)
+        self.date_to = _parse_date(date_to)
+        if self.date_from and self.date_to and self.date_from > self.date_to:
+            raise ValueError(f"--from {self.date_from} is after --to {self.date_to}")
+        self.shard_index, self.shard_count = parse_shard(shard) if shard else (0, 1)
+
+    @property
+    def has_dates(self) -> bool:
+        return self.date_from is not None or self.date_to is not None
+
+    @property
+    def is_everything(self) -> bool:
+        return not self.has_dates and self.shard_count == 1
+
+    def includes_date(self, day: str) -> bool:
+        return ((self.date_from is None or day >= self.date_from)
+                and (self.date_to is None or day <= self.date_to))
+
+    def includes_dir(self, rel_dir: str) -> bool:
+        """False if `rel_dir` ('YYYY/', 'YYYY/MM/' or 'YYYY/MM/DD/') is outside the date range."""
+        if not self.has_dates:
+            return True
+        parts = rel_dir.strip("/").split("/")
+        if len(parts) > 3:
+            return True  # below a day directory that has already been checked
+        if not all(p.isdigit() for p in parts):
+            return False
+        prefix = "-".join(parts)  # '2025', '2025-03' or '2025-03-01'
+        return ((self.date_from is None or prefix >= self.date_from[:len(prefix)])
+                and (self.date_to is None or prefix <= self.date_to[:len(prefix)]))
+
+    def includes(self, rel_path: str) -> bool:
+        """Whether the article at `rel_path` (`YYYY/MM/DD/<id>.json`) belongs to this partition."""
+        if self.is_everything:
+            return True
+        parts = rel_path.split("/")
+        if self.has_dates:
+            day = _date_of(parts)
+            if day is None or not self.includes_date(day):
+                return False
+        if self.shard_count > 1:
+            stem = parts[-1][:-len(".json")] if parts[-1].endswith(".json") else parts[-1]
+            return zlib.crc32(stem.encode("utf-8")) % self.shard_count == self.shard_index
+        return True
+
+    def tag(self) -> str:
+        """A file-name-safe label, e.g. '2025-03-01_2025-03-31' or 'all_shard0of4'."""
+        if self.has_dates:
+            label = f"{self.date_from or 'start'}_{self.date_to or 'end'}"
+        else:
+            label = "all"
+        if self.shard_count > 1:
+            label += f"_shard{self.shard_index}of{self.shard_count}"
+        return label
+
+    def describe(self) -> str:
+        if self.is_everything:
+            return "all articles"
+        parts = []
+        if self.has_dates:
+            parts.append(f"articles dated {self.date_from or 'any time'} to {self.date_to or 'now'}")
+        if self.shard_count > 1:
+            parts.append(f"shard {self.shard_index} of {self.shard_count}")
+        return ", ".join(parts)
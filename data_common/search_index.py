@@ -0,0 +1,353 @@
+"""
+Search index over transformed and enriched articles.
+
+One SQLite file holds:
+
+- a positional full-text index (FTS5, porter-stemmed) over each article's title
+  and `article_body`, so phrase queries work and results are ranked with BM25;
+- entity and keyword posting tables from the enriched articles, keyed by
+  normalized name (and WikiData id for entities);
+- per-article source and publication date, used as filters and facets.
+
+Each article is indexed once under `<source>/YYYY/MM/DD/<id>`, from its enriched
+copy when there is one. Once the index exists, `cleaner.py` and `enricher.py`
+add every article they write; `update` catches up with anything else by
+comparing file mtimes.
+
+    python search_index.py update /app/data
+    python search_index.py query /app/data '"imran khan"' --from 2025-03-01 --to 2025-03-31 --facets
+    python search_index.py query /app/data --entity "Imran Khan" --source dawn
+"""
+import argparse
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from file_inventory import walk_json_files
+import json_codec
+
+INDEX_FILE = Path("progress") / "search" / "index.sqlite"
+TRANSFORMED_SUBDIR = "transformed_articles"
+ENRICHED_SUBDIR = "transformed_articles_ner"
+ENTITY_TYPES = ("people", "organizations", "locations")
+BUSY_TIMEOUT = 120.0  # seconds
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    doc_id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL,
+    date TEXT,
+    title TEXT,
+    path TEXT,
+    mtime_ns INTEGER,
+    enriched INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS docs_date ON docs (date);
+CREATE INDEX IF NOT EXISTS docs_source_date ON docs (source, date);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(title, body, tokenize = 'porter unicode61');
+CREATE TABLE IF NOT EXISTS entities (
+    doc_id INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    name TEXT NOT NULL,
+    norm TEXT NOT NULL,
+    wikidata_id TEXT,
+    sentiment TEXT
+);
+CREATE INDEX IF NOT EXISTS entities_norm ON entities (norm, doc_id);
+CREATE INDEX IF NOT EXISTS entities_wikidata ON entities (wikidata_id, doc_id);
+CREATE INDEX IF NOT EXISTS entities_doc ON entities (doc_id);
+CREATE TABLE IF NOT EXISTS keywords (
+    doc_id INTEGER NOT NULL,
+    norm TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS keywords_norm ON keywords (norm, doc_id);
+CREATE INDEX IF NOT EXISTS keywords_doc ON keywords (doc_id);
+"""
+
+_QUERY_TOKEN_RE = re.compile(r'"([^"]+)"|(\S+)')
+_WORD_RE = re.compile(r"\w+")
+_WIKIDATA_RE = re.compile(r"^Q\d+$")
+
+
+def normalize(name: str) -> str:
+    """Case- and whitespace-insensitive form used for entity and keyword lookups."""
+    return " ".join(name.casefold().split())
+
+
+def to_fts_query(text: str) -> str:
+    """
+    Turns free text into a safe FTS5 query: every bare word must match, and
+    "quoted text" must match as a phrase.
+    """
+    parts = []
+    for phrase, word in _QUERY_TOKEN_RE.findall(text):
+        words = _WORD_RE.findall(phrase or word)
+        if words:
+            parts.append('"' + " ".join(words) + '"')
+    return " AND ".join(parts)
+
+
+def article_key(source: str, rel_path: str) -> str:
+    return f"{source}/{rel_path[:-len('.json')] if rel_path.endswith('.json') else rel_path}"
+
+
+def article_date(record: dict, rel_path: str) -> Optional[str]:
+    published = (record.get("metadata") or {}).get("date_published")
+    if isinstance(published, str) and re.match(r"\d{4}-\d{2}-\d{2}", published):
+        return published[:10]
+    parts = Path(rel_path).parts
+    if len(parts) >= 4 and all(p.isdigit() for p in parts[:3]):
+        return "-".join(parts[:3])
+    return None
+
+
+class SearchIndex:
+    """
+    SQLite-backed article index. Writes are serialized with a lock, so the
+    enricher's worker threads can share one instance; call `commit()` to make
+    them visible to other readers.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # The cleaner and the enricher may write at the same time; wait for the other's commit
+        self._db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+
+    @classmethod
+    def open_existing(cls, data_root) -> Optional["SearchIndex"]:
+        """Opens the index under `data_root` if one has been built, else returns None."""
+        path = Path(data_root) / INDEX_FILE
+        return cls(path) if path.is_file() else None
+
+    # --- Writing ---
+
+    def add(self, source: str, rel_path: str, record: dict, path: Optional[Path] = None,
+            mtime_ns: Optional[int] = None, enriched: bool = False) -> None:
+        """Indexes (or re-indexes) one article."""
+        key = article_key(source, rel_path)
+        content = record.get("content") or {}
+        title = (record.get("metadata") or {}).get("title") or ""
+        body = content.get("article_body") or ""
+        entity_rows = []
+        for entity_type in ENTITY_TYPES:
+            for entity in (record.get("entities") or {}).get(entity_type) or []:
+                if isinstance(entity, dict) and isinstance(entity.get("name"), str) and entity["name"].strip():
+                    entity_rows.append((entity_type, entity["name"], normalize(entity["name"]),
+                                        entity.get("wikidata_id"), entity.get("sentiment")))
+        keyword_rows = {normalize(k) for k in content.get("keywords") or [] if isinstance(k, str) and k.strip()}
+
+        with self._lock:
+            row = self._db.execute("SELECT doc_id FROM docs WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._delete(row[0])
+            cur = self._db.execute(
+                "INSERT INTO docs (key, source, date, title, path, mtime_ns, enriched) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, source, article_date(record, rel_path), title,
+                 str(path) if path is not None else None, mtime_ns, int(enriched)))
+            doc_id = cur.lastrowid
+            self._db.execute("INSERT INTO docs_fts (rowid, title, body) VALUES (?, ?, ?)", (doc_id, title, body))
+            self._db.executemany("INSERT INTO entities VALUES (?, ?, ?, ?, ?, ?)",
+                                 [(doc_id, *entity) for entity in entity_rows])
+            self._db.executemany("INSERT INTO keywords VALUES (?, ?)", [(doc_id, k) for k in keyword_rows])
+
+    def _delete(self, doc_id: int) -> None:
+        self._db.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+        self._db.execute("DELETE FROM docs_fts WHERE rowid = ?", (doc_id,))
+        self._db.execute("DELETE FROM entities WHERE doc_id = ?", (doc_id,))
+        self._db.execute("DELETE FROM keywords WHERE doc_id = ?", (doc_id,))
+
+    def commit(self) -> None:
+        with self._lock:
+            self._db.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def update(self, data_root, sources: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        Brings the index in line with the files under `data_root`: new or modified
+        articles are (re)indexed, articles whose files are gone are dropped. Only
+        file metadata is read for articles that haven't changed.
+        """
+        data_root = Path(data_root)
+        if sources is None:
+            sources = sorted(d.name for d in data_root.iterdir() if d.is_dir() and d.name != "progress")
+        known = {key: (doc_id, path, mtime_ns) for doc_id, key, path, mtime_ns
+                 in self._db.execute("SELECT doc_id, key, path, mtime_ns FROM docs")}
+        counts = {"indexed": 0, "removed": 0, "unchanged": 0}
+        seen = set()
+        for source in sources:
+            current: Dict[str, Tuple[Path, int, bool]] = {}
+            for subdir, enriched in ((TRANSFORMED_SUBDIR, False), (ENRICHED_SUBDIR, True)):
+                base = data_root / source / subdir
+                if base.is_dir():
+                    # The enriched copy, walked second, wins
+                    for rel, _, st in walk_json_files(base):
+                        current[rel] = (base / rel, st.st_mtime_ns, enriched)
+            for i, (rel, (path, mtime_ns, enriched)) in enumerate(sorted(current.items())):
+                key = article_key(source, rel)
+                seen.add(key)
+                entry = known.get(key)
+                if entry is not None and entry[1] == str(path) and entry[2] == mtime_ns:
+                    counts["unchanged"] += 1
+                    continue
+                try:
+                    record = json_codec.load_file(path)
+                except (OSError, json_codec.DecodeError):
+                    continue
+                self.add(source, rel, record, path=path, mtime_ns=mtime_ns, enriched=enriched)
+                counts["indexed"] += 1
+                if counts["indexed"] % 1000 == 0:
+                    self.commit()
+        with self._lock:
+            for key, (doc_id, path, _) in known.items():
+                # Articles from the JSONL store have no file of their own and are left alone
+                if path is not None and key not in seen and key.split("/", 1)[0] in sources:
+                    self._delete(doc_id)
+                    counts["removed"] += 1
+        self.commit()
+        return counts
+
+    def add_cleaned(self, data_root, source: str, rel_path: str, record: Optional[dict] = None) -> None:
+        """
+        Indexes an article the cleaner just wrote (`record` is None for 'files' output,
+        which is then read back). Articles that already have an enriched copy keep it.
+        """
+        data_root = Path(data_root)
+        if (data_root / source / ENRICHED_SUBDIR / rel_path).exists():
+            return
+        path, mtime_ns = None, None
+        if record is None:
+            path = data_root / source / TRANSFORMED_SUBDIR / rel_path
+            try:
+                mtime_ns = path.stat().st_mtime_ns
+                record = json_codec.load_file(path)
+            except (OSError, json_codec.DecodeError):
+                return
+        self.add(source, rel_path, record, path=path, mtime_ns=mtime_ns)
+
+    # --- Querying ---
+
+    def _filters(self, text: Optional[str], entity: Optional[str], keyword: Optional[str],
+                 source: Optional[str], date_from: Optional[str], date_to: Optional[str]) -> Tuple[str, list]:
+        joins, where, params = [], [], []
+        if text:
+            joins.append("JOIN docs_fts ON docs_fts.rowid = docs.doc_id")
+            where.append("docs_fts MATCH ?")
+            params.append(to_fts_query(text))
+        if entity:
+            column = "wikidata_id" if _WIKIDATA_RE.match(entity) else "norm"
+            where.append(f"docs.doc_id IN (SELECT doc_id FROM entities WHERE {column} = ?)")
+            params.append(entity if column == "wikidata_id" else normalize(entity))
+        if keyword:
+            where.append("docs.doc_id IN (SELECT doc_id FROM keywords WHERE norm = ?)")
+            params.append(normalize(keyword))
+        if source:
+            where.append("docs.source = ?")
+            params.append(source)
+        if date_from:
+            where.append("docs.date >= ?")
+            params.append(date_from)
+        if date_to:
+            where.append("docs.date <= ?")
+            params.append(date_to)
+        sql = "FROM docs " + " ".join(joins) + (" WHERE " + " AND ".join(where) if where else "")
+        return sql, params
+
+    def search(self, text: Optional[str] = None, entity: Optional[str] = None, keyword: Optional[str] = None,
+               source: Optional[str] = None, date_from: Optional[str] = None, date_to: Optional[str] = None,
+               limit: int = 20) -> List[dict]:
+        """
+        Returns matching articles, best first: by BM25 relevance when `text` is
+        given, otherwise newest first. `entity` may be a name or a WikiData id;
+        dates are inclusive `YYYY-MM-DD` bounds.
+        """
+        if text is not None and not to_fts_query(text):
+            return []
+        sql, params = self._filters(text, entity, keyword, source, date_from, date_to)
+        if text:
+            columns = ("docs.key, docs.source, docs.date, docs.title, docs.path, bm25(docs_fts) AS score, "
+                       "snippet(docs_fts, 1, '[', ']', ' ... ', 12)")
+            order = "score"
+        else:
+            columns = "docs.key, docs.source, docs.date, docs.title, docs.path, NULL, NULL"
+            order = "docs.date DESC, docs.key"
+        rows = self._db.execute(f"SELECT {columns} {sql} ORDER BY {order} LIMIT ?", params + [limit]).fetchall()
+        return [{"key": key, "source": src, "date": date, "title": title, "path": path,
+                 "score": -score if score is not None else None, "snippet": snippet}
+                for key, src, date, title, path, score, snippet in rows]
+
+    def facets(self, text: Optional[str] = None, entity: Optional[str] = None, keyword: Optional[str] = None,
+               source: Optional[str] = None, date_from: Optional[str] = None,
+               date_to: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """Counts of all matching articles by source and by month (`YYYY-MM`)."""
+        if text is not None and not to_fts_query(text):
+            return {"source": {}, "month": {}}
+        sql, params = self._filters(text, entity, keyword, source, date_from, date_to)
+        by_source = dict(self._db.execute(
+            f"SELECT docs.source, COUNT(*) {sql} GROUP BY docs.source ORDER BY docs.source", params))
+        by_month = dict(self._db.execute(
+            f"SELECT substr(docs.date, 1, 7) AS month, COUNT(*) {sql} GROUP BY month ORDER BY month", params))
+        return {"source": by_source, "month": by_month}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the article search index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    update_parser = subparsers.add_parser("update", help="Create the index or bring it up to date.")
+    update_parser.add_argument("data_dir", help="Data root, e.g. /app/data")
+    update_parser.add_argument("--sources", nargs="+", help="Sources to index (default: all).")
+
+    query_parser = subparsers.add_parser("query", help="Search the index.")
+    query_parser.add_argument("data_dir", help="Data root, e.g. /app/data")
+    query_parser.add_argument("text", nargs="?", help='Words that must all appear; "quoted words" match as a phrase.')
+    query_parser.add_argument("--entity", help="Entity name or WikiData id (e.g. Q1362).")
+    query_parser.add_argument("--keyword", help="Keyword assigned during enrichment.")
+    query_parser.add_argument("--source", help="Only this source (e.g. app or dawn).")
+    query_parser.add_argument("--from", dest="date_from", metavar="YYYY-MM-DD", help="Earliest publication date.")
+    query_parser.add_argument("--to", dest="date_to", metavar="YYYY-MM-DD", help="Latest publication date.")
+    query_parser.add_argument("--limit", type=int, default=20)
+    query_parser.add_argument("--facets", action="store_true", help="Also print counts by source and month.")
+    query_parser.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    index = SearchIndex(Path(args.data_dir) / INDEX_FILE)
+    if args.command == "update":
+        started = time.monotonic()
+        counts = index.update(args.data_dir, args.sources)
+        print(f"✅ Indexed {counts['indexed']}, removed {counts['removed']}, {counts['unchanged']} unchanged "
+              f"in {time.monotonic() - started:.1f}s ({index.path})")
+    else:
+        filters = dict(text=args.text, entity=args.entity, keyword=args.keyword, source=args.source,
+                       date_from=args.date_from, date_to=args.date_to)
+        started = time.monotonic()
+        results = index.search(limit=args.limit, **filters)
+        facets = index.facets(**filters) if args.facets else None
+        elapsed_ms = (time.monotonic() - started) * 1000
+        if args.json:
+            print(json.dumps({"results": results, "facets": facets}, indent=2, ensure_ascii=False))
+        else:
+            for result in results:
+                score = f" {result['score']:.2f}" if result["score"] is not None else ""
+                print(f"{result['date'] or '????-??-??'}  {result['key']}{score}\n    {result['title']}")
+                if result["snippet"]:
+                    print(f"    {result['snippet']}")
+            if facets is not None:
+                print(f"By source: {facets['source']}")
+                print(f"By month:  {facets['month']}")
+            print(f"{len(results)} result(s) in {elapsed_ms:.1f} ms")
+    index.close()
@@ -0,0 +1,259 @@
+"""
+Per-stage metrics for the cleaner and the enricher.
+
+Every stage keeps a `StageMetrics`: fixed-bucket histograms of phase durations
+(read, parse, clean, ascii, serialize, write, prompt build, model latency, ...),
+value histograms (e.g. attempts per model request) and plain counters (files,
+retries, tokens). Recording is a `perf_counter` pair, a bisect and a locked
+increment, so instrumentation stays on in production.
+
+Snapshots are written every `WRITE_EVERY_SECONDS` and at the end of a run to
+`<metrics dir>/<stage>.json` and `<stage>.prom`. The JSON file is read by the
+SRE dashboard (`/api/metrics`); the `.prom` file follows the Prometheus textfile
+format, so a node_exporter textfile collector pointed at the directory picks it up.
+The directory defaults to `<data root>/progress/metrics`; METRICS_DIR overrides
+it and `METRICS_DIR=off` disables the files (metrics are still logged).
+
+    python stage_metrics.py /app/data/progress/metrics
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Optional, Sequence
+
+METRICS_SUBDIR = Path("progress") / "metrics"
+WRITE_EVERY_SECONDS = 15.0
+# Upper bounds in seconds, from sub-millisecond text cleaning up to multi-minute model calls
+TIME_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+COUNT_BUCKETS = (1, 2, 3, 4, 5, 8, 16, 32)
+
+
+def format_count(value: float) -> str:
+    """A counter value printed exactly: whole numbers without exponent, e.g. 12345678 rather than 1.23457e+07."""
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def metrics_dir(data_root, setting: Optional[str] = None) -> Optional[Path]:
+    """
+    Resolves METRICS_DIR (or `setting`): empty means `<data_root>/progress/metrics`,
+    'off' disables the metrics files.
+    """
+    if setting is None:
+        setting = os.environ.get("METRICS_DIR", "")
+    if setting.lower() == "off":
+        return None
+    return Path(setting) if setting else Path(data_root) / METRICS_SUBDIR
+
+
+class Histogram:
+    """Per-bucket (non-cumulative) counts plus count, sum and max; not thread-safe on its own."""
+
+    __slots__ = ("bounds", "buckets", "count", "total", "max")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.buckets = [0] * (len(self.bounds) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (the max for the +Inf bucket)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "mean": round(self.total / self.count, 6) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": round(self.max, 6),
+            "buckets": {str(bound): count for bound, count in zip(self.bounds, self.buckets)},
+            "overflow": self.buckets[-1],
+        }
+
+
+class StageMetrics:
+    """
+    Thread-safe metrics of one pipeline stage. `timer(phase)` and `observe_phase`
+    record durations, `observe(name, value)` other values and `count(name, n)`
+    counters; `files_per_second` is derived from the 'files' counter.
+    """
+
+    def __init__(self, stage: str, directory: Optional[Path] = None,
+                 write_every: float = WRITE_EVERY_SECONDS):
+        self.stage = stage
+        self.directory = Path(directory) if directory is not None else None
+        self.write_every = write_every
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self._next_write = time.monotonic() + write_every
+        self._lock = threading.Lock()
+        self._phases: Dict[str, Histogram] = {}
+        self._values: Dict[str, Histogram] = {}
+        self._counters: Dict[str, float] = {}
+
+    def observe_phase(self, phase: str, seconds: float):
+        with self._lock:
+            histogram = self._phases.get(phase)
+            if histogram is None:
+                histogram = self._phases[phase] = Histogram(TIME_BUCKETS)
+            histogram.observe(seconds)
+
+    def observe_phases(self, timings: Dict[str, float]):
+        """Records several phase durations at once, e.g. those measured in a worker process."""
+        with self._lock:
+            for phase, seconds in timings.items():
+                histogram = self._phases.get(phase)
+                if histogram is None:
+                    histogram = self._phases[phase] = Histogram(TIME_BUCKETS)
+                histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, phase: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_phase(phase, time.perf_counter() - started)
+
+    def observe(self, name: str, value: float, bounds: Sequence[float] = COUNT_BUCKETS):
+        with self._lock:
+            histogram = self._values.get(name)
+            if histogram is None:
+                histogram = self._values[name] = Histogram(bounds)
+            histogram.observe(value)
+
+    def count(self, name: str, n: float = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def snapshot(self) -> dict:
+        elapsed = time.perf_counter() - self._started
+        with self._lock:
+            counters = dict(self._counters)
+            phases = {phase: h.to_dict() for phase, h in sorted(self._phases.items())}
+            values = {name: h.to_dict() for name, h in sorted(self._values.items())}
+        files = counters.get("files", 0)
+        return {
+            "stage": self.stage,
+            "pid": os.getpid(),
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "elapsed_seconds": round(elapsed, 3),
+            "files": files,
+            "files_per_second": round(files / elapsed, 3) if elapsed > 0 else None,
+            "phases": phases,
+            "histograms": values,
+            "counters": counters,
+        }
+
+    def maybe_write(self):
+        """Writes a snapshot if WRITE_EVERY_SECONDS have passed; cheap enough to call per file."""
+        if self.directory is None or time.monotonic() < self._next_write:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_write:
+                return  # another thread got here first
+            self._next_write = now + self.write_every
+        self.write()
+
+    def write(self) -> Optional[dict]:
+        """Writes `<stage>.json` and `<stage>.prom` atomically and returns the snapshot."""
+        if self.directory is None:
+            return None
+        snapshot = self.snapshot()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for suffix, text in ((".json", json.dumps(snapshot, indent=2) + "\n"), (".prom", to_prometheus(snapshot))):
+            path = self.directory / f"{self.stage}{suffix}"
+            # One temp file per writer, so the stages of a streaming run never share one
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        return snapshot
+
+    def describe(self) -> str:
+        snapshot = self.snapshot()
+        rate = snapshot["files_per_second"]
+        phases = ", ".join(f"{phase} {h['mean'] * 1000:.2f} ms (p95 {h['p95'] * 1000:.1f})"
+                           for phase, h in snapshot["phases"].items())
+        return (f"{format_count(snapshot['files'])} files in {snapshot['elapsed_seconds']:.1f}s"
+                f"{f' ({rate:.1f}/s)' if rate else ''}; mean per call: {phases or 'none'}")
+
+
+def _prom_histogram(lines: list, name: str, labels: str, histogram: dict):
+    cumulative = 0
+    for bound, count in histogram["buckets"].items():
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+    lines.append(f"{name}_sum{{{labels}}} {histogram['sum']}")
+    lines.append(f"{name}_count{{{labels}}} {histogram['count']}")
+
+
+def to_prometheus(snapshot: dict) -> str:
+    """Renders a snapshot in the Prometheus text exposition format."""
+    stage = snapshot["stage"]
+    lines = [
+        "# HELP pipeline_phase_seconds Duration of one pipeline phase per call.",
+        "# TYPE pipeline_phase_seconds histogram",
+    ]
+    for phase, histogram in snapshot["phases"].items():
+        _prom_histogram(lines, "pipeline_phase_seconds", f'stage="{stage}",phase="{phase}"', histogram)
+    for name, histogram in snapshot["histograms"].items():
+        lines.append(f"# TYPE pipeline_{name} histogram")
+        _prom_histogram(lines, f"pipeline_{name}", f'stage="{stage}"', histogram)
+    for name, value in sorted(snapshot["counters"].items()):
+        lines.append(f"# TYPE pipeline_{name}_total counter")
+        lines.append(f'pipeline_{name}_total{{stage="{stage}"}} {format_count(value)}')
+    lines.append("# TYPE pipeline_files_per_second gauge")
+    lines.append(f'pipeline_files_per_second{{stage="{stage}"}} {snapshot["files_per_second"] or 0}')
+    lines.append("# TYPE pipeline_last_update_timestamp_seconds gauge")
+    lines.append(f'pipeline_last_update_timestamp_seconds{{stage="{stage}"}} {time.time():.0f}')
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the metrics files written by the pipeline stages.")
+    parser.add_argument("directory", help="Metrics directory (e.g. /app/data/progress/metrics).")
+    args = parser.parse_args()
+
+    for path in sorted(Path(args.directory).glob("*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        rate = snapshot.get("files_per_second")
+        print(f"{snapshot['stage']}: {format_count(snapshot['files'])} files in {snapshot['elapsed_seconds']:.1f}s"
+              f" ({rate or 0:.1f}/s), updated {snapshot['updated_at']}")
+        for phase, h in snapshot["phases"].items():
+            print(f"  {phase:14} {h['count']:>9} calls  mean {h['mean'] * 1000:9.3f} ms  "
+                  f"p95 ≤{h['p95'] * 1000:9.3f} ms  max {h['max'] * 1000:9.3f} ms")
+        for name, h in snapshot["histograms"].items():
+            print(f"  {name:14} {h['count']:>9} obs    mean {h['mean']:9.3f}     p95 ≤{h['p95']:g}  max {h['max']:g}")
+        for name, value in sorted(snapshot["counters"].items()):
+            print(f"  {name:24} {format_count(value)}")
@@ -0,0 +1,135 @@
+"""
+Regression checks for `file_inventory.FileInventory` (the per-directory listing cache).
+Run with: python -m pytest data_common/test_common
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+HERE = Path(__file__).resolve().parent
+
+sys.path.insert(0, str(HERE.parent))
+import file_inventory  # noqa: E402
+from file_inventory import FileInventory, walk_json_files  # noqa: E402
+from partition import Partition  # noqa: E402
+
+DAYS = ("2025/02/28", "2025/03/01", "2025/03/02")
+
+
+def write(path: Path, text: str = "{}"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+@pytest.fixture
+def tree(tmp_path: Path, monkeypatch) -> Path:
+    # Trust every directory listed before the scan started, however recently it changed
+    monkeypatch.setattr(file_inventory, "RACY_SECONDS", 0.0)
+    root = tmp_path / "articles"
+    for day in DAYS:
+        for name in ("a", "b"):
+            write(root / day / f"{day.replace('/', '')}{name}.json")
+    return root
+
+
+def reopen(inventory: FileInventory) -> FileInventory:
+    inventory.save()
+    return FileInventory(inventory.root, inventory.cache_path)
+
+
+def listing(root: Path) -> dict:
+    return {rel: (st.st_mtime_ns, st.st_size) for rel, _, st in walk_json_files(root)}
+
+
+def test_listing_matches_a_plain_walk_in_path_order(tree: Path, tmp_path: Path):
+    inventory = FileInventory(tree, tmp_path / "cache.json")
+    files = list(inventory.iter_files())
+
+    assert [rel for rel, _ in files] == sorted(listing(tree))
+    assert {rel: tuple(st) for rel, st in files} == listing(tree)
+
+
+def test_unchanged_directories_are_served_from_the_cache(tree: Path, tmp_path: Path):
+    inventory = FileInventory(tree, tmp_path / "cache.json")
+    first = inventory.files()
+    inventory = reopen(inventory)
+
+    assert inventory.files() == first
+    assert inventory.dirs_scanned == 0
+    assert inventory.dirs_cached == 1 + 1 + 2 + 3  # root, 2025, two months, three days
+
+
+def test_added_and_removed_files_are_seen(tree: Path, tmp_path: Path):
+    inventory = FileInventory(tree, tmp_path / "cache.json")
+    inventory.files()
+    inventory = reopen(inventory)
+    write(tree / "2025/03/01/new.json")
+    (tree / "2025/03/02/20250302a.json").unlink()
+    inventory = reopen(inventory)
+
+    files = inventory.files()
+    assert "2025/03/01/new.json" in files
+    assert "2025/03/02/20250302a.json" not in files
+    assert files.keys() == listing(tree).keys()
+    assert inventory.dirs_scanned == 2
+
+
+def test_in_place_rewrites_need_a_rescan(tree: Path, tmp_path: Path):
+    inventory = FileInventory(tree, tmp_path / "cache.json")
+    rel = "2025/03/01/20250301a.json"
+    before = inventory.files()[rel]
+    day_dir = tree / "2025/03/01"
+    day_mtime = day_dir.stat().st_mtime_ns
+    (tree / rel).write_text('{"changed": true}')
+    os.utime(day_dir, ns=(day_mtime, day_mtime))  # what an in-place write leaves behind
+
+    assert inventory.files()[rel] == before
+    assert inventory.files(rescan=True)[rel].st_size == len('{"changed": true}')
+
+
+def test_recently_changed_directories_are_scanned_again(tree: Path, tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(file_inventory, "RACY_SECONDS", 3600.0)
+    inventory = FileInventory(tree, tmp_path / "cache.json")
+    inventory.files()
+    inventory = reopen(inventory)
+
+    assert inventory.dirs_cached == 0
+
+
+def test_a_partition_keeps_the_cached_listings_it_skips(tree: Path, tmp_path: Path):
+    inventory = FileInventory(tree, tmp_path / "cache.json")
+    inventory.files()
+    inventory = reopen(inventory)
+    march = Partition("2025-03-01", "2025-03-31")
+
+    assert set(inventory.files(partition=march)) == {
+        "2025/03/01/20250301a.json", "2025/03/01/20250301b.json",
+        "2025/03/02/20250302a.json", "2025/03/02/20250302b.json"}
+    inventory = reopen(inventory)
+    assert len(inventory.files()) == 2 * len(DAYS)
+    assert inventory.dirs_scanned == 0
+
+
+def test_pending_lists_files_missing_from_the_output_tree(tree: Path, tmp_path: Path):
+    done_root = tmp_path / "done"
+    write(done_root / "2025/03/01/20250301a.json")
+    inventory = FileInventory(tree, with_stats=False)
+
+    pending = inventory.pending(FileInventory(done_root, with_stats=False))
+    assert "2025/03/01/20250301a.json" not in pending
+    assert pending == sorted(set(listing(tree)) - {"2025/03/01/20250301a.json"})
+
+
+def test_a_cache_for_another_root_is_ignored(tree: Path, tmp_path: Path):
+    cache = tmp_path / "cache.json"
+    inventory = FileInventory(tree, cache)
+    inventory.files()
+    inventory.save()
+    other = tmp_path / "other"
+    write(other / "2025/01/01/x.json")
+
+    inventory = FileInventory(other, cache)
+    assert list(inventory.files()) == ["2025/01/01/x.json"]
+    assert inventory.dirs_cached == 0
@@ -0,0 +1,90 @@
+"""
+Checks that every `json_codec` backend writes the same bytes as the stdlib.
+Run with: python -m pytest data_common/test_common
+"""
+import json
+import math
+import sys
+from pathlib import Path
+
+import pytest
+
+HERE = Path(__file__).resolve().parent
+
+sys.path.insert(0, str(HERE.parent))
+import json_codec  # noqa: E402
+
+BACKENDS = [name for name, available in json_codec._AVAILABLE.items() if available]
+
+ARTICLE = {
+    "article_id": "0bae1814a0054f4082f3dd6ec96ba50c",
+    "source_info": {"source_name": "Dawn", "source_link": "https://www.dawn.com/news/1", "retrieved_at": None},
+    "metadata": {
+        "title": "Karachi’s “new” budget — Rs1.2tr in Ürdu / اردو",
+        "author": "Staff Reporter",
+        "categories": ["Pakistan", "Business"],
+        "word_count": 812,
+        "reading_time_minutes": 5,
+        "score": 0.25,
+        "is_opinion": False,
+    },
+    "content": {
+        "article_body": 'Quotes "inside", a back\\slash, a tab\t, a newline\n and \u0001 control.',
+        "summary": "",
+        "keywords": [],
+    },
+    "entities": {"people": [{"name": "Imran Khan", "wikidata_id": "Q312447", "sentiment": "Neutral"}],
+                 "organizations": [], "locations": []},
+    "empty": {},
+}
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch) -> str:
+    monkeypatch.setattr(json_codec, "BACKEND", request.param)
+    monkeypatch.setattr(json_codec, "COMPACT_OUTPUT", False)
+    return request.param
+
+
+def stdlib_article(obj) -> bytes:
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+def test_articles_match_the_stdlib_byte_for_byte(backend: str):
+    assert json_codec.dumps_article(ARTICLE) == stdlib_article(ARTICLE)
+    assert json_codec.loads(json_codec.dumps_article(ARTICLE)) == ARTICLE
+
+
+def test_compact_output_matches_the_stdlib(backend: str):
+    assert json_codec.dumps(ARTICLE) == json.dumps(ARTICLE, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+@pytest.mark.parametrize("value", [math.nan, math.inf, -math.inf])
+def test_non_finite_floats_fall_back_to_the_stdlib(backend: str, value: float):
+    article = dict(ARTICLE, metadata=dict(ARTICLE["metadata"], score=value))
+
+    encoded = json_codec.dumps_article(article)
+    assert encoded == stdlib_article(article)
+    assert b"null" not in encoded.split(b'"score"')[1].split(b"\n")[0]
+
+
+def test_integers_beyond_64_bits_fall_back_to_the_stdlib(backend: str):
+    article = dict(ARTICLE, big=2 ** 70)
+    assert json_codec.dumps_article(article) == stdlib_article(article)
+
+
+def test_invalid_json_raises_decode_error(backend: str):
+    with pytest.raises(json_codec.DecodeError):
+        json_codec.loads(b'{"title": ')
+
+
+def test_raw_articles_decode_from_either_schema(backend: str):
+    flat = {"title": "T", "content": "Body", "source": "APP", "link": "L", "categories": ["A"], "extra": [1, 2]}
+    nested = {"metadata": {"title": "T", "categories": ["A"]}, "content": {"article_body": "Body"},
+              "source_info": {"source_name": "APP", "source_link": "L"}}
+    for record in (flat, nested):
+        article = json_codec.decode_raw_article(json.dumps(record).encode("utf-8"))
+        assert (article.title, article.body, article.source_name, article.source_link, article.categories) == \
+            ("T", "Body", "APP", "L", ["A"])
+    with pytest.raises(json_codec.DecodeError):
+        json_codec.decode_raw_article(b"[1, 2]")
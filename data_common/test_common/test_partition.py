@@ -0,0 +1,95 @@
+"""
+Regression checks for `partition.Partition` (date ranges and hash shards).
+Run with: python -m pytest data_common/test_common
+"""
+import sys
+import zlib
+from pathlib import Path
+
+import pytest
+
+HERE = Path(__file__).resolve().parent
+
+sys.path.insert(0, str(HERE.parent))
+from partition import Partition, parse_shard  # noqa: E402
+
+IDS = [f"{i:032x}" for i in range(0, 4000, 7)]
+
+
+def test_everything_includes_every_path():
+    partition = Partition()
+    assert partition.is_everything
+    assert partition.includes("misc/not-a-date.json")
+    assert partition.includes_dir("anything/")
+
+
+@pytest.mark.parametrize("rel_path, included", [
+    ("2025/02/28/a.json", False),
+    ("2025/03/01/a.json", True),
+    ("2025/03/31/a.json", True),
+    ("2025/04/01/a.json", False),
+    ("misc/a.json", False),
+])
+def test_date_range_is_inclusive(rel_path: str, included: bool):
+    assert Partition("2025-03-01", "2025-03-31").includes(rel_path) is included
+
+
+@pytest.mark.parametrize("rel_dir, included", [
+    ("2024/", False),
+    ("2025/", True),
+    ("2025/02/", False),
+    ("2025/03/", True),
+    ("2025/03/14/", True),
+    ("2025/04/", True),
+    ("2025/04/02/", True),
+    ("2025/04/03/", False),
+    ("2026/", False),
+    ("misc/", False),
+    ("2025/03/14/nested/", True),
+])
+def test_includes_dir_prunes_by_date_prefix(rel_dir: str, included: bool):
+    assert Partition("2025-03-10", "2025-04-02").includes_dir(rel_dir) is included
+
+
+def test_open_ended_ranges():
+    assert Partition(date_from="2025-03-01").includes("2030/01/01/a.json")
+    assert not Partition(date_from="2025-03-01").includes_dir("2025/02/")
+    assert Partition(date_to="2025-03-01").includes("1999/12/31/a.json")
+    assert not Partition(date_to="2025-03-01").includes_dir("2025/03/02/")
+
+
+def test_shards_split_every_article_exactly_once():
+    shards = [Partition(shard=f"{i}/4") for i in range(4)]
+    for article_id in IDS:
+        rel_path = f"2025/03/01/{article_id}.json"
+        owners = [i for i, shard in enumerate(shards) if shard.includes(rel_path)]
+        assert owners == [zlib.crc32(article_id.encode("utf-8")) % 4]
+    assert all(any(shard.includes(f"2025/03/01/{a}.json") for a in IDS) for shard in shards)
+
+
+def test_shards_hash_the_article_id_not_its_directory():
+    shard = Partition(shard="1/3")
+    assert {shard.includes(f"{day}/{IDS[5]}.json") for day in ("2025/01/01", "2024/12/31", "misc")} == {
+        shard.includes(f"{IDS[5]}.json")}
+    assert shard.includes_dir("2025/01/")  # shards never prune directories
+
+
+def test_dates_and_shard_combine():
+    partition = Partition("2025-03-01", "2025-03-01", "0/2")
+    in_shard = next(a for a in IDS if zlib.crc32(a.encode("utf-8")) % 2 == 0)
+    assert partition.includes(f"2025/03/01/{in_shard}.json")
+    assert not partition.includes(f"2025/03/02/{in_shard}.json")
+    assert partition.tag() == "2025-03-01_2025-03-01_shard0of2"
+
+
+@pytest.mark.parametrize("text", ["4/4", "-1/4", "1/0", "1", "a/b", "1/2/3"])
+def test_bad_shards_are_rejected(text: str):
+    with pytest.raises(ValueError):
+        parse_shard(text)
+
+
+def test_bad_ranges_are_rejected():
+    with pytest.raises(ValueError):
+        Partition("2025-03-02", "2025-03-01")
+    with pytest.raises(ValueError):
+        Partition("2025/03/01")
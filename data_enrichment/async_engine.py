@@ -0,0 +1,195 @@
+"""
+Asyncio enrichment engine.
+
+Every provider call goes through one shared connection pool and a per-provider
+concurrency cap, so a local Ollama server gets exactly as many requests as it has
+batch slots (OLLAMA_NUM_PARALLEL) and no more. Retries back off with full jitter
+on `asyncio.sleep`, so a waiting retry does not hold a worker slot.
+
+An optional `AdaptiveRateController` (rate_control.py) can sit in front of the
+cap to adapt in-flight requests and request rate to observed latency and errors.
+An optional `StageMetrics` (stage_metrics.py) records model latency, attempts,
+token counts and the repairs `structured_output.parse_json` made to answers.
+
+Run `stub_ollama_server.py` and point OLLAMA_API_URL at it to exercise the engine
+without a real model.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Iterable, Optional, Tuple
+
+import httpx
+
+from rate_control import AdaptiveRateController, estimate_tokens
+from structured_output import parse_json
+
+DEFAULT_REQUEST_TIMEOUT = 300.0  # seconds; large local models can take minutes per article
+
+
+def backoff_delay(attempt: int, initial_backoff: float, max_backoff: float = 60.0) -> float:
+    """Full-jitter exponential backoff: a random delay in [0, initial * 2**attempt], capped."""
+    return random.uniform(0, min(max_backoff, initial_backoff * (2 ** attempt)))
+
+
+class OllamaAsyncProvider:
+    """Calls Ollama's /api/chat over a shared httpx connection pool."""
+
+    name = "ollama"
+
+    def __init__(self, base_url: str, model: str, max_connections: int,
+                 timeout: float = DEFAULT_REQUEST_TIMEOUT):
+        self.model = model
+        self.client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    async def complete(self, system_prompt: str, user_prompt: str) -> Tuple[str, Optional[int]]:
+        """Returns the response text and the total tokens the server reports, if any."""
+        response = await self.client.post("/api/chat", json={
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            "format": "json",
+            "stream": False,
+        })
+        response.raise_for_status()
+        payload = response.json()
+        tokens_used = payload.get("prompt_eval_count", 0) + payload.get("eval_count", 0)
+        return payload["message"]["content"], tokens_used or None
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class GeminiAsyncProvider:
+    """Wraps a `google.generativeai.GenerativeModel` using its native async API."""
+
+    name = "google"
+
+    def __init__(self, model):
+        self.model = model
+
+    async def complete(self, system_prompt: str, user_prompt: str) -> Tuple[str, Optional[int]]:
+        """Returns the response text and the total tokens Gemini reports, if any."""
+        # The system prompt is baked into the GenerativeModel (system_instruction)
+        response = await self.model.generate_content_async(user_prompt)
+        usage = getattr(response, "usage_metadata", None)
+        return response.text, getattr(usage, "total_token_count", None)
+
+    async def aclose(self):
+        pass
+
+
+class AsyncEnrichmentEngine:
+    """
+    Sends prompts to one provider with at most `max_concurrency` requests in
+    flight, retrying failed or unparsable responses with jittered backoff. Answers
+    with a code fence, trailing commas or a truncated end are repaired instead of retried.
+    """
+
+    def __init__(self, provider, system_prompt: str, max_concurrency: int,
+                 max_retries: int = 3, initial_backoff: float = 2.0,
+                 controller: Optional[AdaptiveRateController] = None, metrics=None):
+        self.provider = provider
+        self.controller = controller
+        self.metrics = metrics
+        self.system_prompt = system_prompt
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    async def _complete(self, user_prompt: str) -> Tuple[str, Optional[int]]:
+        started = time.perf_counter()
+        try:
+            return await self.provider.complete(self.system_prompt, user_prompt)
+        finally:
+            if self.metrics is not None:
+                self.metrics.observe_phase("model", time.perf_counter() - started)
+
+    def _record(self, attempts: int, estimated: int, tokens_used: Optional[int], failed: bool = False):
+        """Counts one request: its attempts, estimated prompt tokens, reported tokens and whether it failed."""
+        if self.metrics is None:
+            return
+        self.metrics.count("requests")
+        self.metrics.observe("model_attempts", attempts)
+        self.metrics.count("retries", attempts - 1)
+        self.metrics.count("prompt_tokens_estimated", estimated)
+        if tokens_used:
+            self.metrics.count("tokens_reported", tokens_used)
+        if failed:
+            self.metrics.count("request_failures")
+
+    def _record_answer(self, repairs: list, wasted_tokens: int = 0):
+        """Counts the local repairs of an answer, or the tokens of one that could not be parsed."""
+        if self.metrics is None:
+            return
+        for kind in repairs:
+            self.metrics.count(f"repair_{kind}")
+        if wasted_tokens:
+            self.metrics.count("invalid_responses")
+            self.metrics.count("tokens_wasted", wasted_tokens)
+
+    async def get_response(self, user_prompt: str, label: str = "") -> Optional[dict]:
+        """Returns the parsed JSON response, or None once all retries are exhausted."""
+        estimated = estimate_tokens(self.system_prompt) + estimate_tokens(user_prompt)
+        for attempt in range(self.max_retries):
+            response_text = tokens_used = None
+            try:
+                if self.controller is None:
+                    # Hold a provider slot only while the request is actually in flight
+                    async with self._slots:
+                        response_text, tokens_used = await self._complete(user_prompt)
+                else:
+                    # Admission first, so waiting on the adaptive limits does not hold a slot
+                    async with self.controller.request_async(estimated) as ticket, self._slots:
+                        response_text, ticket.tokens_used = await self._complete(user_prompt)
+                    tokens_used = ticket.tokens_used
+                parsed, repairs = parse_json(response_text)
+                self._record(attempt + 1, estimated, tokens_used)
+                self._record_answer(repairs)
+                return parsed
+            except Exception as e:
+                if response_text is not None:
+                    self._record_answer([], tokens_used or estimated + estimate_tokens(response_text))
+                logging.error(f"{self.provider.name} request for {label} failed on attempt "
+                              f"{attempt + 1}/{self.max_retries}: {e}")
+                if attempt < self.max_retries - 1:
+                    delay = backoff_delay(attempt, self.initial_backoff)
+                    logging.info(f"Retrying {label} in {delay:.1f} seconds...")
+                    await asyncio.sleep(delay)
+                else:
+                    logging.error(f"Max retries reached for {label}. Giving up.")
+        self._record(self.max_retries, estimated, None, failed=True)
+        return None
+
+    async def aclose(self):
+        await self.provider.aclose()
+
+
+async def run_bounded(jobs: Iterable[Any], handle: Callable[[Any], Awaitable[None]], max_in_flight: int,
+                      on_done: Optional[Callable[[Any, Optional[BaseException]], None]] = None):
+    """
+    Runs `handle(job)` for every job with at most `max_in_flight` jobs active.
+    Jobs are pulled lazily from the iterable, so memory stays flat for any
+    number of jobs. `on_done(job, exc)` is called after each job finishes.
+    """
+    jobs = iter(jobs)
+
+    async def worker():
+        for job in jobs:
+            exc = None
+            try:
+                await handle(job)
+            except Exception as e:
+                exc = e
+            if on_done is not None:
+                on_done(job, exc)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, max_in_flight))))
@@ -0,0 +1,700 @@
+"""
+Embedding index for related-article search and topic clustering.
+
+`update` embeds the title and `article_body` of every transformed article with a
+CPU sentence-embedding model, in batches:
+
+- `onnx`: a sentence-transformers model exported to ONNX (e.g. with
+  `optimum-cli export onnx --model sentence-transformers/all-MiniLM-L6-v2 <dir>`);
+  `--model` is the export directory (`model.onnx`, `tokenizer.json`). Token
+  embeddings are mean-pooled unless the export has a `sentence_embedding` output.
+- `sentence-transformers`: the model name or directory, run on the CPU with PyTorch.
+
+Neither backend is installed with the enricher; see requirements.txt.
+
+Everything lives in `<data root>/progress/embeddings/`:
+
+    meta.json             model, dimension, committed row count, generation
+    vectors.<gen>.f16     float16 matrix, one L2-normalized row per embedding (memory-mapped)
+    rows.<gen>.jsonl      `[key, mtime_ns]` per row; key is `<source>/YYYY/MM/DD/<id>`
+    ivf.<gen>.npz         IVF centroids and the cell of every row (or hnsw.<gen>.bin)
+
+New and modified articles are appended, so a daily run only embeds the new days;
+an article that changed gets a new row and its old one is ignored. Rows and
+vectors are appended before `meta.json` is replaced with the new row count, so a
+killed run loses at most its last uncommitted batch. Once a fifth of the rows are
+dead, the files are rewritten under the next generation.
+
+Queries go through an approximate nearest-neighbour index (`--ann`):
+
+- `ivf` (default, numpy only): spherical k-means cells over the rows; a query
+  scans the rows of its `IVF_NPROBE` nearest cells. New rows join their nearest
+  cell, and the cells are retrained whenever the corpus has doubled.
+- `hnsw`: an hnswlib graph, extended in place as rows are added.
+- `exact`: every row is scored. Below `IVF_MIN_ROWS` rows this is what IVF does too.
+
+    python embedding_index.py update /app/data --backend onnx --model /models/all-MiniLM-L6-v2-onnx
+    python embedding_index.py related /app/data dawn/2025/03/01/<id> --limit 10
+    python embedding_index.py query /app/data "flood relief in Sindh"
+    python embedding_index.py clusters /app/data --k 30
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:  # only needed by this stage; see requirements.txt
+    np = None
+
+# search_index.py lives in ../data_common in the repo and next to this script in the image
+sys.path.append(str(Path(__file__).resolve().parent.parent / "data_common"))
+from file_inventory import walk_json_files  # noqa: E402
+import json_codec  # noqa: E402
+from search_index import TRANSFORMED_SUBDIR, article_key  # noqa: E402
+
+EMBEDDINGS_SUBDIR = Path("progress") / "embeddings"
+INDEX_VERSION = 1
+BACKENDS = ("onnx", "sentence-transformers")
+ANN_METHODS = ("ivf", "hnsw", "exact")
+MAX_TOKENS = 256  # what MiniLM-style models are trained on; longer articles are truncated
+COMMIT_EVERY = 1024  # rows appended between commits of meta.json
+COMPACT_DEAD_FRACTION = 0.2
+IVF_MIN_ROWS = 4096  # below this an exact scan takes a couple of milliseconds
+IVF_NPROBE = 16
+IVF_RETRAIN_GROWTH = 2.0
+KMEANS_SAMPLE = 50_000
+KMEANS_ITERATIONS = 20
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 128
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("The embedding index requires the 'numpy' package (pip install numpy).")
+
+
+def _normalize(vectors: "np.ndarray") -> "np.ndarray":
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def article_text(record: dict) -> str:
+    """What gets embedded: the title, then the body."""
+    title = (record.get("metadata") or {}).get("title") or ""
+    body = (record.get("content") or {}).get("article_body") or ""
+    return f"{title}. {body}" if title else body
+
+
+# --- Encoders ---
+
+class Encoder:
+    """A batched sentence-embedding model; subclasses implement `encode`."""
+
+    backend = ""
+
+    def __init__(self, model: str, batch_size: int):
+        self.model = model
+        self.batch_size = batch_size
+        self.dim = 0
+
+    def encode(self, texts: list) -> "np.ndarray":
+        """L2-normalized float32 embeddings, one row per text."""
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        return f"{self.backend} model {self.model} ({self.dim} dimensions), batches of {self.batch_size}"
+
+
+class OnnxEncoder(Encoder):
+    backend = "onnx"
+
+    def __init__(self, model: str, batch_size: int, threads: int = 0):
+        super().__init__(model, batch_size)
+        try:
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError("The onnx embedding backend requires the 'onnxruntime' and 'tokenizers' "
+                               "packages (pip install onnxruntime tokenizers).") from e
+        model_dir = Path(model)
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.no_padding()
+        self.tokenizer.enable_truncation(max_length=MAX_TOKENS)
+        options = onnxruntime.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(str(model_dir / "model.onnx"), options,
+                                                    providers=["CPUExecutionProvider"])
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        outputs = [item.name for item in self.session.get_outputs()]
+        self.output = "sentence_embedding" if "sentence_embedding" in outputs else outputs[0]
+        self.dim = self.encode(["dimension probe"]).shape[1]
+
+    def encode(self, texts: list) -> "np.ndarray":
+        encodings = self.tokenizer.encode_batch(texts)
+        result = [None] * len(texts)
+        # Batches of similar length, so little padding is run through the model
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i].ids))
+        for start in range(0, len(order), self.batch_size):
+            chunk = order[start:start + self.batch_size]
+            width = max(1, max(len(encodings[i].ids) for i in chunk))
+            input_ids = np.zeros((len(chunk), width), dtype=np.int64)
+            attention_mask = np.zeros((len(chunk), width), dtype=np.int64)
+            for row, i in enumerate(chunk):
+                ids = encodings[i].ids
+                input_ids[row, :len(ids)] = ids
+                attention_mask[row, :len(ids)] = 1
+            feed = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feed["token_type_ids"] = np.zeros_like(input_ids)
+            output = self.session.run([self.output], feed)[0].astype(np.float32)
+            if output.ndim == 3:  # token embeddings: mean over the real tokens
+                mask = attention_mask[:, :, None].astype(np.float32)
+                output = (output * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1.0)
+            for row, i in enumerate(chunk):
+                result[i] = output[row]
+        return _normalize(np.stack(result))
+
+
+class SentenceTransformerEncoder(Encoder):
+    backend = "sentence-transformers"
+
+    def __init__(self, model: str, batch_size: int, threads: int = 0):
+        super().__init__(model, batch_size)
+        try:
+            from sentence_transformers import SentenceTransformer
+            import torch
+        except ImportError as e:
+            raise RuntimeError("The sentence-transformers embedding backend requires the 'sentence-transformers' "
+                               "package (pip install sentence-transformers).") from e
+        if threads > 0:
+            torch.set_num_threads(threads)
+        self.st_model = SentenceTransformer(model, device="cpu")
+        self.st_model.max_seq_length = min(self.st_model.max_seq_length or MAX_TOKENS, MAX_TOKENS)
+        self.dim = self.st_model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: list) -> "np.ndarray":
+        vectors = self.st_model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True,
+                                       normalize_embeddings=True, show_progress_bar=False)
+        return vectors.astype(np.float32)
+
+
+def load_encoder(backend: str, model: str = "", batch_size: int = 64, threads: int = 0) -> Encoder:
+    """Loads the configured backend; raises RuntimeError if its packages are missing."""
+    _require_numpy()
+    if backend == "onnx":
+        if not model:
+            raise ValueError("The onnx embedding backend needs --model set to an ONNX export directory.")
+        return OnnxEncoder(model, batch_size, threads)
+    if backend == "sentence-transformers":
+        return SentenceTransformerEncoder(model or "sentence-transformers/all-MiniLM-L6-v2", batch_size, threads)
+    raise ValueError(f"Invalid embedding backend: '{backend}'. Must be one of {', '.join(BACKENDS)}.")
+
+
+# --- Approximate nearest neighbours ---
+
+def kmeans(vectors: "np.ndarray", k: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> "np.ndarray":
+    """Spherical k-means (cosine similarity) over normalized float32 rows; returns the unit centroids."""
+    rng = np.random.default_rng(seed)
+    k = max(1, min(k, len(vectors)))
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        cells = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, cells, vectors)
+        empty = ~sums.any(axis=1)
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]  # reseed empty cells
+        centroids = _normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted lists over k-means cells: `cells[row]` is the cell of each row."""
+
+    def __init__(self, centroids: "np.ndarray", cells: "np.ndarray", trained_rows: int):
+        self.centroids = centroids
+        self.cells = cells
+        self.trained_rows = trained_rows
+        self._lists = None
+
+    @classmethod
+    def train(cls, vectors: "np.ndarray", live: "np.ndarray") -> "IVFIndex":
+        rows = np.flatnonzero(live)
+        rng = np.random.default_rng(0)
+        sample = rows if len(rows) <= KMEANS_SAMPLE else np.sort(rng.choice(rows, KMEANS_SAMPLE, replace=False))
+        centroids = kmeans(np.asarray(vectors[sample], dtype=np.float32), int(np.sqrt(len(rows))) or 1)
+        index = cls(centroids, np.zeros(0, dtype=np.int32), len(rows))
+        index.add(vectors)
+        return index
+
+    def add(self, vectors: "np.ndarray"):
+        """Assigns the rows after the ones already placed to their nearest cell."""
+        new_cells = [np.argmax(np.asarray(vectors[start:start + 65536], dtype=np.float32) @ self.centroids.T, axis=1)
+                     for start in range(len(self.cells), len(vectors), 65536)]
+        self.cells = np.concatenate([self.cells] + new_cells).astype(np.int32)
+        self._lists = None
+
+    def size(self) -> int:
+        return len(self.cells)
+
+    def candidates(self, query: "np.ndarray", nprobe: int = 0) -> "np.ndarray":
+        nprobe = nprobe or IVF_NPROBE
+        if self._lists is None:
+            order = np.argsort(self.cells, kind="stable")
+            bounds = np.concatenate([[0], np.cumsum(np.bincount(self.cells, minlength=len(self.centroids)))])
+            self._lists = (order, bounds)
+        order, bounds = self._lists
+        probes = np.argsort(self.centroids @ query)[::-1][:nprobe]
+        return np.sort(np.concatenate([order[bounds[cell]:bounds[cell + 1]] for cell in probes]))
+
+    def save(self, path: Path):
+        buffer = _npz_bytes(centroids=self.centroids, cells=self.cells, trained_rows=np.array(self.trained_rows))
+        json_codec.write_atomic(path, buffer)
+
+    @classmethod
+    def load(cls, path: Path) -> "IVFIndex":
+        with np.load(path) as data:
+            return cls(data["centroids"], data["cells"], int(data["trained_rows"]))
+
+
+class HNSWIndex:
+    """An hnswlib graph over the rows (inner product on normalized vectors)."""
+
+    def __init__(self, dim: int, path: Path = None):
+        try:
+            import hnswlib
+        except ImportError as e:
+            raise RuntimeError("--ann hnsw requires the 'hnswlib' package (pip install hnswlib).") from e
+        self.graph = hnswlib.Index(space="ip", dim=dim)
+        if path is not None:
+            self.graph.load_index(str(path))
+        else:
+            self.graph.init_index(max_elements=1024, ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+        self.graph.set_ef(HNSW_EF_SEARCH)
+
+    def add(self, vectors: "np.ndarray"):
+        start = self.graph.get_current_count()
+        if start >= len(vectors):
+            return
+        if len(vectors) > self.graph.get_max_elements():
+            self.graph.resize_index(max(len(vectors), 2 * self.graph.get_max_elements()))
+        for chunk in range(start, len(vectors), 65536):
+            rows = np.arange(chunk, min(chunk + 65536, len(vectors)))
+            self.graph.add_items(np.asarray(vectors[rows], dtype=np.float32), rows)
+
+    def size(self) -> int:
+        return self.graph.get_current_count()
+
+    def candidates(self, query: "np.ndarray", k: int) -> "np.ndarray":
+        k = min(k, self.graph.get_current_count())
+        self.graph.set_ef(max(HNSW_EF_SEARCH, k))
+        labels, _ = self.graph.knn_query(query[None, :], k=k)
+        return np.sort(labels[0].astype(np.int64))
+
+    def save(self, path: Path):
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        self.graph.save_index(str(tmp_path))
+        os.replace(tmp_path, path)
+
+
+def _npz_bytes(**arrays) -> bytes:
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+# --- The index ---
+
+class EmbeddingIndex:
+    """
+    The embeddings under `directory`. Readers memory-map the committed rows; only
+    one `update` should run at a time.
+    """
+
+    def __init__(self, directory, ann: str = "ivf"):
+        _require_numpy()
+        if ann not in ANN_METHODS:
+            raise ValueError(f"Invalid ANN method: '{ann}'. Must be one of {', '.join(ANN_METHODS)}.")
+        self.dir = Path(directory)
+        self.meta = {"version": INDEX_VERSION, "backend": None, "model": None, "dim": 0,
+                     "rows": 0, "generation": 0, "ann": ann}
+        try:
+            meta = json_codec.load_file(self.dir / "meta.json")
+            if meta.get("version") == INDEX_VERSION:
+                self.meta = meta
+        except FileNotFoundError:
+            pass
+        self.keys: list[str] = []
+        self.mtimes: list[int] = []
+        self.row_of: dict[str, int] = {}  # key -> its live row
+        self._vectors = None
+        self._live = None
+        self.ann = None
+        self._load_rows()
+        self._load_ann()
+
+    @classmethod
+    def open_existing(cls, data_root) -> "EmbeddingIndex | None":
+        directory = Path(data_root) / EMBEDDINGS_SUBDIR
+        return cls(directory) if (directory / "meta.json").is_file() else None
+
+    # --- Files ---
+
+    def _path(self, stem: str, suffix: str, generation: int = None) -> Path:
+        generation = self.meta["generation"] if generation is None else generation
+        return self.dir / f"{stem}.{generation}.{suffix}"
+
+    @property
+    def rows(self) -> int:
+        return self.meta["rows"]
+
+    @property
+    def dim(self) -> int:
+        return self.meta["dim"]
+
+    def _load_rows(self):
+        if not self.rows:
+            return
+        with open(self._path("rows", "jsonl"), "r", encoding="utf-8") as f:
+            for _, line in zip(range(self.rows), f):  # lines after `rows` belong to an uncommitted batch
+                key, mtime_ns = json.loads(line)
+                self.keys.append(key)
+                self.mtimes.append(mtime_ns)
+        for row, key in enumerate(self.keys):
+            self.row_of[key] = row
+        for key in self.meta.get("removed", []):
+            self.row_of.pop(key, None)
+
+    def _load_ann(self):
+        ann = self.meta["ann"]
+        if ann == "ivf" and self._path("ivf", "npz").is_file():
+            self.ann = IVFIndex.load(self._path("ivf", "npz"))
+        elif ann == "hnsw" and self._path("hnsw", "bin").is_file():
+            self.ann = HNSWIndex(self.dim, self._path("hnsw", "bin"))
+        if self.ann is not None and self.ann.size() != self.rows:
+            self.ann = None  # saved by a run that was killed before its commit; rebuilt by the next update
+
+    @property
+    def vectors(self) -> "np.ndarray":
+        """The committed rows, memory-mapped (float16)."""
+        if self._vectors is None or len(self._vectors) != self.rows:
+            if not self.rows:
+                return np.zeros((0, self.dim), dtype=np.float16)
+            self._vectors = np.memmap(self._path("vectors", "f16"), dtype=np.float16, mode="r",
+                                      shape=(self.rows, self.dim))
+        return self._vectors
+
+    @property
+    def live(self) -> "np.ndarray":
+        """Which rows are the current embedding of an article."""
+        if self._live is None or len(self._live) != self.rows:
+            live = np.zeros(self.rows, dtype=bool)
+            live[list(self.row_of.values())] = True
+            self._live = live
+        return self._live
+
+    def describe(self) -> str:
+        return (f"{len(self.row_of)} article(s) in {self.rows} row(s) of {self.dim} dimensions "
+                f"({self.meta['backend']} {self.meta['model']}, {self.meta['ann']} search)")
+
+    # --- Writing ---
+
+    def _check_encoder(self, encoder: Encoder):
+        if self.rows and (self.meta["backend"], self.meta["model"], self.dim) != (encoder.backend, encoder.model,
+                                                                                 encoder.dim):
+            raise ValueError(f"{self.dir} was built with {self.meta['backend']} model {self.meta['model']} "
+                             f"({self.dim} dimensions); pass --rebuild to re-embed with {encoder.model}.")
+        self.meta.update(backend=encoder.backend, model=encoder.model, dim=encoder.dim)
+
+    def _truncate_uncommitted(self):
+        """Drops rows a killed run appended after the last commit."""
+        vectors_path, rows_path = self._path("vectors", "f16"), self._path("rows", "jsonl")
+        if vectors_path.exists():
+            with open(vectors_path, "r+b") as f:
+                f.truncate(self.rows * self.dim * 2)
+        if rows_path.exists():
+            with open(rows_path, "r+b") as f:
+                for _ in range(self.rows):
+                    f.readline()
+                f.truncate()
+
+    def append(self, entries: list, vectors: "np.ndarray"):
+        """Appends `(key, mtime_ns)` rows with their embeddings; visible to readers after `commit`."""
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with open(self._path("vectors", "f16"), "ab") as f:
+            f.write(np.ascontiguousarray(vectors, dtype=np.float16).tobytes())
+        with open(self._path("rows", "jsonl"), "a", encoding="utf-8") as f:
+            f.writelines(json.dumps([key, mtime_ns]) + "\n" for key, mtime_ns in entries)
+        for key, mtime_ns in entries:
+            self.row_of[key] = len(self.keys)
+            self.keys.append(key)
+            self.mtimes.append(mtime_ns)
+        self._live = None
+        removed = self.meta.get("removed", [])
+        if removed:
+            added = {key for key, _ in entries}
+            self.meta["removed"] = [key for key in removed if key not in added]
+
+    def remove(self, keys: list):
+        for key in keys:
+            if self.row_of.pop(key, None) is not None:
+                self.meta.setdefault("removed", []).append(key)
+        self._live = None
+
+    def commit(self):
+        """Publishes the appended rows: extends the ANN index, then replaces meta.json."""
+        self.meta["rows"] = len(self.keys)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._update_ann()
+        json_codec.write_atomic(self.dir / "meta.json", json_codec.dumps(self.meta))
+
+    def _update_ann(self):
+        ann = self.meta["ann"]
+        live_rows = len(self.row_of)
+        if ann == "ivf":
+            if live_rows < IVF_MIN_ROWS:
+                self.ann = None
+                self._path("ivf", "npz").unlink(missing_ok=True)
+            elif self.ann is None or live_rows >= self.ann.trained_rows * IVF_RETRAIN_GROWTH:
+                self.ann = IVFIndex.train(self.vectors, self.live)
+            else:
+                self.ann.add(self.vectors)
+            if self.ann is not None:
+                self.ann.save(self._path("ivf", "npz"))
+        elif ann == "hnsw" and self.rows:
+            if self.ann is None:
+                self.ann = HNSWIndex(self.dim)
+            self.ann.add(self.vectors)
+            self.ann.save(self._path("hnsw", "bin"))
+
+    def compact(self) -> bool:
+        """Rewrites the live rows under the next generation once enough rows are dead."""
+        dead = self.rows - len(self.row_of)
+        if not self.rows or dead < self.rows * COMPACT_DEAD_FRACTION:
+            return False
+        old_generation, live_rows = self.meta["generation"], np.flatnonzero(self.live)
+        generation = old_generation + 1
+        with open(self._path("vectors", "f16", generation), "wb") as f:
+            for start in range(0, len(live_rows), 65536):
+                f.write(np.ascontiguousarray(self.vectors[live_rows[start:start + 65536]]).tobytes())
+        self.keys = [self.keys[row] for row in live_rows]
+        self.mtimes = [self.mtimes[row] for row in live_rows]
+        with open(self._path("rows", "jsonl", generation), "w", encoding="utf-8") as f:
+            f.writelines(json.dumps([key, mtime_ns]) + "\n" for key, mtime_ns in zip(self.keys, self.mtimes))
+        self.row_of = {key: row for row, key in enumerate(self.keys)}
+        self.meta.update(generation=generation, removed=[])
+        self._vectors = self._live = self.ann = None
+        self.commit()  # retrains or rebuilds the ANN index for the new rows
+        for stem, suffix in (("vectors", "f16"), ("rows", "jsonl"), ("ivf", "npz"), ("hnsw", "bin")):
+            self._path(stem, suffix, old_generation).unlink(missing_ok=True)
+        return True
+
+    def update(self, data_root, encoder: Encoder, sources: list = None) -> dict:
+        """
+        Embeds the transformed articles that are new or changed since they were last
+        embedded, and drops the articles whose files are gone. Returns counts.
+        """
+        self._check_encoder(encoder)
+        self._truncate_uncommitted()
+        data_root = Path(data_root)
+        if sources is None:
+            sources = sorted(d.name for d in data_root.iterdir() if d.is_dir() and d.name != "progress")
+        counts = {"embedded": 0, "unchanged": 0, "skipped": 0, "removed": 0}
+        seen = set()
+        pending = []
+        for source in sources:
+            for rel, path, st in sorted(walk_json_files(data_root / source / TRANSFORMED_SUBDIR), key=lambda f: f[0]):
+                key = article_key(source, rel)
+                seen.add(key)
+                row = self.row_of.get(key)
+                if row is not None and self.mtimes[row] == st.st_mtime_ns:
+                    counts["unchanged"] += 1
+                else:
+                    pending.append((key, path, st.st_mtime_ns))
+
+        for start in range(0, len(pending), encoder.batch_size):
+            entries, texts = [], []
+            for key, path, mtime_ns in pending[start:start + encoder.batch_size]:
+                try:
+                    text = article_text(json_codec.load_file(path))
+                except (OSError, json_codec.DecodeError):
+                    text = ""
+                if not text.strip():
+                    counts["skipped"] += 1
+                    continue
+                entries.append((key, mtime_ns))
+                texts.append(text)
+            if texts:
+                self.append(entries, encoder.encode(texts))
+                counts["embedded"] += len(entries)
+            if len(self.keys) - self.rows >= COMMIT_EVERY:
+                self.commit()
+
+        gone = [key for key in self.row_of if key not in seen and key.split("/", 1)[0] in sources]
+        self.remove(gone)
+        counts["removed"] = len(gone)
+        self.commit()
+        self.compact()
+        return counts
+
+    # --- Querying ---
+
+    def _top(self, query: "np.ndarray", limit: int, exclude: int = -1) -> list:
+        """`(key, score)` of the `limit` live rows most similar to a normalized `query`."""
+        if not self.rows:
+            return []
+        if self.ann is None:
+            rows = np.flatnonzero(self.live)
+        elif isinstance(self.ann, IVFIndex):
+            rows = self.ann.candidates(query)
+        else:
+            rows = self.ann.candidates(query, 4 * limit + 16)
+        rows = rows[self.live[rows] & (rows != exclude)]
+        if not len(rows):
+            return []
+        scores = np.asarray(self.vectors[rows], dtype=np.float32) @ query
+        best = np.argpartition(-scores, min(limit, len(scores)) - 1)[:limit]
+        best = best[np.argsort(-scores[best])]
+        return [(self.keys[rows[i]], float(scores[i])) for i in best]
+
+    def related(self, key: str, limit: int = 10) -> list:
+        """The articles most similar to `key` (`<source>/YYYY/MM/DD/<id>`), as `(key, score)`."""
+        row = self.row_of.get(key)
+        if row is None:
+            raise KeyError(f"{key} is not in the embedding index.")
+        query = np.asarray(self.vectors[row], dtype=np.float32)
+        return self._top(query / max(float(np.linalg.norm(query)), 1e-12), limit, exclude=row)
+
+    def search(self, encoder: Encoder, text: str, limit: int = 10) -> list:
+        """The articles most similar to free `text`, as `(key, score)`."""
+        return self._top(encoder.encode([text])[0], limit)
+
+    def clusters(self, k: int, examples: int = 5) -> list:
+        """
+        Topic clusters: k-means over the live rows. Returns `(size, [keys nearest the centroid])`
+        per cluster, largest first.
+        """
+        rows = np.flatnonzero(self.live)
+        if not len(rows):
+            return []
+        sample = rows if len(rows) <= KMEANS_SAMPLE else np.sort(np.random.default_rng(0).choice(rows, KMEANS_SAMPLE,
+                                                                                                  replace=False))
+        centroids = kmeans(np.asarray(self.vectors[sample], dtype=np.float32), k)
+        similarity = np.asarray(self.vectors[rows], dtype=np.float32) @ centroids.T
+        cells = np.argmax(similarity, axis=1)
+        result = []
+        for cell in range(len(centroids)):
+            members = np.flatnonzero(cells == cell)
+            nearest = members[np.argsort(-similarity[members, cell])[:examples]]
+            result.append((len(members), [self.keys[rows[i]] for i in nearest]))
+        return sorted(result, key=lambda item: -item[0])
+
+
+def _title(data_root: Path, key: str) -> str:
+    source, rel = key.split("/", 1)
+    try:
+        record = json_codec.load_file(data_root / source / TRANSFORMED_SUBDIR / f"{rel}.json")
+    except (OSError, json_codec.DecodeError):
+        return ""
+    return (record.get("metadata") or {}).get("title") or ""
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the article embedding index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    update_parser = subparsers.add_parser("update", help="Embed new and changed articles.")
+    update_parser.add_argument("data_dir", help="Data root, e.g. /app/data")
+    update_parser.add_argument("--sources", nargs="+", help="Sources to embed (default: all).")
+    update_parser.add_argument("--backend", choices=BACKENDS, default=os.environ.get("EMBEDDING_BACKEND", "onnx"))
+    update_parser.add_argument("--model", default=os.environ.get("EMBEDDING_MODEL", ""),
+                               help="ONNX export directory, or sentence-transformers model name.")
+    update_parser.add_argument("--batch-size", type=int, default=64)
+    update_parser.add_argument("--threads", type=int, default=0, help="CPU threads for the model (default: all).")
+    update_parser.add_argument("--ann", choices=ANN_METHODS, help="Nearest-neighbour index (default: ivf, or "
+                                                                 "what the index was built with).")
+    update_parser.add_argument("--rebuild", action="store_true", help="Discard the index and embed everything.")
+
+    related_parser = subparsers.add_parser("related", help="Articles similar to an indexed article.")
+    related_parser.add_argument("data_dir", help="Data root, e.g. /app/data")
+    related_parser.add_argument("key", help="<source>/YYYY/MM/DD/<id>")
+
+    query_parser = subparsers.add_parser("query", help="Articles similar to a piece of text.")
+    query_parser.add_argument("data_dir", help="Data root, e.g. /app/data")
+    query_parser.add_argument("text")
+
+    clusters_parser = subparsers.add_parser("clusters", help="Group the articles into topics.")
+    clusters_parser.add_argument("data_dir", help="Data root, e.g. /app/data")
+    clusters_parser.add_argument("--k", type=int, default=20, help="Number of clusters.")
+
+    for sub in (related_parser, query_parser):
+        sub.add_argument("--limit", type=int, default=10)
+        sub.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = parser.parse_args()
+
+    if np is None:
+        parser.error("the embedding index requires numpy (pip install numpy)")
+    data_root = Path(args.data_dir)
+    directory = data_root / EMBEDDINGS_SUBDIR
+
+    if args.command == "update":
+        if args.rebuild and directory.is_dir():
+            for path in directory.iterdir():
+                path.unlink()
+        index = EmbeddingIndex(directory)
+        if args.ann:
+            if index.rows and args.ann != index.meta["ann"]:
+                parser.error(f"the index uses --ann {index.meta['ann']}; pass --rebuild to switch")
+            index.meta["ann"] = args.ann
+        # A daily run can leave out --model: the index's own model is used
+        model = args.model or (index.meta["model"] if index.meta["backend"] == args.backend else "")
+        try:
+            encoder = load_encoder(args.backend, model, args.batch_size, args.threads)
+        except ValueError as e:
+            parser.error(str(e))
+        started = time.monotonic()
+        try:
+            counts = index.update(data_root, encoder, args.sources)
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"✅ Embedded {counts['embedded']}, removed {counts['removed']}, skipped {counts['skipped']}, "
+              f"{counts['unchanged']} unchanged in {time.monotonic() - started:.1f}s")
+        print(index.describe())
+        sys.exit(0)
+
+    index = EmbeddingIndex.open_existing(data_root)
+    if index is None:
+        parser.error(f"no embedding index under {directory}; run `update` first")
+    if args.command == "clusters":
+        started = time.monotonic()
+        clusters = index.clusters(args.k)
+        for size, keys in clusters:
+            print(f"{size} article(s):")
+            for key in keys:
+                print(f"    {key}  {_title(data_root, key)}")
+        print(f"{len(clusters)} cluster(s) in {time.monotonic() - started:.1f}s")
+        sys.exit(0)
+
+    if args.command == "related":
+        started = time.perf_counter()
+        try:
+            results = index.related(args.key, args.limit)
+        except KeyError as e:
+            parser.error(str(e.args[0]))
+    else:
+        encoder = load_encoder(index.meta["backend"], index.meta["model"])
+        started = time.perf_counter()
+        results = index.search(encoder, args.text, args.limit)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if args.json:
+        print(json.dumps([{"key": key, "score": score} for key, score in results], indent=2))
+    else:
+        for key, score in results:
+            print(f"{score:.3f}  {key}\n    {_title(data_root, key)}")
+        print(f"{len(results)} result(s) in {elapsed_ms:.1f} ms")
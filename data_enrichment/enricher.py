@@ -1,11 +1,35 @@
+import argparse
+import asyncio
 import json
 import os
+import sqlite3
+import sys
+import threading
 import time
+from functools import partial
+from itertools import islice
 from pathlib import Path
 import logging
 import google.generativeai as genai
 import ollama
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Shared pipeline modules live in ../data_common in the repo and next to this script in the image
+sys.path.append(str(Path(__file__).resolve().parent.parent / "data_common"))
+from article_store import ArticleStore  # noqa: E402
+from file_inventory import FileInventory  # noqa: E402
+from partition import Partition  # noqa: E402
+import json_codec  # noqa: E402
+from async_engine import AsyncEnrichmentEngine, GeminiAsyncProvider, OllamaAsyncProvider, run_bounded  # noqa: E402
+from rate_control import AdaptiveRateController, estimate_tokens  # noqa: E402
+from entity_graph import EntityGraph  # noqa: E402
+from entity_linker import EntityLinker  # noqa: E402
+from local_ner import DEFAULT_SENTIMENT, LocalNER, load_ner  # noqa: E402
+from response_cache import ResponseCache, prompt_version  # noqa: E402
+from structured_output import OutputCheck, check_enrichment, check_second_pass, parse_json  # noqa: E402
+from work_journal import WorkJournal  # noqa: E402
+from search_index import SearchIndex  # noqa: E402
+from stage_metrics import StageMetrics, format_count, metrics_dir  # noqa: E402
 
 # --- Configuration ---
 # Directories
@@ -14,34 +38,108 @@ OUTPUT_BASE_DIR = Path("/app/data")
 SOURCES = ["app", "dawn"]
 INPUT_SUBDIR = "transformed_articles"
 OUTPUT_SUBDIR = "transformed_articles_ner"
+# 'files' reads transformed_articles/**/*.json; 'jsonl' reads the cleaner's consolidated store
+INPUT_FORMAT = os.environ.get("ENRICHMENT_INPUT_FORMAT", "files").lower()
+STORE_SUBDIR = "transformed_store"
+# Date range / hash shard to work on (partition.py); set from --from/--to/--shard or ENRICHMENT_FROM/_TO/_SHARD
+PARTITION = Partition()
 
 # --- Provider Configuration ---
 ENRICHMENT_PROVIDER = os.environ.get("ENRICHMENT_PROVIDER", "google").lower()
 OLLAMA_API_URL = os.environ.get("OLLAMA_API_URL")
 OLLAMA_MODEL_NAME = os.environ.get("OLLAMA_MODEL", "gemma3:12b") # Default model for Ollama
+# ENRICHMENT_PROVIDER=local: entities come from a CPU NER model (local_ner.py), LOCAL_NER_BATCH_SIZE
+# articles per call. LOCAL_LLM_PROVIDER ('ollama' or 'google') adds summaries, keywords and entity
+# sentiment in a second pass; with 'off' those stay empty and every entity is Neutral.
+LOCAL_NER_BACKEND = os.environ.get("LOCAL_NER_BACKEND", "spacy").lower()
+LOCAL_NER_MODEL = os.environ.get("LOCAL_NER_MODEL", "")
+LOCAL_NER_BATCH_SIZE = int(os.environ.get("LOCAL_NER_BATCH_SIZE", 64))
+LOCAL_NER_THREADS = int(os.environ.get("LOCAL_NER_THREADS", 0)) # onnx backend; 0 = onnxruntime's default
+LOCAL_LLM_PROVIDER = os.environ.get("LOCAL_LLM_PROVIDER", "off").lower()
+# The provider that answers prompts: the second pass's LLM when entities come from the local NER model
+LLM_PROVIDER = LOCAL_LLM_PROVIDER if ENRICHMENT_PROVIDER == "local" else ENRICHMENT_PROVIDER
+PROVIDER_SETTING = "LOCAL_LLM_PROVIDER" if ENRICHMENT_PROVIDER == "local" else "ENRICHMENT_PROVIDER"
+if ENRICHMENT_PROVIDER == "local" and LOCAL_LLM_PROVIDER not in ("off", "ollama", "google"):
+    raise EnvironmentError(f"LOCAL_LLM_PROVIDER must be 'off', 'ollama' or 'google', got '{LOCAL_LLM_PROVIDER}'.")
 MAX_RETRIES = 3
+# Answers missing fields (or entity sentiments) get a short follow-up asking for just those; "0" disables it
+FOLLOW_UPS = os.environ.get("ENRICHMENT_FOLLOW_UPS", "1") != "0"
 INITIAL_BACKOFF = 2 # seconds
 MAX_WORKERS = int(os.environ.get("MAX_WORKERS", 10))
+# 'threads' runs the blocking SDK calls on a thread pool; 'async' uses async_engine.py.
+# The local provider always uses threads: NER batches are CPU-bound.
+ENRICHMENT_ENGINE = "threads" if ENRICHMENT_PROVIDER == "local" else os.environ.get("ENRICHMENT_ENGINE", "threads").lower()
+# Async engine: in-flight request caps per provider. Keep OLLAMA_CONCURRENCY equal to the
+# server's OLLAMA_NUM_PARALLEL so its batch slots stay full without queueing behind them.
+OLLAMA_CONCURRENCY = int(os.environ.get("OLLAMA_CONCURRENCY", 4))
+GEMINI_CONCURRENCY = int(os.environ.get("GEMINI_CONCURRENCY", MAX_WORKERS))
+# Adaptive rate control (rate_control.py). The worker count / concurrency cap is the upper
+# bound; in-flight requests and req/s then adapt to latency, 429/5xx responses and timeouts.
+# Req/s start at the cap and only back off on congestion; set RATE_LIMIT_INITIAL_RPS lower to ramp up instead.
+RATE_LIMIT_MAX_RPS = float(os.environ.get("RATE_LIMIT_MAX_RPS", 20))
+RATE_LIMIT_INITIAL_RPS = float(os.environ.get("RATE_LIMIT_INITIAL_RPS", RATE_LIMIT_MAX_RPS))
+TOKENS_PER_MINUTE = int(os.environ.get("TOKENS_PER_MINUTE", 0)) # 0 = no token budget
+TARGET_LATENCY_SECONDS = float(os.environ.get("TARGET_LATENCY_SECONDS", 0)) # 0 = react to errors only
+# Batched prompts: pack up to ENRICHMENT_BATCH_SIZE articles into one request while their estimated
+# tokens stay within ENRICHMENT_BATCH_TOKENS, so the system prompt is sent once per batch.
+BATCH_TOKEN_BUDGET = int(os.environ.get("ENRICHMENT_BATCH_TOKENS", 0)) # 0 = one article per request
+BATCH_MAX_ARTICLES = int(os.environ.get("ENRICHMENT_BATCH_SIZE", 8))
+# Hard cap on the article body sent to the model, in estimated tokens (0 = send the whole body).
+# Long Dawn op-eds are cut at a word boundary; entities are extracted from the kept part only.
+MAX_ARTICLE_TOKENS = int(os.environ.get("MAX_ARTICLE_TOKENS", 0))
+# Persistent response cache (response_cache.py). Defaults to <input>/progress/enrichment/; "off" disables it.
+RESPONSE_CACHE_PATH = os.environ.get("RESPONSE_CACHE_PATH", "")
+RESPONSE_CACHE_MAX_MB = int(os.environ.get("RESPONSE_CACHE_MAX_MB", 512))
+# The search index, entity graph and alias table are committed every ENRICHMENT_COMMIT_EVERY saved
+# articles or ENRICHMENT_COMMIT_SECONDS, whichever comes first, and when they are closed
+STORE_COMMIT_EVERY = int(os.environ.get("ENRICHMENT_COMMIT_EVERY", 25))
+STORE_COMMIT_SECONDS = float(os.environ.get("ENRICHMENT_COMMIT_SECONDS", 5))
+# Entity graph updated with every enriched article (entity_graph.py). Defaults to <output>/progress/enrichment/; "off" disables it.
+ENTITY_GRAPH_PATH = os.environ.get("ENTITY_GRAPH_PATH", "")
+# Local WikiData id resolution (entity_linker.py). Defaults to <output>/progress/enrichment/; "off" disables it.
+ENTITY_ALIASES_PATH = os.environ.get("ENTITY_ALIASES_PATH", "")
+# "model": the model links entities and its ids feed the alias table; "local": the prompt skips
+# linking and ids come from the alias table only (always so with the local NER provider, which has no ids)
+ENTITY_LINKING = "local" if ENRICHMENT_PROVIDER == "local" else os.environ.get("ENTITY_LINKING", "model").lower()
+# Articles the cleaner tagged with `duplicate_of` copy their cluster representative's enrichment
+COPY_DUPLICATE_ENRICHMENTS = os.environ.get("ENRICHMENT_COPY_DUPLICATES", "1") != "0"
+# Phase timings and counters (stage_metrics.py). Defaults to <output>/progress/metrics/; "off" disables the files.
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+# Journal of planned, done and failed articles (work_journal.py). Defaults to <output>/progress/enrichment/; "off" disables it.
+WORK_JOURNAL_PATH = os.environ.get("WORK_JOURNAL_PATH", "")
+# First retry delay for a failed article; it grows 4x per further failure, up to a day
+RETRY_FAILED_MINUTES = float(os.environ.get("ENRICHMENT_RETRY_MINUTES", 30))
 
 # Google Gemini API Configuration
 GEMINI_MODEL_NAME = "gemini-1.5-flash-latest" # Updated model name
-if ENRICHMENT_PROVIDER == "google":
+if LLM_PROVIDER == "google":
     try:
         GOOGLE_API_KEY = os.environ["GOOGLE_API_KEY"]
         genai.configure(api_key=GOOGLE_API_KEY)
     except KeyError:
-        raise EnvironmentError("ENRICHMENT_PROVIDER is 'google' but GOOGLE_API_KEY environment variable is not set.")
+        raise EnvironmentError(f"{PROVIDER_SETTING} is 'google' but GOOGLE_API_KEY environment variable is not set.")
 
 # Ollama Client Configuration
-if ENRICHMENT_PROVIDER == "ollama":
+if LLM_PROVIDER == "ollama":
     if not OLLAMA_API_URL:
-        raise EnvironmentError("ENRICHMENT_PROVIDER is 'ollama' but OLLAMA_API_URL environment variable is not set.")
+        raise EnvironmentError(f"{PROVIDER_SETTING} is 'ollama' but OLLAMA_API_URL environment variable is not set.")
     try:
         ollama_client = ollama.Client(host=OLLAMA_API_URL)
     except Exception as e:
         raise ConnectionError(f"Failed to create Ollama client at {OLLAMA_API_URL}: {e}")
 
 
+def build_rate_controller(max_in_flight: int) -> AdaptiveRateController:
+    return AdaptiveRateController(
+        LLM_PROVIDER, max_in_flight,
+        initial_rps=RATE_LIMIT_INITIAL_RPS, max_rps=RATE_LIMIT_MAX_RPS,
+        tokens_per_minute=TOKENS_PER_MINUTE, target_latency=TARGET_LATENCY_SECONDS,
+    )
+
+# Shared by all worker threads of the threaded engine
+rate_controller = build_rate_controller(MAX_WORKERS)
+
+
 # Logging
 LOG_DIR = Path("./logs")
 LOG_DIR.mkdir(exist_ok=True)
@@ -55,7 +153,31 @@ logging.basicConfig(
 )
 
 # --- Prompt Template ---
-SYSTEM_PROMPT = """
+# What structured_output.py checks answers against
+ENRICHMENT_SCHEMA = """{
+  "summary": "...",
+  "keywords": ["...", "..."],
+  "entities": {
+    "people": [{"name": "...", "wikidata_id": "Q..." | null, "sentiment": "Positive" | "Negative" | "Neutral"}],
+    "organizations": [{"name": "...", "wikidata_id": "Q..." | null, "sentiment": "Positive" | "Negative" | "Neutral"}],
+    "locations": [{"name": "...", "wikidata_id": "Q..." | null, "sentiment": "Positive" | "Negative" | "Neutral"}]
+  }
+}"""
+
+LINK_STEP = """Link (WikiData): For each unique entity, you must try to find its corresponding WikiData ID.
+
+Crucial: You must be very cautious. If an entity is ambiguous (e.g., "John Smith") or not prominent enough to have a clear WikiData entry (e.g., a local figure not on Wikipedia), you must use null.
+
+It is better to use null than to guess a wrong ID.
+
+"""
+
+# With ENTITY_LINKING=local, ids come from the alias table (entity_linker.py) instead
+LOCAL_LINK_STEP = """Link: Do not look up WikiData IDs. Set every entity's wikidata_id to null; IDs are resolved separately.
+
+"""
+
+SYSTEM_PROMPT = f"""
 You are a meticulous NLP and Knowledge Graph analyst. Your task is to process a given news article and extract structured information with high precision.
 
 You must follow these instructions exactly.
@@ -74,13 +196,7 @@ Read: First, read the content.article_body text carefully.
 
 Extract & De-duplicate: Identify all named entities and classify them as PERSON, ORGANIZATION, or LOCATION. You must then de-duplicate them. For example, if "Bilawal Bhutto Zardari" is mentioned 5 times, he should have only one entry in your final entities list.
 
-Link (WikiData): For each unique entity, you must try to find its corresponding WikiData ID.
-
-Crucial: You must be very cautious. If an entity is ambiguous (e.g., "John Smith") or not prominent enough to have a clear WikiData entry (e.g., a local figure not on Wikipedia), you must use null.
-
-It is better to use null than to guess a wrong ID.
-
-Analyze Sentiment: For each unique entity, analyze all its mentions and the surrounding context within the article to determine its overall sentiment. The sentiment must be one of: Positive, Negative, or Neutral.
+{LINK_STEP if ENTITY_LINKING == "model" else LOCAL_LINK_STEP}Analyze Sentiment: For each unique entity, analyze all its mentions and the surrounding context within the article to determine its overall sentiment. The sentiment must be one of: Positive, Negative, or Neutral.
 
 Generate Keywords: Generate an array of 5-7 significant keywords. These should include the most important concepts (e.g., "AI regulation," "online safety") as well as the most central named entities.
 
@@ -90,22 +206,71 @@ Format Output: Assemble all extracted information into the single JSON object sp
 
 3. Final Output Schema
 Your output must be a single JSON object using only these keys and structures:
+{ENRICHMENT_SCHEMA}
+"""
+
+# ENRICHMENT_PROVIDER=local: the NER model has already found the entities, so the
+# second pass only summarizes the article and rates the sentiment of each entity
+SECOND_PASS_SYSTEM_PROMPT = """
+You are a meticulous news analyst. You will be given a single JSON object with a news article in content.article_body and, in entities, the people, organizations and locations already extracted from it.
+
+You must only use the text in the content.article_body field. Your output must be a single, valid JSON object. Any other text, apologies, or explanations are forbidden.
+
+Analyze Sentiment: For each listed entity, analyze all its mentions and the surrounding context within the article to determine its overall sentiment. The sentiment must be one of: Positive, Negative, or Neutral. Do not add, remove or rename entities.
+
+Generate Keywords: Generate an array of 5-7 significant keywords. These should include the most important concepts as well as the most central named entities.
+
+Summarize: Generate a 2-3 sentence, high-level summary that describes the main event or topic of the article.
+
+Your output must be a single JSON object of this form:
+{"summary": "...", "keywords": ["...", "..."], "sentiment": {"<entity name>": "Positive" | "Negative" | "Neutral"}}
 """
 
+if ENRICHMENT_PROVIDER == "local":
+    SYSTEM_PROMPT = SECOND_PASS_SYSTEM_PROMPT
+
 USER_PROMPT_TEMPLATE = """
 Here is the article to process:
 
 {article_json}
 """
 
-def get_gemini_response(article_json_str: str) -> dict | None:
+# Batch instructions go in the user prompt so the system prompt (and the Gemini model built
+# from it) stays the same for single and batched requests.
+BATCH_USER_PROMPT_TEMPLATE = """
+Batch mode: the JSON array below holds {count} articles instead of one. Each element has an "article_id" and the "article" object itself.
+Apply all of the instructions above to every article independently; never mix entities, keywords or summaries between articles.
+Return a single JSON object of the form {{"results": [...]}} with exactly one entry per article. Each entry must copy its "article_id" unchanged and hold the "summary", "keywords" and "entities" for that article.
+
+Here are the articles to process:
+
+{articles_json}
+"""
+
+# Sent when an answer lacked some fields; asks for those only (structured_output.py)
+FOLLOW_UP_USER_PROMPT_TEMPLATE = """
+Follow-up: an earlier answer for the article below was incomplete. Do not repeat the whole answer.
+Apply the instructions above, but return a single JSON object with only these keys:
+{fields}
+
+Here is the article to process:
+
+{article_json}
+"""
+
+FOLLOW_UP_FIELDS = {
+    "summary": '"summary": "..."',
+    "keywords": '"keywords": ["...", "..."]',
+    "entities": '"entities": {"people": [...], "organizations": [...], "locations": [...]}, each entity '
+                '{"name": "...", "wikidata_id": "Q..." | null, "sentiment": "Positive" | "Negative" | "Neutral"}',
+    "sentiment": '"sentiment": {{"<entity name>": "Positive" | "Negative" | "Neutral"}}, for exactly these entities: {names}',
+}
+
+def get_gemini_model() -> genai.GenerativeModel:
     """
-    Sends the article to the Google Gemini model and returns the parsed JSON response.
-    Includes retry logic with exponential backoff.
+    Builds the Gemini model configured with the system prompt and JSON output.
     """
-    user_prompt = USER_PROMPT_TEMPLATE.format(article_json=article_json_str)
-    
-    model = genai.GenerativeModel(
+    return genai.GenerativeModel(
         model_name=GEMINI_MODEL_NAME,
         system_instruction=SYSTEM_PROMPT,
         generation_config=genai.GenerationConfig(
@@ -114,16 +279,32 @@ def get_gemini_response(article_json_str: str) -> dict | None:
         )
     )
 
+
+def get_gemini_response(user_prompt: str) -> dict | None:
+    """
+    Sends the prompt to the Google Gemini model and returns the parsed JSON response.
+    Includes retry logic with exponential backoff.
+    """
+    model = get_gemini_model()
+
+    prompt_tokens = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(user_prompt)
     for attempt in range(MAX_RETRIES):
+        response_text = None
         try:
             logging.info("Sending request to Google Gemini model...")
-            response = model.generate_content(user_prompt)
+            with rate_controller.request(prompt_tokens) as ticket:
+                with metrics.timer("model"):
+                    response = model.generate_content(user_prompt)
+                ticket.tokens_used = getattr(getattr(response, "usage_metadata", None), "total_token_count", None)
             response_text = response.text
-            parsed_content = json.loads(response_text)
+            parsed_content = parse_response(response_text)
             logging.info("Successfully received and parsed response from Gemini.")
+            record_request(attempt + 1, prompt_tokens, ticket.tokens_used)
             return parsed_content
         except Exception as e:
             logging.error(f"Google Gemini API request failed on attempt {attempt + 1}/{MAX_RETRIES}: {e}")
+            if response_text is not None:
+                record_invalid_response(ticket.tokens_used or prompt_tokens + estimate_tokens(response_text))
             if 'response' in locals():
                 logging.error(f"Prompt Feedback: {getattr(response, 'prompt_feedback', 'N/A')}")
                 logging.error(f"Candidates: {getattr(response, 'candidates', 'N/A')}")
@@ -133,105 +314,1296 @@ def get_gemini_response(article_json_str: str) -> dict | None:
                 time.sleep(backoff_time)
             else:
                 logging.error("Max retries reached for Gemini API. Giving up.")
+    record_request(MAX_RETRIES, prompt_tokens, None, failed=True)
     return None
 
-def get_ollama_response(article_json_str: str) -> dict | None:
+def get_ollama_response(user_prompt: str) -> dict | None:
     """
-    Sends the article to the Ollama model and returns the parsed JSON response.
+    Sends the prompt to the Ollama model and returns the parsed JSON response.
     Includes retry logic with exponential backoff.
     """
-    user_prompt = USER_PROMPT_TEMPLATE.format(article_json=article_json_str)
-    
+    prompt_tokens = estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(user_prompt)
     for attempt in range(MAX_RETRIES):
+        response_text = None
         try:
             logging.info(f"Sending request to Ollama model '{OLLAMA_MODEL_NAME}' at {OLLAMA_API_URL}...")
-            response = ollama_client.chat(
-                model=OLLAMA_MODEL_NAME,
-                messages=[
-                    {'role': 'system', 'content': SYSTEM_PROMPT},
-                    {'role': 'user', 'content': user_prompt}
-                ],
-                format='json'
-            )
+            with rate_controller.request(prompt_tokens) as ticket:
+                with metrics.timer("model"):
+                    response = ollama_client.chat(
+                        model=OLLAMA_MODEL_NAME,
+                        messages=[
+                            {'role': 'system', 'content': SYSTEM_PROMPT},
+                            {'role': 'user', 'content': user_prompt}
+                        ],
+                        format='json'
+                    )
+                ticket.tokens_used = (response.get('prompt_eval_count', 0) + response.get('eval_count', 0)) or None
             
             # The response from the ollama library is already a dict
             response_text = response['message']['content']
-            parsed_content = json.loads(response_text)
+            parsed_content = parse_response(response_text)
             
             logging.info("Successfully received and parsed response from Ollama.")
+            record_request(attempt + 1, prompt_tokens, ticket.tokens_used)
             return parsed_content
 
         except Exception as e:
             logging.error(f"Ollama API request failed on attempt {attempt + 1}/{MAX_RETRIES}: {e}")
+            if response_text is not None:
+                record_invalid_response(ticket.tokens_used or prompt_tokens + estimate_tokens(response_text))
             if attempt < MAX_RETRIES - 1:
                 backoff_time = INITIAL_BACKOFF * (2 ** attempt)
                 logging.info(f"Retrying in {backoff_time} seconds...")
                 time.sleep(backoff_time)
             else:
                 logging.error("Max retries reached for Ollama API. Giving up.")
+    record_request(MAX_RETRIES, prompt_tokens, None, failed=True)
     return None
 
 
-def get_model_response(article_json_str: str) -> dict | None:
+def record_request(attempts: int, prompt_tokens: int, tokens_used: int | None, failed: bool = False):
+    """
+    Counts one model request: its attempts (retries = attempts - 1), estimated prompt tokens,
+    the tokens the provider reported and whether it was given up.
+    """
+    metrics.count("requests")
+    metrics.observe("model_attempts", attempts)
+    metrics.count("retries", attempts - 1)
+    metrics.count("prompt_tokens_estimated", prompt_tokens)
+    if tokens_used:
+        metrics.count("tokens_reported", tokens_used)
+    if failed:
+        metrics.count("request_failures")
+
+
+def record_repairs(repairs: list):
+    """Counts what was fixed locally in one answer, as `repair_<kind>` counters."""
+    for kind in repairs:
+        metrics.count(f"repair_{kind}")
+
+
+def record_invalid_response(tokens: int):
+    """Counts an answer that could not be parsed, so its tokens were spent for nothing."""
+    metrics.count("invalid_responses")
+    metrics.count("tokens_wasted", tokens)
+
+
+def parse_response(response_text: str):
+    """Parses an answer, repairing fences, trailing commas and truncation (structured_output.py)."""
+    parsed, repairs = parse_json(response_text)
+    record_repairs(repairs)
+    return parsed
+
+
+def request_model(user_prompt: str) -> dict | None:
     """
     Dispatcher function to select the correct enrichment provider.
     """
-    if ENRICHMENT_PROVIDER == "google":
-        return get_gemini_response(article_json_str)
-    elif ENRICHMENT_PROVIDER == "ollama":
-        return get_ollama_response(article_json_str)
+    if LLM_PROVIDER == "google":
+        return get_gemini_response(user_prompt)
+    elif LLM_PROVIDER == "ollama":
+        return get_ollama_response(user_prompt)
+    else:
+        logging.error(f"Invalid {PROVIDER_SETTING}: '{LLM_PROVIDER}'. Must be 'google' or 'ollama'.")
+        return None
+
+
+# --- Metrics ---
+
+# Records even before `open_metrics`, so functions used on their own never need a None check
+metrics = StageMetrics("enricher")
+
+
+def open_metrics() -> StageMetrics:
+    """
+    Starts a fresh set of metrics, written periodically under OUTPUT_BASE_DIR (see stage_metrics.py).
+    """
+    global metrics
+    stage = "enricher" if PARTITION.is_everything else f"enricher.{PARTITION.tag()}"
+    metrics = StageMetrics(stage, metrics_dir(OUTPUT_BASE_DIR, METRICS_DIR))
+    if metrics.directory is not None:
+        logging.info(f"Writing metrics to {metrics.directory}")
+    return metrics
+
+
+def close_metrics():
+    log_answer_stats()
+    metrics.write()
+    logging.info(f"Metrics: {metrics.describe()}")
+
+
+def log_answer_stats():
+    """Logs how many answers needed a full retry, a local repair or a follow-up, and the tokens wasted."""
+    counters = metrics.snapshot()["counters"]
+    requests = counters.get("requests", 0)
+    if not requests:
+        return
+    retries = counters.get("retries", 0)
+    repairs = sum(count for name, count in counters.items() if name.startswith("repair_"))
+    logging.info(f"Answers: {format_count(requests)} requests, {format_count(retries)} full retries "
+                 f"({retries / requests:.1%}), {format_count(repairs)} local repairs, "
+                 f"{format_count(counters.get('follow_ups', 0))} follow-ups for "
+                 f"{format_count(counters.get('follow_up_fields', 0))} field(s), "
+                 f"{format_count(counters.get('incomplete_responses', 0))} "
+                 f"discarded, ~{counters.get('tokens_wasted', 0):,.0f} tokens wasted.")
+
+
+# --- Response cache ---
+
+response_cache: ResponseCache | None = None
+
+
+def open_response_cache() -> ResponseCache | None:
+    """
+    Opens the response cache for the configured provider, model and prompt version.
+    """
+    global response_cache
+    if RESPONSE_CACHE_PATH.lower() == "off" or LLM_PROVIDER == "off":
+        return None
+    if response_cache is None:
+        path = Path(RESPONSE_CACHE_PATH) if RESPONSE_CACHE_PATH else INPUT_BASE_DIR / "progress" / "enrichment" / "response_cache.sqlite"
+        model = GEMINI_MODEL_NAME if LLM_PROVIDER == "google" else OLLAMA_MODEL_NAME
+        response_cache = ResponseCache(path, LLM_PROVIDER, model,
+                                       prompt_version(SYSTEM_PROMPT, USER_PROMPT_TEMPLATE),
+                                       max_bytes=RESPONSE_CACHE_MAX_MB * 1024 * 1024)
+        logging.info(f"Using response cache at {path}")
+    return response_cache
+
+
+def close_response_cache():
+    global response_cache
+    if response_cache is not None:
+        logging.info(f"Response cache: {response_cache.describe()}")
+        response_cache.close()
+        response_cache = None
+
+
+# --- Search index ---
+
+search_index: SearchIndex | None = None
+
+
+def open_search_index() -> SearchIndex | None:
+    """
+    Opens the search index under OUTPUT_BASE_DIR if one has been built (see search_index.py),
+    so every enriched article is indexed with its entities and keywords as it is saved.
+    """
+    global search_index
+    if search_index is None:
+        search_index = SearchIndex.open_existing(OUTPUT_BASE_DIR)
+        if search_index is not None:
+            logging.info(f"Updating search index at {search_index.path}")
+    return search_index
+
+
+def close_search_index():
+    global search_index
+    if search_index is not None:
+        search_index.close()
+        search_index = None
+
+
+# --- Entity linking ---
+
+entity_linker: EntityLinker | None = None
+
+
+def open_entity_linker() -> EntityLinker | None:
+    global entity_linker
+    if ENTITY_ALIASES_PATH.lower() == "off":
+        if ENTITY_LINKING == "local":
+            logging.warning("ENTITY_LINKING=local without an alias table: entities will have no WikiData ids.")
+        return None
+    if entity_linker is None:
+        path = Path(ENTITY_ALIASES_PATH) if ENTITY_ALIASES_PATH else OUTPUT_BASE_DIR / "progress" / "enrichment" / "entity_aliases.sqlite"
+        entity_linker = EntityLinker(path)
+        logging.info(f"Resolving WikiData ids with the alias table at {path} (linking: {ENTITY_LINKING})")
+    return entity_linker
+
+
+def close_entity_linker():
+    global entity_linker
+    if entity_linker is not None:
+        logging.info(f"Entity linking: {entity_linker.describe()}")
+        entity_linker.close()
+        entity_linker = None
+
+
+# --- Entity graph ---
+
+entity_graph: EntityGraph | None = None
+
+
+def open_entity_graph() -> EntityGraph | None:
+    global entity_graph
+    if ENTITY_GRAPH_PATH.lower() == "off":
+        return None
+    if entity_graph is None:
+        path = Path(ENTITY_GRAPH_PATH) if ENTITY_GRAPH_PATH else OUTPUT_BASE_DIR / "progress" / "enrichment" / "entity_graph.sqlite"
+        entity_graph = EntityGraph(path)
+        logging.info(f"Updating entity graph at {path}")
+    return entity_graph
+
+
+def close_entity_graph():
+    global entity_graph
+    if entity_graph is not None:
+        logging.info(f"Entity graph: {entity_graph.describe()}")
+        entity_graph.close()
+        entity_graph = None
+
+
+# --- Work journal ---
+
+work_journal: WorkJournal | None = None
+
+
+def open_work_journal() -> WorkJournal | None:
+    """
+    Opens the journal of this run's partition; an unfinished previous run is resumed from it.
+    """
+    global work_journal
+    if WORK_JOURNAL_PATH.lower() == "off":
+        return None
+    if work_journal is None:
+        name = "journal.jsonl" if PARTITION.is_everything else f"journal.{PARTITION.tag()}.jsonl"
+        path = Path(WORK_JOURNAL_PATH) if WORK_JOURNAL_PATH else OUTPUT_BASE_DIR / "progress" / "enrichment" / name
+        work_journal = WorkJournal(path, retry_minutes=RETRY_FAILED_MINUTES)
+        logging.info(f"{'Resuming an unfinished run from' if work_journal.resuming else 'Journaling to'} {path}; "
+                     f"{work_journal.describe()}")
+    return work_journal
+
+
+def close_work_journal(finished: bool = True):
+    global work_journal
+    if work_journal is not None:
+        work_journal.close(finished)
+        logging.info(f"Work journal: {work_journal.describe()}")
+        work_journal = None
+
+
+def journal_key(output_path: Path) -> tuple[str, str]:
+    """`(source, rel_path)` of an enriched output path."""
+    source_dir = output_path.relative_to(OUTPUT_BASE_DIR).parts[0]
+    return source_dir, output_path.relative_to(OUTPUT_BASE_DIR / source_dir / OUTPUT_SUBDIR).as_posix()
+
+
+def record_failure(output_path: Path, error: str):
+    """Journals an article that couldn't be enriched, so it is retried on the journal's schedule."""
+    metrics.count("articles_failed")
+    if work_journal is not None:
+        work_journal.record_failure(*journal_key(output_path), error)
+
+
+def record_skipped(output_path: Path, reason: str):
+    """Journals an article with nothing to enrich; unlike a failure it is not retried."""
+    metrics.count("articles_skipped")
+    if work_journal is not None:
+        work_journal.record_skipped(*journal_key(output_path), reason)
+
+
+def record_batch_failure(jobs: list, error: str):
+    """Journals the jobs of a failed batch that have no output (some may have been saved before the error)."""
+    for _, _, output_path in jobs:
+        if not output_path.exists():
+            record_failure(output_path, error)
+
+
+def plan_source(source: str, list_pending) -> list[str]:
+    """
+    Relative paths of the articles of `source` to enrich: what an unfinished run left over,
+    or else `list_pending()` without the failed articles that aren't due for a retry.
+    """
+    if work_journal is None:
+        return list_pending()
+    resumed = work_journal.resume(source)
+    if resumed is not None:
+        logging.info(f"Resuming {len(resumed)} article(s) of '{source}' from the work journal.")
+        return resumed
+    pending = list_pending()
+    planned = work_journal.start(source, pending)
+    if len(planned) < len(pending):
+        logging.info(f"Skipping {len(pending) - len(planned)} failed article(s) of '{source}' until their retry is due.")
+    return planned
+
+
+def cached_response(article_json_str: str, check=check_enrichment) -> dict | None:
+    """The cached answer for a payload, or None if there is none or it lacks a field of the schema."""
+    if response_cache is None:
+        return None
+    response_text = response_cache.get(article_json_str)
+    checked = check(json_codec.loads(response_text)) if response_text is not None else None
+    enriched_data = checked.result() if checked is not None else None
+    metrics.count("cache_hits" if enriched_data is not None else "cache_misses")
+    return enriched_data
+
+
+def cache_response(article_json_str: str, enriched_data: dict | None):
+    if response_cache is not None and enriched_data:
+        response_cache.put(article_json_str, json.dumps(enriched_data))
+
+
+# --- Structured output ---
+
+def check_answer(answer, check) -> OutputCheck:
+    """Checks an answer against the schema (`check_enrichment` or a `check_second_pass` partial)."""
+    checked = check(answer)
+    record_repairs(checked.repairs)
+    return checked
+
+
+def build_follow_up_prompt(article_json_str: str, checked: OutputCheck) -> str | None:
+    """
+    The user prompt asking only for what `checked` lacks, or None if nothing is
+    missing (or FOLLOW_UPS is off).
+    """
+    if checked.complete or not FOLLOW_UPS:
+        return None
+    fields = [FOLLOW_UP_FIELDS[field] for field in checked.missing]
+    if checked.unrated and "entities" not in checked.missing:
+        fields.append(FOLLOW_UP_FIELDS["sentiment"].format(names=json.dumps(checked.unrated, ensure_ascii=False)))
+    prompt = FOLLOW_UP_USER_PROMPT_TEMPLATE.format(fields="\n".join(fields), article_json=article_json_str)
+    metrics.count("follow_ups")
+    metrics.count("follow_up_fields", len(checked.missing) + len(checked.unrated))
+    metrics.count("follow_up_tokens_estimated", estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(prompt))
+    return prompt
+
+
+def finish_answer(checked: OutputCheck, follow_up, answer_tokens: int, label: str) -> dict | None:
+    """
+    Merges a follow-up answer (if any) into `checked` and returns the result, or None
+    if a field is still missing; `answer_tokens` of the discarded answer then count as wasted.
+    """
+    if follow_up is not None:
+        checked.merge(follow_up)
+    defaulted = len(checked.unrated)
+    enriched_data = checked.result()
+    if enriched_data is None:
+        logging.warning(f"Discarding the answer for {label}: {checked.describe()}.")
+        metrics.count("incomplete_responses")
+        metrics.count("tokens_wasted", answer_tokens)
+    elif defaulted:
+        metrics.count("repair_sentiment_default", defaulted)
+    return enriched_data
+
+
+def complete_answer(article_json_str: str, answer, check, answer_tokens: int, label: str) -> dict | None:
+    """
+    Checks a parsed answer, asks for its missing fields with one short follow-up
+    and returns the enrichment, or None if the answer can't be completed.
+    """
+    if answer is None:
+        return None
+    checked = check_answer(answer, check)
+    follow_up_prompt = build_follow_up_prompt(article_json_str, checked)
+    follow_up = request_model(follow_up_prompt) if follow_up_prompt is not None else None
+    return finish_answer(checked, follow_up, answer_tokens, label)
+
+
+def request_tokens(user_prompt: str, answer) -> int:
+    """Estimated tokens of a request and its answer, for the `tokens_wasted` counter."""
+    return estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(user_prompt) + estimate_tokens(json.dumps(answer))
+
+
+def get_model_response(article_json_str: str, check=check_enrichment, label: str = "article") -> dict | None:
+    """
+    Enriches a single article, answering from the response cache when possible.
+    The answer is checked against the schema (`check`) and completed with a follow-up if needed.
+    """
+    enriched_data = cached_response(article_json_str, check)
+    if enriched_data is None:
+        user_prompt = USER_PROMPT_TEMPLATE.format(article_json=article_json_str)
+        answer = request_model(user_prompt)
+        enriched_data = complete_answer(article_json_str, answer, check, request_tokens(user_prompt, answer), label)
+        cache_response(article_json_str, enriched_data)
+    return enriched_data
+
+
+# --- Batched prompts ---
+
+def pack_batches(articles: list, token_budget: int, max_articles: int):
+    """
+    Greedily groups `(article_id, payload)` pairs into batches of at most `max_articles`
+    whose estimated payload tokens fit `token_budget`. An article larger than the budget
+    goes into a batch of its own.
+    """
+    batch, batch_tokens = [], 0
+    for article_id, payload in articles:
+        tokens = estimate_tokens(payload)
+        if batch and (len(batch) >= max_articles or batch_tokens + tokens > token_budget):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append((article_id, payload))
+        batch_tokens += tokens
+    if batch:
+        yield batch
+
+
+def build_batch_prompt(articles: list) -> str:
+    """
+    Builds the user prompt for a batch of `(article_id, payload)` pairs. Payloads are
+    already JSON, so they are spliced in as-is rather than parsed and re-encoded.
+    """
+    with metrics.timer("prompt_build"):
+        articles_json = ",\n".join(f'{{"article_id": {json.dumps(article_id)}, "article": {payload}}}'
+                                   for article_id, payload in articles)
+        return BATCH_USER_PROMPT_TEMPLATE.format(count=len(articles), articles_json=f"[\n{articles_json}\n]")
+
+
+def split_batch_response(response, article_ids: list) -> dict:
+    """
+    Maps a batch response back to `{article_id: entry}`. Accepts the requested
+    `{"results": [...]}` shape as well as a bare list or an object keyed by article_id.
+    Entries for unknown ids are left out; the entries themselves are checked by the caller.
+    """
+    wanted = set(article_ids)
+    if isinstance(response, dict) and isinstance(response.get("results"), list):
+        entries = response["results"]
+    elif isinstance(response, list):
+        entries = response
+    elif isinstance(response, dict):
+        entries = [dict(value, article_id=key) for key, value in response.items() if isinstance(value, dict)]
     else:
-        logging.error(f"Invalid ENRICHMENT_PROVIDER: '{ENRICHMENT_PROVIDER}'. Must be 'google' or 'ollama'.")
+        return {}
+
+    results = {}
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        article_id = str(entry.get("article_id"))
+        if article_id in wanted and article_id not in results:
+            results[article_id] = entry
+    return results
+
+
+def get_model_response_batch(articles: list) -> dict:
+    """
+    Enriches several `(article_id, payload)` pairs with one request and returns
+    `{article_id: enrichment}`. Cached articles are not sent; entries lacking some
+    fields get a follow-up for those, articles missing from the batch response (or
+    still incomplete) are retried one at a time; those that still fail are absent from the result.
+    """
+    results = {}
+    uncached = []
+    for article_id, payload in articles:
+        enriched_data = cached_response(payload)
+        if enriched_data is None:
+            uncached.append((article_id, payload))
+        else:
+            results[article_id] = enriched_data
+    articles = uncached
+    if len(articles) <= 1:
+        for article_id, payload in articles:
+            enriched_data = get_model_response(payload, label=article_id)
+            if enriched_data:
+                results[article_id] = enriched_data
+        return results
+
+    logging.info(f"Sending a batch of {len(articles)} articles "
+                 f"(~{estimate_tokens(SYSTEM_PROMPT) * (len(articles) - 1):,} system prompt tokens saved)...")
+    entries = split_batch_response(request_model(build_batch_prompt(articles)), [a for a, _ in articles])
+    batch_results = {}
+    for article_id, payload in articles:
+        if article_id in entries:
+            entry = entries[article_id]
+            enriched_data = complete_answer(payload, entry, check_enrichment,
+                                            estimate_tokens(payload) + estimate_tokens(json.dumps(entry)), article_id)
+            if enriched_data:
+                batch_results[article_id] = enriched_data
+                cache_response(payload, enriched_data)
+    results.update(batch_results)
+
+    missing = [(article_id, payload) for article_id, payload in articles if article_id not in results]
+    if missing:
+        logging.warning(f"Batch response covered {len(batch_results)}/{len(articles)} articles; "
+                        f"retrying {len(missing)} individually.")
+    for article_id, payload in missing:
+        enriched_data = get_model_response(payload, label=article_id)
+        if enriched_data:
+            results[article_id] = enriched_data
+    return results
+
+
+# Running totals for the compact payloads, shared by all workers
+payload_stats = {"articles": 0, "tokens_sent": 0, "tokens_saved": 0, "truncated": 0}
+payload_stats_lock = threading.Lock()
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts `text` to roughly `max_tokens` estimated tokens, at the last word boundary."""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(" ", 0, max_chars)
+    return text[:cut if cut > 0 else max_chars]
+
+
+def text_chars(value) -> int:
+    """Characters of the keys and strings in `value`, a cheap stand-in for its serialized length."""
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, dict):
+        return sum(len(key) + text_chars(item) for key, item in value.items())
+    if isinstance(value, list):
+        return sum(text_chars(item) for item in value)
+    return 0
+
+
+def build_article_payload(data: dict, name: str) -> str | None:
+    """
+    Returns the article text to send to the model, or None if the body is too short to enrich.
+    """
+    started = time.perf_counter()
+    article_body = data.get("content", {}).get("article_body")
+    if not article_body or not isinstance(article_body, str) or len(article_body.strip()) < 50:
+        logging.warning(f"Skipping {name}, article body is empty or too short.")
         return None
 
+    # The prompt only uses content.article_body, so that is all the model gets
+    truncated = False
+    dropped_chars = 0
+    if MAX_ARTICLE_TOKENS > 0:
+        capped_body = truncate_to_tokens(article_body, MAX_ARTICLE_TOKENS)
+        truncated = capped_body != article_body
+        dropped_chars = len(article_body) - len(capped_body)
+        article_body = capped_body
+    payload = json.dumps({"content": {"article_body": article_body}}, separators=(",", ":"))
+
+    sent = estimate_tokens(payload)
+    # Everything but the body is left out; size it from the dropped fields rather than re-serializing the article
+    for key, value in data.items():
+        if key == "content" and isinstance(value, dict):
+            dropped_chars += sum(len(k) + text_chars(v) for k, v in value.items() if k != "article_body")
+        else:
+            dropped_chars += len(key) + text_chars(value)
+    saved = dropped_chars // 4
+    metrics.observe_phase("prompt_build", time.perf_counter() - started)
+    with payload_stats_lock:
+        payload_stats["articles"] += 1
+        payload_stats["tokens_sent"] += sent
+        payload_stats["tokens_saved"] += saved
+        payload_stats["truncated"] += truncated
+    logging.info(f"Payload for {name}: ~{sent:,} tokens (~{saved:,} saved"
+                 f"{', body truncated' if truncated else ''}).")
+    return payload
+
+
+def log_payload_stats():
+    with payload_stats_lock:
+        stats = dict(payload_stats)
+    if stats["articles"]:
+        logging.info(f"Compact payloads: {stats['articles']} articles, ~{stats['tokens_sent']:,} tokens sent, "
+                     f"~{stats['tokens_saved']:,} saved, {stats['truncated']} truncated bodies.")
+
+
+# Saves since the stores were last committed, shared by all workers
+store_commits = {"pending": 0, "last": time.monotonic()}
+store_commits_lock = threading.Lock()
+
+
+def store_commit_due() -> bool:
+    """Counts one saved article; True (and the count restarts) when the stores should be committed now."""
+    with store_commits_lock:
+        store_commits["pending"] += 1
+        now = time.monotonic()
+        if store_commits["pending"] < STORE_COMMIT_EVERY and now - store_commits["last"] < STORE_COMMIT_SECONDS:
+            return False
+        store_commits["pending"] = 0
+        store_commits["last"] = now
+        return True
+
+
+def save_enriched_article(data: dict, enriched_data: dict, output_path: Path):
+    """
+    Merges the model's output into the article and writes it to `output_path`.
+    """
+    # One commit per store every few articles: the stores share a lock-guarded connection across workers
+    commit_stores = store_commit_due()
+    # Update the original JSON data with the new fields
+    # The structure of the 'entities' field is now a dict of lists of objects
+    data["content"]["summary"] = enriched_data.get("summary", "")
+    data["content"]["keywords"] = enriched_data.get("keywords", [])
+    data["entities"] = enriched_data.get("entities", {"people": [], "organizations": [], "locations": []})
+    if entity_linker is not None:
+        with metrics.timer("linking"):
+            if ENTITY_LINKING == "model":
+                entity_linker.learn(data["entities"])
+                if commit_stores:
+                    entity_linker.commit()
+            data["entities"] = entity_linker.canonicalize(data["entities"])
+
+    with metrics.timer("serialize"):
+        serialized = json_codec.dumps_article(data)
+
+    with metrics.timer("write"):
+        # Ensure output directory exists; the temp file + rename means an existing output is always complete
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        json_codec.write_atomic(output_path, serialized)
+    metrics.count("files")
+    if work_journal is not None:
+        work_journal.record_done(*journal_key(output_path))
+
+    if search_index is not None or entity_graph is not None:
+        # The article is saved and journaled by now; a failed index update must not mark it failed.
+        # `search_index.py update` and `entity_graph.py` can catch up with it later.
+        started = time.perf_counter()
+        source_dir, rel_path = journal_key(output_path)
+        mtime_ns = output_path.stat().st_mtime_ns
+        if search_index is not None:
+            try:
+                search_index.add(source_dir, rel_path, data, path=output_path, mtime_ns=mtime_ns, enriched=True)
+                if commit_stores:
+                    search_index.commit()
+            except sqlite3.Error as e:
+                logging.warning(f"Could not add {output_path.name} to the search index: {e}")
+                metrics.count("index_errors")
+        if entity_graph is not None:
+            try:
+                entity_graph.add_article(source_dir, rel_path, data, mtime_ns=mtime_ns)
+                if commit_stores:
+                    entity_graph.commit()
+            except sqlite3.Error as e:
+                logging.warning(f"Could not add {output_path.name} to the entity graph: {e}")
+                metrics.count("index_errors")
+        metrics.observe_phase("index", time.perf_counter() - started)
+    metrics.maybe_write()
+
+
+# --- Near-duplicates ---
+
+# Near-duplicates waiting for their cluster representative to be enriched, shared by all workers
+deferred_duplicates = []
+deferred_duplicates_lock = threading.Lock()
+
+
+def defer_duplicate(data: dict, name: str, output_path: Path) -> bool:
+    """
+    Queues a near-duplicate for `copy_duplicate_enrichments` instead of enriching it.
+    Returns False (and queues nothing) for articles that should be enriched now.
+    """
+    if not COPY_DUPLICATE_ENRICHMENTS or not data.get("duplicate_of"):
+        return False
+    with deferred_duplicates_lock:
+        deferred_duplicates.append((data, name, output_path))
+    return True
+
+
+def copy_duplicate_enrichments() -> list:
+    """
+    Gives every queued near-duplicate the summary, keywords and entities of its cluster
+    representative (`duplicate_of` is `<source>/YYYY/MM/DD/<id>`). Returns the
+    `(data, name, output_path)` jobs whose representative has no enriched output, so
+    the caller can enrich them directly.
+    """
+    with deferred_duplicates_lock:
+        pending = list(deferred_duplicates)
+        deferred_duplicates.clear()
+    if not pending:
+        return []
+
+    leftovers = []
+    for data, name, output_path in pending:
+        source, rel_path = data["duplicate_of"].split("/", 1)
+        representative_path = OUTPUT_BASE_DIR / source / OUTPUT_SUBDIR / f"{rel_path}.json"
+        try:
+            representative = json_codec.load_file(representative_path)
+            save_enriched_article(data, {
+                "summary": representative["content"].get("summary", ""),
+                "keywords": representative["content"].get("keywords", []),
+                "entities": representative.get("entities"),
+            }, output_path)
+        except FileNotFoundError:
+            leftovers.append((data, name, output_path))
+        except Exception as e:
+            logging.error(f"Could not copy the enrichment of {data['duplicate_of']} to {name}: {e}")
+            leftovers.append((data, name, output_path))
+    logging.info(f"Copied enrichments to {len(pending) - len(leftovers)} near-duplicate(s); "
+                 f"{len(leftovers)} without an enriched representative will be enriched directly.")
+    return leftovers
+
+
+def enrich_article(data: dict, name: str, output_path: Path, defer_duplicates: bool = True):
+    """
+    Enriches an already-loaded transformed article and saves the new version.
+    Near-duplicates are queued for `copy_duplicate_enrichments` unless `defer_duplicates` is False.
+    """
+    if defer_duplicates and defer_duplicate(data, name, output_path):
+        return
+
+    article_json_str = build_article_payload(data, name)
+    if article_json_str is None:
+        record_skipped(output_path, "article body is empty or too short")
+        return
+
+    enriched_data = get_model_response(article_json_str, label=name)
+
+    if enriched_data:
+        save_enriched_article(data, enriched_data, output_path)
+    else:
+        logging.error(f"Failed to get enrichment data for {name}.")
+        record_failure(output_path, "no enrichment data from the model")
+
 
 def process_article_file(input_path: Path, output_path: Path):
     """
     Reads an article, enriches it using the selected model, and saves the new version.
     """
     try:
-        with open(input_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        with metrics.timer("read"):
+            data = load_article_file(input_path)
 
-        article_body = data.get("content", {}).get("article_body")
-        if not article_body or not isinstance(article_body, str) or len(article_body.strip()) < 50:
-            logging.warning(f"Skipping {input_path.name}, article body is empty or too short.")
+        enrich_article(data, input_path.name, output_path)
+
+    except json_codec.DecodeError:
+        logging.error(f"Skipping corrupted JSON file: {input_path}")
+        record_failure(output_path, "corrupted JSON input")
+    except Exception as e:
+        logging.error(f"An unexpected error occurred while processing {input_path.name}: {e}")
+        record_failure(output_path, str(e))
+
+
+def process_store_article(store: ArticleStore, article_id: str, output_path: Path):
+    """
+    Reads an article from the cleaner's consolidated store, enriches it and saves the new version.
+    """
+    try:
+        with metrics.timer("read"):
+            data = store.get(article_id)
+        if data is None:
+            logging.error(f"Article {article_id} is missing from store {store.root}.")
+            record_failure(output_path, "missing from the store")
             return
+        enrich_article(data, article_id, output_path)
+    except json_codec.DecodeError:
+        logging.error(f"Skipping corrupted store record: {article_id}")
+        record_failure(output_path, "corrupted store record")
+    except Exception as e:
+        logging.error(f"An unexpected error occurred while processing {article_id}: {e}")
+        record_failure(output_path, str(e))
 
-        # Pass the entire JSON object as a string to the model
-        article_json_str = json.dumps(data)
-        enriched_data = get_model_response(article_json_str)
 
+def load_batch(jobs: list, defer_duplicates: bool = True) -> dict:
+    """
+    Loads a group of `(load, name, output_path)` jobs and returns
+    `{article_id: (data, name, output_path, payload)}` for the articles worth enriching.
+    """
+    prepared = {}
+    for load, name, output_path in jobs:
+        try:
+            data = timed_load(load)
+        except json_codec.DecodeError:
+            logging.error(f"Skipping corrupted JSON input: {name}")
+            record_failure(output_path, "corrupted JSON input")
+            continue
+        except Exception as e:
+            logging.error(f"An unexpected error occurred while loading {name}: {e}")
+            record_failure(output_path, str(e))
+            continue
+        if data is None:
+            logging.error(f"Article {name} could not be loaded.")
+            record_failure(output_path, "could not be loaded")
+            continue
+        if defer_duplicates and defer_duplicate(data, name, output_path):
+            continue
+        payload = build_article_payload(data, name)
+        if payload is None:
+            record_skipped(output_path, "article body is empty or too short")
+            continue
+        article_id = str(data.get("article_id") or name)
+        if article_id in prepared:
+            article_id = name  # duplicate id within the batch; file names are unique
+        prepared[article_id] = (data, name, output_path, payload)
+    return prepared
+
+
+def save_batch_results(prepared: dict, batch: list, results: dict) -> int:
+    """
+    Saves the enrichments in `results` for every article of `batch`; returns how many were saved.
+    """
+    saved = 0
+    for article_id, _ in batch:
+        data, name, output_path, _ = prepared[article_id]
+        enriched_data = results.get(article_id)
         if enriched_data:
-            # Update the original JSON data with the new fields
-            # The structure of the 'entities' field is now a dict of lists of objects
-            data["content"]["summary"] = enriched_data.get("summary", "")
-            data["content"]["keywords"] = enriched_data.get("keywords", [])
-            data["entities"] = enriched_data.get("entities", {"people": [], "organizations": [], "locations": []})
-            
-            # Ensure output directory exists
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            save_enriched_article(data, enriched_data, output_path)
+            saved += 1
         else:
-            logging.error(f"Failed to get enrichment data for {input_path.name}.")
+            logging.error(f"Failed to get enrichment data for {name}.")
+            record_failure(output_path, "no enrichment data from the model")
+    return saved
 
-    except json.JSONDecodeError:
-        logging.error(f"Skipping corrupted JSON file: {input_path}")
-    except Exception as e:
-        logging.error(f"An unexpected error occurred while processing {input_path.name}: {e}")
+
+def enrich_batch(jobs: list) -> int:
+    """
+    Enriches a group of `(load, name, output_path)` jobs with as few requests as
+    BATCH_TOKEN_BUDGET allows (or with one NER call for the local provider).
+    Returns the number of articles saved.
+    """
+    if ENRICHMENT_PROVIDER == "local":
+        return enrich_local_batch(jobs)
+    prepared = load_batch(jobs)
+    articles = [(article_id, item[3]) for article_id, item in prepared.items()]
+    saved = 0
+    for batch in pack_batches(articles, BATCH_TOKEN_BUDGET, BATCH_MAX_ARTICLES):
+        saved += save_batch_results(prepared, batch, get_model_response_batch(batch))
+    return saved
+
+
+# --- Local NER ---
+
+local_ner: LocalNER | None = None
+# One NER batch at a time; the other workers meanwhile load articles or wait on the second pass
+local_ner_lock = threading.Lock()
+# Second-pass requests of all batches share MAX_WORKERS threads, so a batch's articles are sent concurrently
+second_pass_pool: ThreadPoolExecutor | None = None
+
+def get_local_ner() -> LocalNER:
+    """Loads the configured NER model on first use."""
+    global local_ner, second_pass_pool
+    with local_ner_lock:
+        if local_ner is None:
+            local_ner = load_ner(LOCAL_NER_BACKEND, LOCAL_NER_MODEL, LOCAL_NER_BATCH_SIZE, LOCAL_NER_THREADS)
+            logging.info(f"Loaded local NER: {local_ner.describe()}")
+        if second_pass_pool is None and LLM_PROVIDER != "off":
+            second_pass_pool = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="second-pass")
+    return local_ner
+
+
+def second_pass_payload(payload: str, entities: dict) -> str:
+    """Adds the entity names to an article payload (spliced in, like `build_batch_prompt`)."""
+    names = {entity_type: [entity["name"] for entity in items] for entity_type, items in entities.items()}
+    return f'{payload[:-1]},"entities":{json.dumps(names, separators=(",", ":"))}}}'
+
+
+def apply_second_pass(entities: dict, response) -> dict | None:
+    """
+    Combines the NER entities with the second pass's summary, keywords and sentiment
+    (already checked by `check_second_pass`), or returns None without a response.
+    """
+    if response is None:
+        return None
+    sentiment = response["sentiment"]
+    for items in entities.values():
+        for entity in items:
+            entity["sentiment"] = sentiment.get(entity["name"], DEFAULT_SENTIMENT)
+    return {"summary": response["summary"], "keywords": response["keywords"], "entities": entities}
+
+
+def enrich_local_batch(jobs: list, defer_duplicates: bool = True) -> int:
+    """
+    ENRICHMENT_PROVIDER=local: extracts the entities of a group of `(load, name, output_path)`
+    jobs with one NER call, then (with LOCAL_LLM_PROVIDER) asks the LLM for each article's
+    summary, keywords and entity sentiment. Returns the number of articles saved.
+    """
+    prepared = load_batch(jobs, defer_duplicates)
+    if not prepared:
+        return 0
+    items = list(prepared.values())
+    ner = get_local_ner()
+    started = time.perf_counter()
+    with local_ner_lock:
+        # The whole body: MAX_ARTICLE_TOKENS only caps what is sent to an LLM
+        found = ner.extract([data["content"]["article_body"] for data, _, _, _ in items])
+    metrics.observe_phase("ner", time.perf_counter() - started)
+    metrics.count("ner_articles", len(items))
+
+    if LLM_PROVIDER == "off":
+        results = [{"summary": "", "keywords": [], "entities": entities} for entities in found]
+    else:
+        names = [[entity["name"] for entity_items in entities.values() for entity in entity_items]
+                 for entities in found]
+        responses = second_pass_pool.map(get_model_response,
+                                         [second_pass_payload(item[3], entities) for item, entities in zip(items, found)],
+                                         [partial(check_second_pass, names=article_names) for article_names in names],
+                                         [item[1] for item in items])
+        results = [apply_second_pass(entities, response) for entities, response in zip(found, responses)]
+
+    saved = 0
+    for (data, name, output_path, _), enriched_data in zip(items, results):
+        if enriched_data:
+            save_enriched_article(data, enriched_data, output_path)
+            saved += 1
+        else:
+            logging.error(f"Failed to get a summary for {name} from the second pass.")
+            record_failure(output_path, "no summary from the second pass")
+    return saved
+
+
+def jobs_per_batch() -> int:
+    """Jobs a worker enriches together: a NER batch, a batched prompt's worth, or a single article."""
+    if ENRICHMENT_PROVIDER == "local":
+        return LOCAL_NER_BATCH_SIZE
+    return BATCH_MAX_ARTICLES if BATCH_TOKEN_BUDGET > 0 else 1
+
+
+class PendingJobs:
+    """
+    The jobs of a source's pending articles, built from their relative paths as they are
+    iterated. Only the paths are held for a whole source, not a Path, partial and tuple each.
+    """
+
+    def __init__(self, rel_paths: list[str], make_job):
+        self.rel_paths = rel_paths
+        self.make_job = make_job
+
+    def __len__(self) -> int:
+        return len(self.rel_paths)
+
+    def __iter__(self):
+        return map(self.make_job, self.rel_paths)
+
+    def map(self, fn) -> "PendingJobs":
+        """The same jobs passed through `fn`."""
+        return PendingJobs(self.rel_paths, lambda rel_path: fn(self.make_job(rel_path)))
+
+
+def list_pending_files(input_dir: Path, output_dir: Path) -> PendingJobs:
+    """
+    Returns `(in_file, out_file)` pairs for transformed files in PARTITION that have no enriched
+    output yet. Both trees are listed through cached per-directory inventories, so no file is stat'ed.
+    """
+    def list_pending() -> list[str]:
+        inputs = FileInventory.for_tree(INPUT_BASE_DIR, input_dir, with_stats=False)
+        outputs = FileInventory.for_tree(OUTPUT_BASE_DIR, output_dir, with_stats=False)
+        pending = inputs.pending(outputs, partition=PARTITION)
+        inputs.save()
+        outputs.save()
+        logging.info(f"Listed inputs ({inputs.describe()}) and outputs ({outputs.describe()}).")
+        return pending
+
+    return PendingJobs(plan_source(output_dir.parent.name, list_pending),
+                       lambda rel_path: (input_dir / rel_path, output_dir / rel_path))
+
+
+def list_pending_store_articles(store: ArticleStore, output_dir: Path) -> PendingJobs:
+    """
+    Returns `(article_id, out_file)` pairs for store records in PARTITION that have no enriched
+    output yet. Outputs keep the usual YYYY/MM/DD/<id>.json layout.
+    """
+    ids = {rel_path: article_id for article_id, (_, _, _, rel_path) in store.entries().items()}
+
+    def list_pending() -> list[str]:
+        outputs = FileInventory.for_tree(OUTPUT_BASE_DIR, output_dir, with_stats=False)
+        outputs.refresh(partition=PARTITION)
+        outputs.save()
+        return sorted(rel_path for rel_path in ids if PARTITION.includes(rel_path) and not outputs.has(rel_path))
+
+    return PendingJobs([rel_path for rel_path in plan_source(output_dir.parent.name, list_pending) if rel_path in ids],
+                       lambda rel_path: (ids[rel_path], output_dir / rel_path))
+
+
+def list_jobs(input_dir: Path, output_dir: Path, use_store: bool) -> PendingJobs:
+    """
+    Returns `(load, name, out_file)` jobs for every pending article, where `load()` returns the article dict.
+    """
+    if use_store:
+        store = ArticleStore(input_dir)
+        return list_pending_store_articles(store, output_dir).map(
+            lambda job: (partial(store.get, job[0]), job[0], job[1]))
+    return list_pending_files(input_dir, output_dir).map(
+        lambda job: (partial(load_article_file, job[0]), job[0].name, job[1]))
+
+
+def chunk_jobs(jobs, size: int):
+    """Yields lists of `size` jobs, taken lazily from `jobs`."""
+    jobs = iter(jobs)
+    while chunk := list(islice(jobs, size)):
+        yield chunk
+
+
+def run_in_threads(jobs, handle, on_done=None, max_in_flight: int = 0):
+    """
+    Threaded counterpart of `async_engine.run_bounded`: runs `handle(job)` on MAX_WORKERS
+    threads with at most `max_in_flight` jobs submitted (default: twice the workers), pulling
+    jobs lazily from the iterable. `on_done(job, result, exc)` is called in this thread after each job.
+    """
+    jobs = iter(jobs)
+    max_in_flight = max_in_flight or MAX_WORKERS * 2
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        in_flight = {executor.submit(handle, job): job for job in islice(jobs, max_in_flight)}
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = in_flight.pop(future)
+                if on_done is not None:
+                    exc = future.exception()
+                    on_done(job, None if exc is not None else future.result(), exc)
+            for job in islice(jobs, len(done)):
+                in_flight[executor.submit(handle, job)] = job
+
+
+def build_async_engine() -> AsyncEnrichmentEngine:
+    """
+    Creates the async engine for the configured provider with its own concurrency cap.
+    """
+    if ENRICHMENT_PROVIDER == "ollama":
+        provider = OllamaAsyncProvider(OLLAMA_API_URL, OLLAMA_MODEL_NAME, max_connections=OLLAMA_CONCURRENCY)
+        concurrency = OLLAMA_CONCURRENCY
+    elif ENRICHMENT_PROVIDER == "google":
+        provider = GeminiAsyncProvider(get_gemini_model())
+        concurrency = GEMINI_CONCURRENCY
+    else:
+        raise ValueError(f"Invalid ENRICHMENT_PROVIDER: '{ENRICHMENT_PROVIDER}'. Must be 'google' or 'ollama'.")
+    return AsyncEnrichmentEngine(provider, SYSTEM_PROMPT, concurrency,
+                                 max_retries=MAX_RETRIES, initial_backoff=INITIAL_BACKOFF,
+                                 controller=build_rate_controller(concurrency), metrics=metrics)
+
+
+def load_article_file(input_path: Path) -> dict:
+    return json_codec.load_file(input_path)
+
+
+def timed_load(load) -> dict | None:
+    """Calls a job's `load()`, recording the time as the 'read' phase."""
+    with metrics.timer("read"):
+        return load()
+
+
+async def complete_answer_async(engine: AsyncEnrichmentEngine, article_json_str: str, answer,
+                                answer_tokens: int, label: str) -> dict | None:
+    """
+    Async counterpart of `complete_answer`, for the full enrichment schema.
+    """
+    if answer is None:
+        return None
+    checked = check_answer(answer, check_enrichment)
+    follow_up_prompt = build_follow_up_prompt(article_json_str, checked)
+    follow_up = None
+    if follow_up_prompt is not None:
+        follow_up = await engine.get_response(follow_up_prompt, label=f"{label} (follow-up)")
+    return finish_answer(checked, follow_up, answer_tokens, label)
+
+
+async def enrich_article_async(engine: AsyncEnrichmentEngine, load, name: str, output_path: Path,
+                               defer_duplicates: bool = True):
+    """
+    Async counterpart of `enrich_article`: disk I/O runs in threads, the model call on the engine.
+    """
+    data = await asyncio.to_thread(timed_load, load)
+    if data is None:
+        logging.error(f"Article {name} could not be loaded.")
+        record_failure(output_path, "could not be loaded")
+        return
+    if defer_duplicates and defer_duplicate(data, name, output_path):
+        return
+    article_json_str = build_article_payload(data, name)
+    if article_json_str is None:
+        record_skipped(output_path, "article body is empty or too short")
+        return
+
+    enriched_data = await asyncio.to_thread(cached_response, article_json_str)
+    if enriched_data is None:
+        user_prompt = USER_PROMPT_TEMPLATE.format(article_json=article_json_str)
+        answer = await engine.get_response(user_prompt, label=name)
+        enriched_data = await complete_answer_async(engine, article_json_str, answer,
+                                                    request_tokens(user_prompt, answer), name)
+        await asyncio.to_thread(cache_response, article_json_str, enriched_data)
+
+    if enriched_data:
+        await asyncio.to_thread(save_enriched_article, data, enriched_data, output_path)
+    else:
+        logging.error(f"Failed to get enrichment data for {name}.")
+        record_failure(output_path, "no enrichment data from the model")
+
+
+async def enrich_batch_async(engine: AsyncEnrichmentEngine, jobs: list):
+    """
+    Async counterpart of `enrich_batch`.
+    """
+    prepared = await asyncio.to_thread(load_batch, jobs)
+    articles = [(article_id, item[3]) for article_id, item in prepared.items()]
+    for batch in pack_batches(articles, BATCH_TOKEN_BUDGET, BATCH_MAX_ARTICLES):
+        results = {}
+        for article_id, payload in batch:
+            enriched_data = await asyncio.to_thread(cached_response, payload)
+            if enriched_data is not None:
+                results[article_id] = enriched_data
+        uncached = [(article_id, payload) for article_id, payload in batch if article_id not in results]
+        if len(uncached) > 1:
+            response = await engine.get_response(build_batch_prompt(uncached), label=f"batch of {len(uncached)}")
+            entries = split_batch_response(response, [article_id for article_id, _ in uncached])
+            batch_results = {}
+            for article_id, payload in uncached:
+                if article_id in entries:
+                    entry = entries[article_id]
+                    enriched_data = await complete_answer_async(
+                        engine, payload, entry, estimate_tokens(payload) + estimate_tokens(json.dumps(entry)), article_id)
+                    if enriched_data:
+                        batch_results[article_id] = enriched_data
+            if len(batch_results) < len(uncached):
+                logging.warning(f"Batch response covered {len(batch_results)}/{len(uncached)} articles; "
+                                f"retrying {len(uncached) - len(batch_results)} individually.")
+            results.update(batch_results)
+        for article_id, payload in uncached:
+            if article_id not in results:
+                user_prompt = USER_PROMPT_TEMPLATE.format(article_json=payload)
+                answer = await engine.get_response(user_prompt, label=prepared[article_id][1])
+                enriched_data = await complete_answer_async(engine, payload, answer, request_tokens(user_prompt, answer),
+                                                            prepared[article_id][1])
+                if not enriched_data:
+                    continue
+                results[article_id] = enriched_data
+            await asyncio.to_thread(cache_response, payload, results[article_id])
+        await asyncio.to_thread(save_batch_results, prepared, batch, results)
+
+
+async def enrich_duplicates_async(engine: AsyncEnrichmentEngine):
+    """
+    Async counterpart of `enrich_duplicates`.
+    """
+    leftovers = await asyncio.to_thread(copy_duplicate_enrichments)
+    await run_bounded(leftovers, lambda job: enrich_article_async(engine, lambda: job[0], *job[1:],
+                                                                  defer_duplicates=False),
+                      engine.max_concurrency * 2)
+
+
+async def main_async():
+    """
+    Async variant of `main`: one shared connection pool and a per-provider cap on in-flight requests.
+    """
+    open_metrics()
+    engine = build_async_engine()
+    open_response_cache()
+    open_search_index()
+    open_entity_graph()
+    open_entity_linker()
+    open_work_journal()
+    logging.info(f"Starting async data enrichment using provider: {ENRICHMENT_PROVIDER.upper()} "
+                 f"(max {engine.max_concurrency} concurrent requests)")
+    if not PARTITION.is_everything:
+        logging.info(f"Limited to {PARTITION.describe()}.")
+    use_store = INPUT_FORMAT == "jsonl"
+
+    try:
+        for source in SOURCES:
+            input_dir = INPUT_BASE_DIR / source / (STORE_SUBDIR if use_store else INPUT_SUBDIR)
+            output_dir = OUTPUT_BASE_DIR / source / OUTPUT_SUBDIR
+
+            if not input_dir.is_dir():
+                logging.warning(f"Input directory not found, skipping: {input_dir}")
+                continue
+
+            logging.info(f"Processing source: {source}")
+
+            jobs = list_jobs(input_dir, output_dir, use_store)
+
+            if not jobs:
+                logging.info(f"No new files to process for source '{source}'.")
+                continue
+
+            total_files = len(jobs)
+            logging.info(f"Found {total_files} new files to process for source '{source}'.")
+            processed = [0]
+
+            if BATCH_TOKEN_BUDGET > 0:
+                work = chunk_jobs(jobs, BATCH_MAX_ARTICLES)
+                handle = partial(enrich_batch_async, engine)
+            else:
+                work = jobs
+                handle = lambda job: enrich_article_async(engine, *job)
+
+            def on_done(item, exc):
+                if BATCH_TOKEN_BUDGET > 0:
+                    count, name = len(item), f"Batch of {len(item)} starting with {item[0][1]}"
+                else:
+                    count, name = 1, item[1]
+                processed[0] += count
+                if exc is None:
+                    logging.info(f"({processed[0]}/{total_files}) Successfully processed {name}")
+                else:
+                    logging.error(f"({processed[0]}/{total_files}) {name} generated an exception: {exc}")
+                    record_batch_failure(item if BATCH_TOKEN_BUDGET > 0 else [item], str(exc))
+
+            # A few more jobs than request slots, so file I/O overlaps with the model calls
+            await run_bounded(work, handle, engine.max_concurrency * 2, on_done=on_done)
+
+        # Representatives of all sources are done; near-duplicates copy their results
+        await enrich_duplicates_async(engine)
+    finally:
+        await engine.aclose()
+
+    logging.info(f"Final rate control state: {engine.controller.describe()}")
+    log_payload_stats()
+    close_response_cache()
+    close_search_index()
+    close_entity_graph()
+    close_entity_linker()
+    close_work_journal()
+    close_metrics()
+    logging.info("Data enrichment process finished.")
+
+
+def enrich_duplicates():
+    """
+    Copies enrichments to the queued near-duplicates and enriches those without an enriched representative.
+    """
+    leftovers = copy_duplicate_enrichments()
+    if ENRICHMENT_PROVIDER == "local":
+        jobs = [(partial(dict, data), name, output_path) for data, name, output_path in leftovers]
+        for batch_jobs in chunk_jobs(jobs, LOCAL_NER_BATCH_SIZE):
+            enrich_local_batch(batch_jobs, defer_duplicates=False)
+        return
+
+    def on_done(job, _, exc):
+        if exc is not None:
+            logging.error(f"A near-duplicate generated an exception: {exc}")
+
+    run_in_threads(leftovers, lambda job: enrich_article(*job, defer_duplicates=False), on_done)
+
+
+def process_batches(jobs: PendingJobs, source: str):
+    """
+    Threaded engine with batched prompts or local NER: each worker enriches one chunk of `jobs_per_batch()` jobs.
+    """
+    if not jobs:
+        logging.info(f"No new files to process for source '{source}'.")
+        return
+    total_files = len(jobs)
+    logging.info(f"Found {total_files} new files to process for source '{source}'.")
+
+    processed = [0]
+
+    def on_done(batch_jobs, saved, exc):
+        processed[0] += len(batch_jobs)
+        if exc is None:
+            logging.info(f"({processed[0]}/{total_files}) Enriched {saved}/{len(batch_jobs)} articles of a batch")
+        else:
+            logging.error(f"({processed[0]}/{total_files}) Batch starting with {batch_jobs[0][1]} "
+                          f"generated an exception: {exc}")
+            record_batch_failure(batch_jobs, str(exc))
+
+    run_in_threads(chunk_jobs(jobs, jobs_per_batch()), enrich_batch, on_done)
 
 
 def main():
     """
     Main function to walk through directories and process files concurrently.
     """
+    if ENRICHMENT_ENGINE == "async":
+        asyncio.run(main_async())
+        return
+
     logging.info(f"Starting data enrichment process using provider: {ENRICHMENT_PROVIDER.upper()}")
     logging.info(f"Using up to {MAX_WORKERS} parallel workers.")
+    if not PARTITION.is_everything:
+        logging.info(f"Limited to {PARTITION.describe()}.")
+    open_metrics()
+    open_response_cache()
+    open_search_index()
+    open_entity_graph()
+    open_entity_linker()
+    open_work_journal()
+    if ENRICHMENT_PROVIDER == "local":
+        logging.info(f"Extracting entities locally in batches of {LOCAL_NER_BATCH_SIZE} "
+                     f"({LOCAL_NER_BACKEND}); second pass: {LLM_PROVIDER}.")
+    elif BATCH_TOKEN_BUDGET > 0:
+        logging.info(f"Batching up to {BATCH_MAX_ARTICLES} articles / ~{BATCH_TOKEN_BUDGET} tokens per request.")
+    use_store = INPUT_FORMAT == "jsonl"
+    if use_store:
+        logging.info(f"Reading transformed articles from the consolidated '{STORE_SUBDIR}' store.")
 
     for source in SOURCES:
-        input_dir = INPUT_BASE_DIR / source / INPUT_SUBDIR
+        input_dir = INPUT_BASE_DIR / source / (STORE_SUBDIR if use_store else INPUT_SUBDIR)
         output_dir = OUTPUT_BASE_DIR / source / OUTPUT_SUBDIR
 
         if not input_dir.is_dir():
@@ -240,14 +1612,18 @@ def main():
 
         logging.info(f"Processing source: {source}")
 
+        if BATCH_TOKEN_BUDGET > 0 or ENRICHMENT_PROVIDER == "local":
+            process_batches(list_jobs(input_dir, output_dir, use_store), source)
+            continue
+
         # Get list of files to process (delta check)
-        input_files = sorted([f for f in input_dir.glob("**/*.json") if f.is_file()])
-        
-        files_to_process = []
-        for in_file in input_files:
-            out_file = output_dir / in_file.relative_to(input_dir)
-            if not out_file.exists():
-                files_to_process.append((in_file, out_file))
+        if use_store:
+            store = ArticleStore(input_dir)
+            files_to_process = list_pending_store_articles(store, output_dir)
+            process_fn, name_of = partial(process_store_article, store), str
+        else:
+            files_to_process = list_pending_files(input_dir, output_dir)
+            process_fn, name_of = process_article_file, lambda in_file: in_file.name
 
         if not files_to_process:
             logging.info(f"No new files to process for source '{source}'.")
@@ -255,24 +1631,45 @@ def main():
             
         logging.info(f"Found {len(files_to_process)} new files to process for source '{source}'.")
 
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            # Submit all processing tasks to the executor
-            future_to_file = {executor.submit(process_article_file, in_file, out_file): in_file.name for in_file, out_file in files_to_process}
-            
-            processed_count = 0
-            total_files = len(files_to_process)
-            
-            for future in as_completed(future_to_file):
-                file_name = future_to_file[future]
-                processed_count += 1
-                try:
-                    future.result()  # Check for exceptions
-                    logging.info(f"({processed_count}/{total_files}) Successfully processed {file_name}")
-                except Exception as exc:
-                    logging.error(f"({processed_count}/{total_files}) {file_name} generated an exception: {exc}")
+        processed_count = 0
+        total_files = len(files_to_process)
 
+        def on_done(job, _, exc):
+            nonlocal processed_count
+            processed_count += 1
+            if exc is None:
+                logging.info(f"({processed_count}/{total_files}) Successfully processed {name_of(job[0])}")
+            else:
+                logging.error(f"({processed_count}/{total_files}) {name_of(job[0])} generated an exception: {exc}")
+
+        # Jobs are submitted as workers free up, so only a window of them is in flight
+        run_in_threads(files_to_process, lambda job: process_fn(*job), on_done)
+
+    # Representatives of all sources are done; near-duplicates copy their results
+    enrich_duplicates()
+
+    logging.info(f"Final rate control state: {rate_controller.describe()}")
+    log_payload_stats()
+    close_response_cache()
+    close_search_index()
+    close_entity_graph()
+    close_entity_linker()
+    close_work_journal()
+    close_metrics()
     logging.info("Data enrichment process finished.")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enrich transformed articles with entities and sentiment.")
+    parser.add_argument("--from", dest="date_from", metavar="YYYY-MM-DD", default=os.environ.get("ENRICHMENT_FROM"),
+                        help="Only enrich articles dated on or after this day (or set ENRICHMENT_FROM).")
+    parser.add_argument("--to", dest="date_to", metavar="YYYY-MM-DD", default=os.environ.get("ENRICHMENT_TO"),
+                        help="Only enrich articles dated on or before this day (or set ENRICHMENT_TO).")
+    parser.add_argument("--shard", metavar="I/N", default=os.environ.get("ENRICHMENT_SHARD"),
+                        help="Only enrich articles whose id hashes to shard I of N (or set ENRICHMENT_SHARD).")
+    args = parser.parse_args()
+    try:
+        PARTITION = Partition(args.date_from, args.date_to, args.shard)
+    except ValueError as e:
+        parser.error(str(e))
     main()
@@ -0,0 +1,299 @@
+"""
+Entity knowledge graph built from enriched articles.
+
+Every entity the model extracts is interned once (by WikiData id, or by type and
+normalized name when it has none) and linked to the articles that mention it,
+with the sentiment of each mention. Per-entity, per-day mention and sentiment
+counts are kept up to date as articles are added, so trends and co-mentions can
+be queried without reading the enriched files again.
+
+The enricher adds each article as it saves it; `update` backfills from existing
+`transformed_articles_ner/` files (only new or modified files are read).
+
+    python entity_graph.py /app/data/progress/enrichment/entity_graph.sqlite update /app/data
+    python entity_graph.py /app/data/progress/enrichment/entity_graph.sqlite top --from 2025-03-01 --type people
+    python entity_graph.py /app/data/progress/enrichment/entity_graph.sqlite timeline "Imran Khan"
+    python entity_graph.py /app/data/progress/enrichment/entity_graph.sqlite related Q1362
+"""
+import argparse
+import re
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+
+# search_index.py lives in ../data_common in the repo and next to this script in the image
+sys.path.append(str(Path(__file__).resolve().parent.parent / "data_common"))
+from file_inventory import walk_json_files  # noqa: E402
+import json_codec  # noqa: E402
+from search_index import ENTITY_TYPES, article_date, article_key, normalize  # noqa: E402
+
+ENRICHED_SUBDIR = "transformed_articles_ner"
+BUSY_TIMEOUT = 120.0  # seconds
+# Sentiment labels as stored; anything else counts as neutral
+SENTIMENT_SCORES = {"positive": 1, "neutral": 0, "negative": -1}
+_SENTIMENT_COLUMNS = {1: "positive", 0: "neutral", -1: "negative"}
+_WIKIDATA_RE = re.compile(r"^Q\d+$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entities (
+    entity_id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    type TEXT NOT NULL,
+    name TEXT NOT NULL,
+    norm TEXT NOT NULL,
+    wikidata_id TEXT
+);
+CREATE INDEX IF NOT EXISTS entities_norm ON entities (norm);
+CREATE TABLE IF NOT EXISTS articles (
+    article_id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL,
+    date TEXT,
+    mtime_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS mentions (
+    article_id INTEGER NOT NULL,
+    entity_id INTEGER NOT NULL,
+    sentiment INTEGER NOT NULL,
+    PRIMARY KEY (article_id, entity_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS mentions_entity ON mentions (entity_id, article_id);
+CREATE TABLE IF NOT EXISTS daily (
+    entity_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    mentions INTEGER NOT NULL,
+    positive INTEGER NOT NULL,
+    neutral INTEGER NOT NULL,
+    negative INTEGER NOT NULL,
+    PRIMARY KEY (entity_id, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS daily_date ON daily (date);
+"""
+
+
+def entity_key(entity_type: str, name: str, wikidata_id: str | None) -> str:
+    """Identity of an entity: its WikiData id when known, otherwise type and normalized name."""
+    if isinstance(wikidata_id, str) and _WIKIDATA_RE.match(wikidata_id):
+        return wikidata_id
+    return f"{entity_type}:{normalize(name)}"
+
+
+class EntityGraph:
+    """
+    Thread-safe SQLite store of entities, article↔entity edges and daily counts.
+    `add_article` replaces everything previously recorded for that article.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+        self._entity_ids: dict[str, int] = {}
+
+    # --- Writing ---
+
+    def _intern(self, key: str, entity_type: str, name: str, wikidata_id: str | None) -> int:
+        entity_id = self._entity_ids.get(key)
+        if entity_id is None:
+            row = self._db.execute("SELECT entity_id FROM entities WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                entity_id = self._db.execute(
+                    "INSERT INTO entities (key, type, name, norm, wikidata_id) VALUES (?, ?, ?, ?, ?)",
+                    (key, entity_type, name, normalize(name), wikidata_id if key == wikidata_id else None)).lastrowid
+            else:
+                entity_id = row[0]
+            self._entity_ids[key] = entity_id
+        return entity_id
+
+    def _count(self, entity_id: int, date: str, sentiment: int, delta: int):
+        column = _SENTIMENT_COLUMNS[sentiment]
+        self._db.execute(
+            "INSERT INTO daily (entity_id, date, mentions, positive, neutral, negative) VALUES (?, ?, ?, 0, 0, 0) "
+            "ON CONFLICT (entity_id, date) DO UPDATE SET mentions = mentions + excluded.mentions",
+            (entity_id, date, delta))
+        self._db.execute(f"UPDATE daily SET {column} = {column} + ? WHERE entity_id = ? AND date = ?",
+                         (delta, entity_id, date))
+
+    def _remove_article(self, article_id: int, date: str | None):
+        if date is not None:
+            for entity_id, sentiment in self._db.execute(
+                    "SELECT entity_id, sentiment FROM mentions WHERE article_id = ?", (article_id,)).fetchall():
+                self._count(entity_id, date, sentiment, -1)
+            self._db.execute("DELETE FROM daily WHERE date = ? AND mentions <= 0", (date,))
+        self._db.execute("DELETE FROM mentions WHERE article_id = ?", (article_id,))
+        self._db.execute("DELETE FROM articles WHERE article_id = ?", (article_id,))
+
+    def add_article(self, source: str, rel_path: str, data: dict, mtime_ns: int | None = None) -> int:
+        """Records the entities of one enriched article; returns how many distinct entities it mentions."""
+        key = article_key(source, rel_path)
+        date = article_date(data, rel_path)
+        mentions: dict[str, tuple] = {}
+        for entity_type in ENTITY_TYPES:
+            for entity in (data.get("entities") or {}).get(entity_type) or []:
+                if not isinstance(entity, dict) or not isinstance(entity.get("name"), str) or not entity["name"].strip():
+                    continue
+                ekey = entity_key(entity_type, entity["name"], entity.get("wikidata_id"))
+                sentiment = SENTIMENT_SCORES.get(str(entity.get("sentiment", "")).strip().lower(), 0)
+                # An entity listed twice in one article is one mention; the first sentiment wins
+                mentions.setdefault(ekey, (entity_type, entity["name"].strip(), entity.get("wikidata_id"), sentiment))
+
+        with self._lock:
+            row = self._db.execute("SELECT article_id, date FROM articles WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._remove_article(*row)
+            article_id = self._db.execute("INSERT INTO articles (key, source, date, mtime_ns) VALUES (?, ?, ?, ?)",
+                                          (key, source, date, mtime_ns)).lastrowid
+            for ekey, (entity_type, name, wikidata_id, sentiment) in mentions.items():
+                entity_id = self._intern(ekey, entity_type, name, wikidata_id)
+                self._db.execute("INSERT INTO mentions VALUES (?, ?, ?)", (article_id, entity_id, sentiment))
+                if date is not None:
+                    self._count(entity_id, date, sentiment, 1)
+        return len(mentions)
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    def update(self, data_root, sources: list[str] | None = None) -> dict[str, int]:
+        """Adds every enriched article under `data_root` that is new or modified since it was last added."""
+        data_root = Path(data_root)
+        if sources is None:
+            sources = sorted(d.name for d in data_root.iterdir() if d.is_dir() and d.name != "progress")
+        known = dict(self._db.execute("SELECT key, mtime_ns FROM articles"))
+        counts = {"added": 0, "unchanged": 0}
+        for source in sources:
+            base = data_root / source / ENRICHED_SUBDIR
+            if not base.is_dir():
+                continue
+            for rel_path, path, st in sorted(walk_json_files(base)):
+                mtime_ns = st.st_mtime_ns
+                if known.get(article_key(source, rel_path)) == mtime_ns:
+                    counts["unchanged"] += 1
+                    continue
+                try:
+                    data = json_codec.load_file(path)
+                except (OSError, json_codec.DecodeError):
+                    continue
+                self.add_article(source, rel_path, data, mtime_ns=mtime_ns)
+                counts["added"] += 1
+                if counts["added"] % 1000 == 0:
+                    self.commit()
+        self.commit()
+        return counts
+
+    # --- Querying ---
+
+    def find(self, name_or_qid: str) -> list[int]:
+        """Entity ids matching a WikiData id or a (case-insensitive) name."""
+        if _WIKIDATA_RE.match(name_or_qid):
+            rows = self._db.execute("SELECT entity_id FROM entities WHERE wikidata_id = ?", (name_or_qid,))
+        else:
+            rows = self._db.execute("SELECT entity_id FROM entities WHERE norm = ?", (normalize(name_or_qid),))
+        return [entity_id for entity_id, in rows]
+
+    def top_entities(self, date_from: str | None = None, date_to: str | None = None,
+                     entity_type: str | None = None, limit: int = 20) -> list[dict]:
+        """Most mentioned entities in a date range, with their sentiment counts."""
+        where, params = ["daily.date >= ?", "daily.date <= ?"], [date_from or "", date_to or "9999"]
+        if entity_type:
+            where.append("entities.type = ?")
+            params.append(entity_type)
+        rows = self._db.execute(
+            "SELECT entities.entity_id, entities.type, entities.name, entities.wikidata_id, SUM(mentions), "
+            "SUM(positive), SUM(neutral), SUM(negative) FROM daily JOIN entities USING (entity_id) "
+            f"WHERE {' AND '.join(where)} GROUP BY entities.entity_id ORDER BY SUM(mentions) DESC LIMIT ?",
+            params + [limit])
+        return [{"entity_id": entity_id, "type": etype, "name": name, "wikidata_id": qid, "mentions": total,
+                 "positive": pos, "neutral": neu, "negative": neg}
+                for entity_id, etype, name, qid, total, pos, neu, neg in rows]
+
+    def timeline(self, name_or_qid: str, date_from: str | None = None, date_to: str | None = None) -> list[dict]:
+        """Daily mentions and sentiment of an entity; `score` is the mean sentiment in [-1, 1]."""
+        ids = self.find(name_or_qid)
+        if not ids:
+            return []
+        rows = self._db.execute(
+            f"SELECT date, SUM(mentions), SUM(positive), SUM(neutral), SUM(negative) FROM daily "
+            f"WHERE entity_id IN ({','.join('?' * len(ids))}) AND date >= ? AND date <= ? GROUP BY date ORDER BY date",
+            ids + [date_from or "", date_to or "9999"])
+        return [{"date": date, "mentions": total, "positive": pos, "neutral": neu, "negative": neg,
+                 "score": (pos - neg) / total if total else 0.0}
+                for date, total, pos, neu, neg in rows]
+
+    def articles(self, name_or_qid: str, limit: int = 20) -> list[dict]:
+        """Most recent articles mentioning an entity."""
+        ids = self.find(name_or_qid)
+        rows = self._db.execute(
+            f"SELECT DISTINCT articles.key, articles.date, mentions.sentiment FROM mentions "
+            f"JOIN articles USING (article_id) WHERE mentions.entity_id IN ({','.join('?' * len(ids))}) "
+            f"ORDER BY articles.date DESC LIMIT ?", ids + [limit])
+        return [{"key": key, "date": date, "sentiment": _SENTIMENT_COLUMNS[sentiment]} for key, date, sentiment in rows]
+
+    def related(self, name_or_qid: str, limit: int = 20) -> list[dict]:
+        """Entities most often mentioned in the same articles (edges of the co-mention graph)."""
+        ids = self.find(name_or_qid)
+        placeholders = ",".join("?" * len(ids))
+        rows = self._db.execute(
+            f"SELECT entities.type, entities.name, entities.wikidata_id, COUNT(DISTINCT other.article_id) AS shared "
+            f"FROM mentions AS own JOIN mentions AS other ON other.article_id = own.article_id "
+            f"JOIN entities ON entities.entity_id = other.entity_id "
+            f"WHERE own.entity_id IN ({placeholders}) AND other.entity_id NOT IN ({placeholders}) "
+            f"GROUP BY other.entity_id ORDER BY shared DESC LIMIT ?", ids + ids + [limit])
+        return [{"type": etype, "name": name, "wikidata_id": qid, "articles": shared}
+                for etype, name, qid, shared in rows]
+
+    def describe(self) -> str:
+        entities, = self._db.execute("SELECT COUNT(*) FROM entities").fetchone()
+        articles, = self._db.execute("SELECT COUNT(*) FROM articles").fetchone()
+        edges, = self._db.execute("SELECT COUNT(*) FROM mentions").fetchone()
+        return f"{entities} entities, {articles} articles, {edges} mentions"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the entity graph.")
+    parser.add_argument("graph_path", help="SQLite file, e.g. /app/data/progress/enrichment/entity_graph.sqlite")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    update_parser = subparsers.add_parser("update", help="Add new or modified enriched articles.")
+    update_parser.add_argument("data_dir", help="Data root, e.g. /app/data")
+    update_parser.add_argument("--sources", nargs="+", help="Sources to read (default: all).")
+    top_parser = subparsers.add_parser("top", help="Most mentioned entities.")
+    top_parser.add_argument("--type", choices=ENTITY_TYPES)
+    for name in ("timeline", "articles", "related"):
+        subparsers.add_parser(name).add_argument("entity", help="Entity name or WikiData id (e.g. Q1362).")
+    for name in ("top", "timeline"):
+        subparser = subparsers.choices[name]
+        subparser.add_argument("--from", dest="date_from", metavar="YYYY-MM-DD")
+        subparser.add_argument("--to", dest="date_to", metavar="YYYY-MM-DD")
+    for name in ("top", "articles", "related"):
+        subparsers.choices[name].add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    graph = EntityGraph(args.graph_path)
+    if args.command == "update":
+        counts = graph.update(args.data_dir, args.sources)
+        print(f"✅ Added {counts['added']} article(s), {counts['unchanged']} unchanged; {graph.describe()}")
+    elif args.command == "top":
+        for row in graph.top_entities(args.date_from, args.date_to, args.type, args.limit):
+            print(f"{row['mentions']:7}  {row['name']} ({row['type']}, {row['wikidata_id'] or 'no id'})  "
+                  f"+{row['positive']} ={row['neutral']} -{row['negative']}")
+    elif args.command == "timeline":
+        for row in graph.timeline(args.entity, args.date_from, args.date_to):
+            print(f"{row['date']}  {row['mentions']:5} mention(s)  sentiment {row['score']:+.2f}")
+    elif args.command == "articles":
+        for row in graph.articles(args.entity, args.limit):
+            print(f"{row['date']}  {row['key']}  ({row['sentiment']})")
+    else:
+        for row in graph.related(args.entity, args.limit):
+            print(f"{row['articles']:5}  {row['name']} ({row['type']}, {row['wikidata_id'] or 'no id'})")
+    graph.close()
@@ -0,0 +1,307 @@
+"""
+Local WikiData id resolution for extracted entities.
+
+An alias table maps normalized entity names to WikiData ids, with a vote count
+per (name, type, id). Votes come from the ids in accepted enrichments (a `null`
+id counts as a vote for "ambiguous") and from an offline dump. A name resolves
+to the id holding at least `MIN_SHARE` of its votes; names seen in no
+enrichment fall back to a fuzzy match against known names of the same type.
+
+`canonicalize` rewrites the `wikidata_id` of every entity the table can resolve,
+so "Shehbaz Sharif" gets the same id in every article, and merges entities of one
+article that resolve to the same id. With ENTITY_LINKING=local the prompt no
+longer asks the model for ids at all.
+
+    python entity_linker.py /app/data/progress/enrichment/entity_aliases.sqlite seed latest-all.json.gz
+    python entity_linker.py /app/data/progress/enrichment/entity_aliases.sqlite learn /app/data
+    python entity_linker.py /app/data/progress/enrichment/entity_aliases.sqlite lookup "Shehbaz Sharif" --type people
+"""
+import argparse
+import bz2
+import difflib
+import gzip
+import json
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from pathlib import Path
+
+ENTITY_TYPES = ("people", "organizations", "locations")
+ANY_TYPE = "*"  # aliases from a dump, valid for every entity type
+SEED_VOTES = 5  # a dump alias outweighs a handful of disagreeing model guesses
+MIN_SHARE = 0.6
+FUZZY_THRESHOLD = 0.9
+FUZZY_MAX_CANDIDATES = 200
+BUSY_TIMEOUT = 120.0  # seconds
+
+_WIKIDATA_RE = re.compile(r"^Q\d+$")
+_ABBREVIATION_RE = re.compile(r"[.'’]")  # "P.T.I." -> "pti", "Jinnah's" -> "jinnahs"
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_TITLES = {"mr", "mrs", "ms", "dr", "prof", "professor", "justice", "gen", "general"}
+
+
+def normalize_alias(name: str) -> str:
+    """Case-, accent- and punctuation-insensitive form of a name, without leading titles."""
+    text = unicodedata.normalize("NFKD", name)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    words = _PUNCTUATION_RE.sub(" ", _ABBREVIATION_RE.sub("", text.casefold())).split()
+    while len(words) > 1 and words[0] in _TITLES:
+        words.pop(0)
+    return " ".join(words)
+
+
+def _open_dump(path: Path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8")
+    if path.suffix == ".bz2":
+        return bz2.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def read_dump(path, language: str = "en"):
+    """
+    Yields `(qid, alias, type)` from a dump file: either TSV lines `QID<tab>alias[<tab>type]`
+    or a WikiData JSON dump (one entity per line, as in latest-all.json).
+    """
+    path = Path(path)
+    with _open_dump(path) as f:
+        for line in f:
+            line = line.strip().rstrip(",")
+            if not line or line in "[]":
+                continue
+            if line.startswith("{"):
+                try:
+                    entity = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                qid = entity.get("id", "")
+                if not _WIKIDATA_RE.match(qid):
+                    continue
+                label = (entity.get("labels") or {}).get(language)
+                if label:
+                    yield qid, label["value"], ANY_TYPE
+                for alias in (entity.get("aliases") or {}).get(language) or []:
+                    yield qid, alias["value"], ANY_TYPE
+            else:
+                fields = line.split("\t")
+                if len(fields) >= 2 and _WIKIDATA_RE.match(fields[0]):
+                    entity_type = fields[2] if len(fields) > 2 and fields[2] in ENTITY_TYPES else ANY_TYPE
+                    yield fields[0], fields[1], entity_type
+
+
+class EntityLinker:
+    """
+    Alias table held in memory and persisted to SQLite. Thread-safe; `learn` and
+    `seed` write through, `lookup` and `canonicalize` only read memory.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.stats = {"exact": 0, "fuzzy": 0, "changed": 0, "merged": 0, "unresolved": 0}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS aliases (
+                norm TEXT NOT NULL,
+                type TEXT NOT NULL,
+                qid TEXT NOT NULL,
+                votes INTEGER NOT NULL,
+                PRIMARY KEY (norm, type, qid)
+            ) WITHOUT ROWID""")
+        self._db.commit()
+        # (type, norm) -> {qid or "": votes}; "" is the vote for "no id"
+        self._votes: dict[tuple[str, str], dict[str, int]] = {}
+        # (type, word) -> names containing it, for fuzzy candidates
+        self._words: dict[tuple[str, str], set[str]] = {}
+        for norm, entity_type, qid, votes in self._db.execute("SELECT norm, type, qid, votes FROM aliases"):
+            self._add_votes(entity_type, norm, qid, votes)
+
+    def _add_votes(self, entity_type: str, norm: str, qid: str, votes: int):
+        counts = self._votes.get((entity_type, norm))
+        if counts is None:
+            counts = self._votes[(entity_type, norm)] = {}
+            for word in norm.split():
+                self._words.setdefault((entity_type, word), set()).add(norm)
+        counts[qid] = counts.get(qid, 0) + votes
+
+    def _vote(self, entity_type: str, norm: str, qid: str, votes: int):
+        self._add_votes(entity_type, norm, qid, votes)
+        self._db.execute(
+            "INSERT INTO aliases VALUES (?, ?, ?, ?) ON CONFLICT (norm, type, qid) DO UPDATE SET votes = votes + ?",
+            (norm, entity_type, qid, votes, votes))
+
+    # --- Building ---
+
+    def learn(self, entities: dict):
+        """Counts the ids of one accepted enrichment's entities as votes."""
+        with self._lock:
+            for entity_type in ENTITY_TYPES:
+                for entity in (entities or {}).get(entity_type) or []:
+                    if not isinstance(entity, dict) or not isinstance(entity.get("name"), str):
+                        continue
+                    norm = normalize_alias(entity["name"])
+                    qid = entity.get("wikidata_id")
+                    if norm:
+                        self._vote(entity_type, norm, qid if isinstance(qid, str) and _WIKIDATA_RE.match(qid) else "", 1)
+
+    def seed(self, path, language: str = "en") -> int:
+        """Adds every alias of a dump file (see `read_dump`) with SEED_VOTES votes."""
+        added = 0
+        with self._lock:
+            for qid, alias, entity_type in read_dump(path, language):
+                norm = normalize_alias(alias)
+                if norm:
+                    self._vote(entity_type, norm, qid, SEED_VOTES)
+                    added += 1
+                    if added % 100_000 == 0:
+                        self._db.commit()
+            self._db.commit()
+        return added
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
+
+    # --- Resolving ---
+
+    def _decide(self, counts: dict[str, int] | None) -> str | None:
+        """The id (or "" for "no id") holding at least MIN_SHARE of the votes, else None."""
+        if not counts:
+            return None
+        qid, votes = max(counts.items(), key=lambda item: (item[1], item[0]))
+        return qid if votes >= MIN_SHARE * sum(counts.values()) else None
+
+    def _fuzzy(self, entity_type: str, norm: str) -> str | None:
+        candidates = set()
+        for kind in (entity_type, ANY_TYPE):
+            for word in norm.split():
+                candidates.update(self._words.get((kind, word), ()))
+                if len(candidates) > FUZZY_MAX_CANDIDATES:
+                    break
+        best, best_ratio = None, FUZZY_THRESHOLD
+        matcher = difflib.SequenceMatcher(b=norm, autojunk=False)
+        for candidate in sorted(candidates)[:FUZZY_MAX_CANDIDATES]:
+            matcher.set_seq1(candidate)
+            if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= best_ratio:
+                counts = dict(self._votes.get((entity_type, candidate), {}))
+                for qid, votes in self._votes.get((ANY_TYPE, candidate), {}).items():
+                    counts[qid] = counts.get(qid, 0) + votes
+                qid = self._decide(counts)
+                if qid:  # a fuzzy match is only trusted for a real id
+                    best, best_ratio = qid, ratio
+        return best
+
+    def lookup(self, name: str, entity_type: str) -> tuple[str | None, str] | None:
+        """
+        Resolves a name to `(qid, how)`, where `qid` is None if the name is known to be
+        ambiguous and `how` is "exact" or "fuzzy". Returns None when there is no answer.
+        """
+        norm = normalize_alias(name)
+        if not norm:
+            return None
+        counts = dict(self._votes.get((entity_type, norm), {}))
+        for qid, votes in self._votes.get((ANY_TYPE, norm), {}).items():
+            counts[qid] = counts.get(qid, 0) + votes
+        qid = self._decide(counts)
+        if qid is not None:
+            return (qid or None), "exact"
+        if not counts:
+            qid = self._fuzzy(entity_type, norm)
+            if qid is not None:
+                return qid, "fuzzy"
+        return None
+
+    def canonicalize(self, entities: dict) -> dict:
+        """
+        Returns `entities` with every resolvable `wikidata_id` replaced by the table's
+        answer; entities of one type that end up with the same id are merged (the
+        first mention is kept). Unresolved entities keep the model's id.
+        """
+        result = {}
+        for entity_type, items in (entities or {}).items():
+            if entity_type not in ENTITY_TYPES or not isinstance(items, list):
+                result[entity_type] = items
+                continue
+            kept, seen_ids = [], set()
+            for entity in items:
+                if not isinstance(entity, dict) or not isinstance(entity.get("name"), str):
+                    kept.append(entity)
+                    continue
+                resolved = self.lookup(entity["name"], entity_type)
+                if resolved is None:
+                    self.stats["unresolved"] += 1
+                else:
+                    qid, how = resolved
+                    self.stats[how] += 1
+                    if entity.get("wikidata_id") != qid:
+                        self.stats["changed"] += 1
+                        entity = dict(entity, wikidata_id=qid)
+                qid = entity.get("wikidata_id")
+                if qid and qid in seen_ids:
+                    self.stats["merged"] += 1
+                    continue
+                seen_ids.add(qid)
+                kept.append(entity)
+            result[entity_type] = kept
+        return result
+
+    def describe(self) -> str:
+        resolved = self.stats["exact"] + self.stats["fuzzy"]
+        looked_up = resolved + self.stats["unresolved"]
+        rate = f"{resolved / looked_up:.0%}" if looked_up else "n/a"
+        return (f"{len(self._votes)} aliases; resolved {resolved}/{looked_up} entities ({rate}, "
+                f"{self.stats['fuzzy']} fuzzy), {self.stats['changed']} ids changed, {self.stats['merged']} merged")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or query the local WikiData alias table.")
+    parser.add_argument("aliases_path", help="SQLite file, e.g. /app/data/progress/enrichment/entity_aliases.sqlite")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    seed_parser = subparsers.add_parser("seed", help="Add aliases from a TSV or WikiData JSON dump (.gz/.bz2 ok).")
+    seed_parser.add_argument("dump")
+    seed_parser.add_argument("--language", default="en")
+    learn_parser = subparsers.add_parser("learn", help="Count the ids in existing enriched articles.")
+    learn_parser.add_argument("data_dir", help="Data root, e.g. /app/data")
+    lookup_parser = subparsers.add_parser("lookup", help="Resolve a name.")
+    lookup_parser.add_argument("name")
+    lookup_parser.add_argument("--type", choices=ENTITY_TYPES, default="people")
+    args = parser.parse_args()
+
+    linker = EntityLinker(args.aliases_path)
+    if args.command == "seed":
+        print(f"✅ Added {linker.seed(args.dump, args.language)} alias(es); {linker.describe()}")
+    elif args.command == "learn":
+        articles = 0
+        for source_dir in Path(args.data_dir).iterdir():
+            enriched_dir = source_dir / "transformed_articles_ner"
+            if source_dir.name == "progress" or not enriched_dir.is_dir():
+                continue
+            for dirpath, _, filenames in os.walk(enriched_dir):
+                for filename in filenames:
+                    if filename.endswith(".json"):
+                        try:
+                            with open(Path(dirpath) / filename, "r", encoding="utf-8") as f:
+                                linker.learn(json.load(f).get("entities"))
+                            articles += 1
+                        except (OSError, json.JSONDecodeError):
+                            continue
+        print(f"✅ Learned from {articles} article(s); {linker.describe()}")
+    else:
+        resolved = linker.lookup(args.name, args.type)
+        norm = normalize_alias(args.name)
+        votes = {kind: linker._votes[(kind, norm)] for kind in (args.type, ANY_TYPE) if (kind, norm) in linker._votes}
+        print(f"{norm!r}: {resolved or 'unknown'}  votes {votes}")
+    linker.close()
@@ -0,0 +1,261 @@
+"""
+CPU named-entity recognition for ENRICHMENT_PROVIDER=local.
+
+Fills an article's `entities` (people, organizations, locations) from a compact
+NER model instead of an LLM, many articles per call:
+
+- `spacy`: a spaCy pipeline (LOCAL_NER_MODEL, default `en_core_web_sm`) run with
+  `nlp.pipe`; only the NER component is kept.
+- `onnx`: a token-classification model exported to ONNX (e.g. with
+  `optimum-cli export onnx --model dslim/bert-base-NER <dir>`). LOCAL_NER_MODEL is
+  the export directory (`model.onnx`, `tokenizer.json`, `config.json`). Long
+  articles are split into overlapping windows; onnxruntime spreads each batch over
+  LOCAL_NER_THREADS cores.
+
+Neither backend is installed with the enricher; see requirements.txt.
+
+Mentions are de-duplicated per article the way the LLM prompt asks: one entry per
+name (case, accents, punctuation and titles ignored, see `normalize_alias`), typed
+by its most frequent label. A lone surname or first name that belongs to exactly
+one full name in the article is merged into it. Entities get `wikidata_id: null`
+(the entity linker resolves ids) and a Neutral sentiment unless a second pass
+assigns one.
+
+    python local_ner.py /app/data/app/transformed_articles/2025/03/01 --backend spacy
+"""
+import argparse
+import json
+import re
+import time
+from collections import Counter
+from pathlib import Path
+
+from entity_linker import ENTITY_TYPES, normalize_alias
+
+# spaCy (OntoNotes) and CoNLL-style labels -> entity type; other labels (MISC, NORP, DATE, ...) are dropped
+LABEL_TYPES = {
+    "PERSON": "people", "PER": "people",
+    "ORG": "organizations",
+    "GPE": "locations", "LOC": "locations", "FAC": "locations",
+}
+DEFAULT_SENTIMENT = "Neutral"
+ONNX_MAX_TOKENS = 512
+ONNX_STRIDE = 64  # tokens shared by neighbouring windows of a long article
+
+_POSSESSIVE_RE = re.compile(r"['’]s$")
+_EDGE_PUNCTUATION = " \t\n\"'“”‘’()[]{},.;:!?-–—"
+
+
+def clean_mention(text: str) -> str:
+    """'the “Shehbaz Sharif’s' -> 'Shehbaz Sharif': whitespace, quotes and possessives stripped."""
+    text = " ".join(text.split()).strip(_EDGE_PUNCTUATION)
+    text = _POSSESSIVE_RE.sub("", text).strip(_EDGE_PUNCTUATION)
+    if text.startswith("the "):
+        text = text[4:]
+    return text
+
+
+def group_entities(mentions: list) -> dict:
+    """
+    Turns `(text, label)` mentions of one article into the enrichment's
+    `{"people": [...], "organizations": [...], "locations": [...]}`, in order of first mention.
+    """
+    surface = {}  # key -> Counter of surface forms
+    labels = {}  # key -> Counter of entity types
+    for text, label in mentions:
+        entity_type = LABEL_TYPES.get(label)
+        if entity_type is None:
+            continue
+        name = clean_mention(text)
+        key = normalize_alias(name)
+        if len(key) < 2 or not any(ch.isalpha() for ch in key):
+            continue
+        surface.setdefault(key, Counter())[name] += 1
+        labels.setdefault(key, Counter())[entity_type] += 1
+
+    types = {key: counts.most_common(1)[0][0] for key, counts in labels.items()}
+    # "Sharif" -> "Shehbaz Sharif" when that is the only full name it can belong to
+    full_names = [key for key, entity_type in types.items() if entity_type == "people" and " " in key]
+    for key in [key for key, entity_type in types.items() if entity_type == "people" and " " not in key]:
+        owners = [full for full in full_names if key in (full.split()[0], full.split()[-1])]
+        if len(owners) == 1:
+            surface[owners[0]].update(surface.pop(key))
+            del types[key]
+
+    entities = {entity_type: [] for entity_type in ENTITY_TYPES}
+    for key, entity_type in types.items():
+        forms = surface[key]
+        name = max(forms, key=lambda form: (forms[form], len(form)))
+        entities[entity_type].append({"name": name, "wikidata_id": None, "sentiment": DEFAULT_SENTIMENT})
+    return entities
+
+
+class LocalNER:
+    """A batched NER model; subclasses implement `mentions`."""
+
+    backend = ""
+
+    def __init__(self, model: str, batch_size: int):
+        self.model = model
+        self.batch_size = batch_size
+
+    def mentions(self, texts: list) -> list:
+        """`[(text, label), ...]` for each of `texts`."""
+        raise NotImplementedError
+
+    def extract(self, texts: list) -> list:
+        """The `entities` object for each of `texts`."""
+        return [group_entities(found) for found in self.mentions(texts)]
+
+    def describe(self) -> str:
+        return f"{self.backend} model {self.model}, batches of {self.batch_size}"
+
+
+class SpacyNER(LocalNER):
+    backend = "spacy"
+
+    def __init__(self, model: str, batch_size: int):
+        super().__init__(model, batch_size)
+        try:
+            import spacy
+        except ImportError as e:
+            raise RuntimeError("LOCAL_NER_BACKEND=spacy requires the 'spacy' package "
+                               "(pip install spacy && python -m spacy download en_core_web_sm).") from e
+        # Only the entity recognizer (and the tok2vec it listens to) is needed
+        self.nlp = spacy.load(model, exclude=["tagger", "parser", "attribute_ruler", "lemmatizer", "senter"])
+
+    def mentions(self, texts: list) -> list:
+        return [[(ent.text, ent.label_) for ent in doc.ents]
+                for doc in self.nlp.pipe(texts, batch_size=self.batch_size)]
+
+
+class OnnxNER(LocalNER):
+    backend = "onnx"
+
+    def __init__(self, model: str, batch_size: int, threads: int = 0):
+        super().__init__(model, batch_size)
+        try:
+            import numpy
+            import onnxruntime
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError("LOCAL_NER_BACKEND=onnx requires the 'onnxruntime', 'tokenizers' and 'numpy' "
+                               "packages (pip install onnxruntime tokenizers numpy).") from e
+        self.np = numpy
+        model_dir = Path(model)
+        config = json.loads((model_dir / "config.json").read_text(encoding="utf-8"))
+        self.id2label = {int(index): label for index, label in config["id2label"].items()}
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.no_padding()
+        self.tokenizer.enable_truncation(max_length=ONNX_MAX_TOKENS, stride=ONNX_STRIDE)
+        options = onnxruntime.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(str(model_dir / "model.onnx"), options,
+                                                    providers=["CPUExecutionProvider"])
+        self.input_names = {item.name for item in self.session.get_inputs()}
+
+    def _predict(self, windows: list) -> list:
+        """Label ids per token for each encoding in `windows`, padded into batches of similar length."""
+        np = self.np
+        predictions = [None] * len(windows)
+        order = sorted(range(len(windows)), key=lambda i: len(windows[i].ids))
+        for start in range(0, len(order), self.batch_size):
+            chunk = order[start:start + self.batch_size]
+            width = max(len(windows[i].ids) for i in chunk)
+            input_ids = np.zeros((len(chunk), width), dtype=np.int64)
+            attention_mask = np.zeros((len(chunk), width), dtype=np.int64)
+            for row, i in enumerate(chunk):
+                ids = windows[i].ids
+                input_ids[row, :len(ids)] = ids
+                attention_mask[row, :len(ids)] = 1
+            feed = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feed["token_type_ids"] = np.zeros_like(input_ids)
+            logits = self.session.run(None, feed)[0]
+            labels = logits.argmax(axis=-1)
+            for row, i in enumerate(chunk):
+                predictions[i] = labels[row, :len(windows[i].ids)].tolist()
+        return predictions
+
+    def _spans(self, text: str, encoding, labels: list, trim_start: bool, trim_end: bool) -> list:
+        """
+        Decodes the word-level BIO labels of one window into `(text, label)` mentions. Mentions
+        touching an edge shared with a neighbouring window are left to the window that holds them whole.
+        """
+        words = []  # [label, start, end] per word, labelled by its first sub-token
+        previous_word = None
+        for word, special, (start, end), label_id in zip(encoding.word_ids, encoding.special_tokens_mask,
+                                                         encoding.offsets, labels):
+            if special or word is None:
+                continue
+            if word == previous_word:
+                words[-1][2] = end
+            else:
+                words.append([self.id2label.get(label_id, "O"), start, end])
+            previous_word = word
+
+        spans, current = [], None  # current: [label, start, end, first word, last word]
+        for index, (label, start, end) in enumerate(words):
+            prefix, _, entity = label.rpartition("-") if "-" in label else ("", "", label)
+            if label == "O":
+                entity = None
+            if entity is not None and prefix in ("I", "E", "") and current is not None and current[0] == entity:
+                current[2], current[4] = end, index
+                continue
+            if current is not None:
+                spans.append(current)
+            current = [entity, start, end, index, index] if entity is not None else None
+        if current is not None:
+            spans.append(current)
+        last = len(words) - 1
+        return [(text[start:end], entity) for entity, start, end, first, final in spans
+                if not (trim_start and first == 0) and not (trim_end and final == last)]
+
+    def mentions(self, texts: list) -> list:
+        windows, owners = [], []  # every window of every text, and (text index, position, window count)
+        for index, encoding in enumerate(self.tokenizer.encode_batch(texts)):
+            parts = [encoding] + list(encoding.overflowing)
+            for position, part in enumerate(parts):
+                windows.append(part)
+                owners.append((index, position, len(parts)))
+        found = [[] for _ in texts]
+        for window, labels, (index, position, count) in zip(windows, self._predict(windows), owners):
+            found[index].extend(self._spans(texts[index], window, labels,
+                                            trim_start=position > 0, trim_end=position < count - 1))
+        return found
+
+
+def load_ner(backend: str, model: str = "", batch_size: int = 64, threads: int = 0) -> LocalNER:
+    """Loads the configured backend; raises RuntimeError if its packages are missing."""
+    if backend == "spacy":
+        return SpacyNER(model or "en_core_web_sm", batch_size)
+    if backend == "onnx":
+        if not model:
+            raise ValueError("LOCAL_NER_BACKEND=onnx needs LOCAL_NER_MODEL set to an ONNX export directory.")
+        return OnnxNER(model, batch_size, threads)
+    raise ValueError(f"Invalid LOCAL_NER_BACKEND: '{backend}'. Must be 'spacy' or 'onnx'.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the local NER model over transformed articles.")
+    parser.add_argument("paths", nargs="+", help="Transformed article files or directories of them.")
+    parser.add_argument("--backend", default="spacy", choices=["spacy", "onnx"])
+    parser.add_argument("--model", default="", help="spaCy model name or ONNX export directory.")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    files = []
+    for path in map(Path, args.paths):
+        files.extend(sorted(path.rglob("*.json")) if path.is_dir() else [path])
+    articles = [json.loads(file.read_text(encoding="utf-8")) for file in files]
+    texts = [article.get("content", {}).get("article_body") or "" for article in articles]
+
+    ner = load_ner(args.backend, args.model, args.batch_size)
+    started = time.perf_counter()
+    results = ner.extract(texts)
+    elapsed = time.perf_counter() - started
+    for file, entities in zip(files, results):
+        print(f"{file}: " + "; ".join(f"{entity_type}: {', '.join(e['name'] for e in items)}"
+                                       for entity_type, items in entities.items() if items))
+    print(f"{len(texts)} article(s) in {elapsed:.2f}s ({len(texts) / max(elapsed, 1e-9):.1f}/s) with {ner.describe()}")
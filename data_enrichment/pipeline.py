@@ -0,0 +1,204 @@
+"""
+Streaming mode: clean and enrich in one process.
+
+`cleaner.main` runs in a producer thread and hands every article it writes to a
+bounded queue; enrichment workers (the threaded or the async engine, as selected
+by ENRICHMENT_ENGINE) take articles off the queue while the cleaner keeps going.
+Model latency overlaps with the CPU-bound cleaning, and the enricher needs no
+second walk of transformed_articles/. When the queue is full the cleaner waits,
+so a slow model never lets cleaned articles pile up in memory.
+
+Only articles cleaned in this run are enriched (re-cleaned ones are enriched
+again); run `enricher.py` on its own to work through an older backlog. Both
+stages still run standalone exactly as before.
+
+    python pipeline.py /app/data --changed-list /app/data/progress/cleaner/changed_paths.txt
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+from functools import partial
+from pathlib import Path
+
+# cleaner.py lives in ../data_cleaner in the repo and next to this script in the image
+sys.path.append(str(Path(__file__).resolve().parent.parent / "data_cleaner"))
+import cleaner  # noqa: E402
+import enricher  # noqa: E402
+from partition import Partition  # noqa: E402
+
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", 64))
+
+
+class ArticleStream:
+    """
+    Turns the cleaner's `on_article` callbacks into enrichment jobs `(load, name, output_path)`
+    on a bounded queue, followed by one `None` per consumer once cleaning is over.
+    """
+
+    def __init__(self, put, consumers: int):
+        self.put = put
+        self.consumers = consumers
+        self.queued = 0
+
+    def on_article(self, source: str, rel_path: str, record: dict | None):
+        if source not in enricher.SOURCES:
+            return
+        if record is not None:
+            load = partial(dict, record)
+        else:
+            input_path = enricher.INPUT_BASE_DIR / source / enricher.INPUT_SUBDIR / rel_path
+            load = partial(enricher.load_article_file, input_path)
+        output_path = enricher.OUTPUT_BASE_DIR / source / enricher.OUTPUT_SUBDIR / rel_path
+        self.put((load, Path(rel_path).name, output_path))  # blocks while the queue is full
+        self.queued += 1
+
+    def run_cleaner(self, **cleaner_args):
+        try:
+            # Enrichment threads are already running, so the cleaner's pool must not fork
+            cleaner.main(on_article=self.on_article, mp_context=multiprocessing.get_context("spawn"),
+                         **cleaner_args)
+        finally:
+            for _ in range(self.consumers):
+                self.put(None)
+            logging.info(f"Cleaner finished; {self.queued} article(s) queued for enrichment.")
+
+
+def take_batch(get, first) -> tuple[list, bool]:
+    """
+    Extends `[first]` with queued jobs, without waiting, up to `enricher.jobs_per_batch()`.
+    Returns the jobs and whether the end-of-stream marker was taken.
+    """
+    jobs = [first]
+    size = enricher.jobs_per_batch()
+    while len(jobs) < size:
+        try:
+            job = get()
+        except (queue.Empty, asyncio.QueueEmpty):
+            break
+        if job is None:
+            return jobs, True
+        jobs.append(job)
+    return jobs, False
+
+
+def run_threads(cleaner_args: dict):
+    jobs = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    stream = ArticleStream(jobs.put, enricher.MAX_WORKERS)
+
+    def consume():
+        while (job := jobs.get()) is not None:
+            batch, finished = take_batch(jobs.get_nowait, job)
+            try:
+                enricher.enrich_batch(batch)
+            except Exception as exc:
+                logging.error(f"Enriching {', '.join(name for _, name, _ in batch)} failed: {exc}")
+            if finished:
+                return
+
+    consumers = [threading.Thread(target=consume, name=f"enrich-{i}") for i in range(enricher.MAX_WORKERS)]
+    for thread in consumers:
+        thread.start()
+    stream.run_cleaner(**cleaner_args)
+    for thread in consumers:
+        thread.join()
+    enricher.enrich_duplicates()
+    logging.info(f"Final rate control state: {enricher.rate_controller.describe()}")
+
+
+async def run_async(cleaner_args: dict):
+    engine = enricher.build_async_engine()
+    jobs = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    loop = asyncio.get_running_loop()
+    consumer_count = engine.max_concurrency * 2
+
+    def put(job):
+        asyncio.run_coroutine_threadsafe(jobs.put(job), loop).result()
+
+    stream = ArticleStream(put, consumer_count)
+
+    async def consume():
+        while (job := await jobs.get()) is not None:
+            batch, finished = take_batch(jobs.get_nowait, job)
+            try:
+                await enricher.enrich_batch_async(engine, batch)
+            except Exception as exc:
+                logging.error(f"Enriching {', '.join(name for _, name, _ in batch)} failed: {exc}")
+            if finished:
+                return
+
+    try:
+        await asyncio.gather(asyncio.to_thread(stream.run_cleaner, **cleaner_args),
+                             *(consume() for _ in range(consumer_count)))
+        await enricher.enrich_duplicates_async(engine)
+    finally:
+        await engine.aclose()
+    logging.info(f"Final rate control state: {engine.controller.describe()}")
+
+
+def main(cleaner_args: dict):
+    # Both stages work on the same data root
+    enricher.INPUT_BASE_DIR = enricher.OUTPUT_BASE_DIR = Path(cleaner_args["data_root_dir"])
+    logging.info(f"Starting streaming clean + enrich using provider: {enricher.ENRICHMENT_PROVIDER.upper()} "
+                 f"({enricher.ENRICHMENT_ENGINE} engine, queue of {PIPELINE_QUEUE_SIZE})")
+    enricher.open_metrics()
+    enricher.open_response_cache()
+    # One connection for both stages: a second one would wait on the cleaner's uncommitted adds
+    cleaner_args = dict(cleaner_args, search_index=enricher.open_search_index())
+    enricher.open_entity_graph()
+    enricher.open_entity_linker()
+    enricher.open_work_journal()
+    if enricher.ENRICHMENT_ENGINE == "async":
+        asyncio.run(run_async(cleaner_args))
+    else:
+        run_threads(cleaner_args)
+    enricher.log_payload_stats()
+    enricher.close_response_cache()
+    enricher.close_search_index()
+    enricher.close_entity_graph()
+    enricher.close_entity_linker()
+    enricher.close_work_journal()
+    enricher.close_metrics()
+    logging.info("Streaming pipeline finished.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean articles and enrich them as they are cleaned.")
+    parser.add_argument('data_dir', nargs='?', default='/app/data', help="The data root (e.g., /app/data).")
+    parser.add_argument('--workers', metavar='N', type=int, default=int(os.environ.get('CLEANER_WORKERS', 1)),
+                        help="Cleaner worker processes (default: 1, or $CLEANER_WORKERS). Use 0 for one per CPU core.")
+    parser.add_argument('--changed-list', metavar='FILE', type=str,
+                        help="The cleaner's changed-path hand-over file (see cleaner.py).")
+    parser.add_argument('--output-format', choices=cleaner.OUTPUT_FORMATS,
+                        default=os.environ.get('CLEANER_OUTPUT_FORMAT', 'files'),
+                        help="The cleaner's output backend (default: files).")
+    parser.add_argument('--shard-by', choices=cleaner.SHARD_GRANULARITIES,
+                        default=os.environ.get('CLEANER_SHARD_BY', 'day'),
+                        help="Shard granularity for --output-format jsonl (default: day).")
+    parser.add_argument('--no-dedupe', action='store_true', default=os.environ.get('CLEANER_DEDUPE', '1') == '0',
+                        help="Don't tag near-duplicates (every article is then enriched).")
+    parser.add_argument('--from', dest='date_from', metavar='YYYY-MM-DD',
+                        help="Only clean and enrich articles dated on or after this day.")
+    parser.add_argument('--to', dest='date_to', metavar='YYYY-MM-DD',
+                        help="Only clean and enrich articles dated on or before this day.")
+    parser.add_argument('--shard', metavar='I/N', help="Only handle articles whose id hashes to shard I of N.")
+    args = parser.parse_args()
+    try:
+        partition = Partition(args.date_from, args.date_to, args.shard)
+    except ValueError as e:
+        parser.error(str(e))
+    enricher.PARTITION = partition
+
+    main({
+        "data_root_dir": args.data_dir,
+        "workers": args.workers if args.workers > 0 else (os.cpu_count() or 1),
+        "changed_list": args.changed_list,
+        "output_format": args.output_format,
+        "shard_by": args.shard_by,
+        "dedupe": not args.no_dedupe,
+        "partition": partition,
+    })
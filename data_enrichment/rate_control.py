@@ -0,0 +1,214 @@
+"""
+Adaptive rate limiting for LLM providers.
+
+`AdaptiveRateController` gates every model request on three limits:
+
+- an in-flight limit, adjusted AIMD-style: +1 per window of successful requests,
+  halved on 429/5xx/timeouts and trimmed when latency exceeds the target;
+- a requests-per-second token bucket, adjusted the same way;
+- an optional tokens-per-minute budget (TOKENS_PER_MINUTE), debited with the
+  estimated prompt size up front and corrected with the reported usage.
+
+It works with both the threaded and the async engine: `request()` is a blocking
+context manager, `request_async()` its asyncio counterpart. Current limits are
+logged whenever they shrink and at most every `log_interval` seconds otherwise.
+"""
+import asyncio
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+# How often a waiting request re-checks the in-flight limit (seconds)
+POLL_INTERVAL = 0.05
+CONGESTION_STATUS_CODES = {429, 500, 502, 503, 504}
+TIMEOUT_STATUS_CODES = {408, 504}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def error_status_code(exc: BaseException) -> int | None:
+    """Best-effort HTTP status code from httpx, ollama, requests or google-api-core exceptions."""
+    for candidate in (getattr(exc, "status_code", None),
+                      getattr(getattr(exc, "response", None), "status_code", None),
+                      getattr(exc, "code", None)):
+        if isinstance(candidate, int):
+            return candidate
+    return None
+
+
+def classify_error(exc: BaseException) -> str:
+    """Returns 'congestion' for throttling/overload signals, 'timeout', or 'error' for anything else."""
+    status = error_status_code(exc)
+    if isinstance(exc, TimeoutError) or "timeout" in type(exc).__name__.lower() or status in TIMEOUT_STATUS_CODES:
+        return "timeout"
+    if status in CONGESTION_STATUS_CODES:
+        return "congestion"
+    return "error"
+
+
+class TokenBucket:
+    """
+    Classic token bucket. `reserve(n)` always succeeds and returns how long the
+    caller must wait before using the tokens, so it can be used from threads and
+    coroutines alike. The balance may go negative to account for overdrafts.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= amount
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, amount: float):
+        """Credits (positive) or debits (negative) tokens after the fact."""
+        self._refill(time.monotonic())
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def set_rate(self, rate: float, capacity: float):
+        self._refill(time.monotonic())
+        self.rate, self.capacity = rate, capacity
+        self.tokens = min(self.tokens, capacity)
+
+
+class RequestTicket:
+    """Handed to the caller of `request()`; set `tokens_used` once the provider reports usage."""
+
+    def __init__(self, estimated_tokens: int):
+        self.estimated_tokens = estimated_tokens
+        self.tokens_used = None
+        self.started = time.monotonic()
+
+
+class AdaptiveRateController:
+    def __init__(self, name: str, max_in_flight: int, initial_rps: float, max_rps: float, min_rps: float = 0.05,
+                 tokens_per_minute: int = 0, target_latency: float = 0.0, log_interval: float = 30.0):
+        self.name = name
+        self.max_in_flight = max(1, max_in_flight)
+        self.limit = float(self.max_in_flight)
+        self.min_rps = min_rps
+        self.max_rps = max(min_rps, max_rps)
+        self.rps = min(max(initial_rps, min_rps), self.max_rps)
+        self.target_latency = target_latency
+        self.log_interval = log_interval
+        self.in_flight = 0
+        self.latency_ewma = None
+        self.stats = {"ok": 0, "congestion": 0, "timeout": 0, "error": 0}
+
+        self._lock = threading.Lock()
+        self._rate_bucket = TokenBucket(self.rps, max(1.0, self.rps))
+        self._token_budget = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute) if tokens_per_minute > 0 else None
+        self._last_decrease = 0.0
+        self._last_log = 0.0
+
+    # --- Admission ---
+
+    def _try_admit(self, estimated_tokens: int) -> float:
+        """Admits the request (returning the wait before sending it) or returns -1 if the in-flight limit is full."""
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return -1.0
+            self.in_flight += 1
+            wait = self._rate_bucket.reserve(1)
+            if self._token_budget is not None:
+                wait = max(wait, self._token_budget.reserve(estimated_tokens))
+            return wait
+
+    def _finish(self, ticket: RequestTicket, exc: BaseException | None):
+        latency = time.monotonic() - ticket.started
+        outcome = "ok" if exc is None else classify_error(exc)
+        with self._lock:
+            self.in_flight -= 1
+            self.stats[outcome] += 1
+            if self._token_budget is not None and ticket.tokens_used is not None:
+                self._token_budget.adjust(ticket.estimated_tokens - ticket.tokens_used)
+
+            if outcome == "ok":
+                self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+                if self.target_latency and latency > self.target_latency:
+                    self._decrease(0.9, f"latency {latency:.1f}s above target {self.target_latency:.1f}s")
+                else:
+                    # Additive increase: roughly +1 in-flight slot and +1 req/s per window of successes
+                    self.limit = min(self.max_in_flight, self.limit + 1.0 / self.limit)
+                    self._set_rps(self.rps + 1.0 / max(1.0, self.rps))
+            elif outcome in ("congestion", "timeout"):
+                self._decrease(0.5, f"{outcome} ({type(exc).__name__})")
+            self._maybe_log()
+
+    def _decrease(self, factor: float, reason: str):
+        # At most one multiplicative decrease per round trip, so a burst of failures from
+        # the same overload does not collapse the limits to their minimum.
+        now = time.monotonic()
+        if now - self._last_decrease < (self.latency_ewma or 1.0):
+            return
+        self._last_decrease = now
+        self.limit = max(1.0, self.limit * factor)
+        self._set_rps(self.rps * factor)
+        self._log(f"backing off after {reason}")
+
+    def _set_rps(self, rps: float):
+        self.rps = min(self.max_rps, max(self.min_rps, rps))
+        self._rate_bucket.set_rate(self.rps, max(1.0, self.rps))
+
+    # --- Logging ---
+
+    def describe(self) -> str:
+        budget = ""
+        if self._token_budget is not None:
+            budget = f", {self._token_budget.tokens:,.0f}/{self._token_budget.capacity:,.0f} tokens/min left"
+        latency = f"{self.latency_ewma:.2f}s" if self.latency_ewma is not None else "n/a"
+        return (f"in-flight limit {int(self.limit)}/{self.max_in_flight} ({self.in_flight} active), "
+                f"{self.rps:.2f} req/s{budget}, latency EWMA {latency}, outcomes {self.stats}")
+
+    def _log(self, reason: str):
+        self._last_log = time.monotonic()
+        logging.info(f"⚙️  Rate control [{self.name}] {reason}: {self.describe()}")
+
+    def _maybe_log(self):
+        if time.monotonic() - self._last_log >= self.log_interval:
+            self._log("status")
+
+    # --- Public API ---
+
+    @contextmanager
+    def request(self, estimated_tokens: int = 0):
+        """Blocks until the request may be sent, then records its outcome and latency."""
+        while (wait := self._try_admit(estimated_tokens)) < 0:
+            time.sleep(POLL_INTERVAL)
+        if wait:
+            time.sleep(wait)
+        ticket = RequestTicket(estimated_tokens)
+        try:
+            yield ticket
+        except BaseException as e:
+            self._finish(ticket, e)
+            raise
+        self._finish(ticket, None)
+
+    @asynccontextmanager
+    async def request_async(self, estimated_tokens: int = 0):
+        """Async version of `request`: waits on the event loop instead of blocking a thread."""
+        while (wait := self._try_admit(estimated_tokens)) < 0:
+            await asyncio.sleep(POLL_INTERVAL)
+        if wait:
+            await asyncio.sleep(wait)
+        ticket = RequestTicket(estimated_tokens)
+        try:
+            yield ticket
+        except BaseException as e:
+            self._finish(ticket, e)
+            raise
+        self._finish(ticket, None)
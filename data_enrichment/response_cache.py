@@ -0,0 +1,133 @@
+"""
+Persistent cache of model responses.
+
+Responses are stored in SQLite, keyed by a hash of the whitespace-normalized
+prompt payload (the article body), the provider, the model name and the prompt
+version. Re-enriching an article whose output was deleted, or a syndicated story
+that appears in both APP and Dawn, is then answered from disk instead of the model.
+Changing the model or the prompt changes the key, so stale answers are never reused.
+
+The cache is capped at `max_bytes` of stored responses; the least recently used
+entries are evicted first.
+
+    python response_cache.py /app/data/progress/enrichment/response_cache.sqlite   # print stats
+"""
+import argparse
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+# Evict down to this fraction of max_bytes, so eviction doesn't run on every insert
+EVICT_TO = 0.9
+
+
+def prompt_version(*templates: str) -> str:
+    """Short hash identifying the prompt text; part of every cache key."""
+    return hashlib.sha256("\0".join(templates).encode("utf-8")).hexdigest()[:16]
+
+
+class ResponseCache:
+    """
+    Thread-safe SQLite response cache. `get`/`put` take the payload sent to the
+    model; the provider, model and prompt version are fixed per cache instance.
+    """
+
+    def __init__(self, path, provider: str, model: str, prompt_hash: str, max_bytes: int = 512 * 1024 * 1024):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.provider = provider
+        self.model = model
+        self.prompt_hash = prompt_hash
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._db.commit()
+        self._total_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def key(self, payload: str) -> str:
+        normalized = " ".join(payload.split())
+        material = "\0".join((self.provider, self.model, self.prompt_hash, normalized))
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, payload: str) -> str | None:
+        """Returns the cached response text for `payload`, or None."""
+        key = self.key(payload)
+        with self._lock:
+            row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            return row[0]
+
+    def put(self, payload: str, response: str):
+        key = self.key(payload)
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, self.provider, self.model, self.prompt_hash, response, size, now, now))
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        target = self.max_bytes * EVICT_TO
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+        doomed = []
+        for key, size in rows:
+            if self._total_bytes <= target:
+                break
+            doomed.append((key,))
+            self._total_bytes -= size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    def describe(self) -> str:
+        lookups = self.hits + self.misses
+        hit_rate = f"{self.hits / lookups:.0%}" if lookups else "n/a"
+        return (f"{self.hits} hits, {self.misses} misses ({hit_rate} hit rate), {self.evictions} evicted, "
+                f"{self._total_bytes / 1024 / 1024:.1f}/{self.max_bytes / 1024 / 1024:.0f} MB used")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show what an enrichment response cache holds.")
+    parser.add_argument("cache_path", help="SQLite file, e.g. /app/data/progress/enrichment/response_cache.sqlite")
+    args = parser.parse_args()
+
+    db = sqlite3.connect(args.cache_path)
+    rows = db.execute("SELECT provider, model, prompt_hash, COUNT(*), SUM(size) FROM responses "
+                      "GROUP BY provider, model, prompt_hash ORDER BY provider, model").fetchall()
+    for provider, model, prompt_hash, count, size in rows:
+        print(f"{provider:8} {model:28} prompt {prompt_hash}: {count:7} responses, {size / 1024 / 1024:.1f} MB")
+    if not rows:
+        print("Cache is empty.")
@@ -0,0 +1,489 @@
+"""
+Validation and local repair of the model's structured output.
+
+Models answer with almost-right JSON more often than with no answer at all: the
+object wrapped in a ```json fence or a sentence of prose, a trailing comma, an
+answer cut off at the output limit, "persons" instead of "people", an entity
+without a sentiment. Instead of throwing such an answer away and paying for the
+whole prompt again, the enricher:
+
+1. `parse_json`: strips fences and surrounding text, drops trailing commas and
+   closes a truncated document after its last complete value. Objects the cut
+   went through are marked (`TRUNCATED_KEY`) so the member being written when the
+   output stopped is treated as missing rather than trusted half-written.
+2. `check_enrichment` / `check_second_pass`: maps known key aliases and shapes to
+   the schema (`summary`, `keywords`, `entities` with `people`, `organizations`
+   and `locations`, each `{name, wikidata_id, sentiment}`) and lists what is
+   still missing: whole fields, and entities without a valid sentiment.
+3. Only those are asked for again with a short follow-up prompt (`OutputCheck.merge`
+   takes the answer); sentiments still missing afterwards default to Neutral.
+   An answer that still lacks a field is discarded.
+
+Only an answer that cannot be parsed at all costs a full retry. The repairs are
+reported as `repair_<kind>` counters in the enricher's metrics.
+
+    python structured_output.py response.txt [--second-pass "Name" "Other name"]
+"""
+import argparse
+import json
+import re
+
+from entity_linker import ENTITY_TYPES
+from local_ner import DEFAULT_SENTIMENT
+
+# Marks an object that was still open where a truncated answer stopped
+TRUNCATED_KEY = "__truncated__"
+SENTIMENTS = {"positive": "Positive", "negative": "Negative", "neutral": "Neutral"}
+ENRICHMENT_FIELDS = ("summary", "keywords", "entities")
+SECOND_PASS_FIELDS = ("summary", "keywords")
+
+# Lower-cased, '_'-separated spellings seen in answers -> schema key
+FIELD_ALIASES = {
+    "summary": "summary", "abstract": "summary", "article_summary": "summary", "synopsis": "summary",
+    "keywords": "keywords", "key_words": "keywords", "keyphrases": "keywords", "key_phrases": "keywords",
+    "tags": "keywords", "topics": "keywords",
+    "entities": "entities", "named_entities": "entities", "entity": "entities", "ner": "entities",
+    "sentiment": "sentiment", "sentiments": "sentiment", "entity_sentiment": "sentiment",
+    "entity_sentiments": "sentiment",
+}
+ENTITY_TYPE_ALIASES = {
+    "people": "people", "person": "people", "persons": "people", "per": "people", "individuals": "people",
+    "organizations": "organizations", "organization": "organizations", "organisations": "organizations",
+    "organisation": "organizations", "orgs": "organizations", "org": "organizations",
+    "locations": "locations", "location": "locations", "places": "locations", "place": "locations",
+    "loc": "locations", "gpe": "locations",
+}
+ENTITY_NAME_KEYS = ("name", "entity", "text", "label", "entity_name")
+ENTITY_ID_KEYS = ("wikidata_id", "wikidata", "wikidataid", "wikidata_qid", "qid", "wiki_id", "id")
+ENTITY_SENTIMENT_KEYS = ("sentiment", "polarity", "tone")
+ENTITY_TYPE_KEYS = ("type", "entity_type", "category", "label_type")
+
+_FENCE_RE = re.compile(r"```[A-Za-z0-9_-]*[ \t]*\n?(.*?)(?:```|\Z)", re.S)
+_STRING_RE = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+_NUMBER_RE = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_LITERALS = ("true", "false", "null")
+_WIKIDATA_RE = re.compile(r"^Q\d+$")
+_KEYWORD_SPLIT_RE = re.compile(r"[,;\n]")
+_decoder = json.JSONDecoder()
+
+
+class OutputError(ValueError):
+    """The answer holds no JSON value that can be recovered."""
+
+
+def parse_json(text) -> tuple:
+    """
+    Parses a model answer and returns `(value, repairs)`, `repairs` naming what had
+    to be fixed ('code_fence', 'surrounding_text', 'trailing_comma', 'truncated').
+    Raises `OutputError` if nothing usable is left.
+    """
+    if not isinstance(text, str):
+        raise OutputError(f"expected text, got {type(text).__name__}")
+    try:
+        return json.loads(text), []
+    except ValueError:
+        pass
+
+    repairs = []
+    body = text.strip()
+    fence = _FENCE_RE.search(body)
+    if fence is not None:
+        body = fence.group(1).strip()
+        repairs.append("code_fence")
+    starts = [i for i in (body.find("{"), body.find("[")) if i != -1]
+    if not starts:
+        raise OutputError("no JSON object in the answer")
+    if min(starts) > 0:
+        repairs.append("surrounding_text")
+    body = body[min(starts):]
+    try:
+        value, end = _decoder.raw_decode(body)
+        if body[end:].strip() and "surrounding_text" not in repairs:
+            repairs.append("surrounding_text")
+        return value, repairs
+    except ValueError:
+        pass
+
+    repaired, kinds = _repair(body)
+    try:
+        value = json.loads(repaired)
+    except ValueError as e:
+        raise OutputError(f"unrecoverable JSON: {e}") from e
+    return value, repairs + kinds
+
+
+def _repair(body: str) -> tuple:
+    """
+    Rewrites `body` (text starting at a '{' or '[') as valid JSON: trailing commas
+    are dropped, and if the text stops early (or at a character that can't continue
+    it) it is cut after the last complete value and its open containers are closed.
+    """
+    out = []        # pieces of the repaired text
+    stack = []      # open containers: [bracket, expecting, members, out index of the pending comma]
+    safe = None     # (len(out), stack snapshot) after the last complete value
+    repairs = []
+    pos, length = 0, len(body)
+
+    def value_done():
+        nonlocal safe
+        if stack:
+            stack[-1][1] = "comma"
+            stack[-1][2] += 1
+            safe = (len(out), [frame[:] for frame in stack])
+
+    while pos < length:
+        char = body[pos]
+        if char in " \t\r\n":
+            pos += 1
+            continue
+        frame = stack[-1] if stack else None
+        if frame is None and out:
+            break  # the top-level value is complete; anything after it is not JSON
+        expecting = frame[1] if frame else "value"
+        if char in "}]":
+            closes = "{" if char == "}" else "["
+            if frame is None or frame[0] != closes or expecting in ("colon", "value") and frame[0] == "{":
+                break
+            if expecting in ("key", "value") and frame[2]:
+                del out[frame[3]]  # '{"a": 1,}' / '[1,]'
+                repairs.append("trailing_comma")
+            out.append(char)
+            stack.pop()
+            pos += 1
+            value_done()
+            if not stack:
+                safe = (len(out), [])
+            continue
+        if char == ",":
+            if expecting != "comma":
+                break
+            frame[1] = "key" if frame[0] == "{" else "value"
+            frame[3] = len(out)
+            out.append(char)
+            pos += 1
+            continue
+        if char == ":":
+            if expecting != "colon":
+                break
+            frame[1] = "value"
+            out.append(char)
+            pos += 1
+            continue
+        if expecting == "key":
+            match = _STRING_RE.match(body, pos)
+            if char != '"' or match is None:
+                break
+            out.append(match.group())
+            frame[1] = "colon"
+            pos = match.end()
+            continue
+        if expecting != "value":
+            break
+        if char in "{[":
+            out.append(char)
+            stack.append([char, "key" if char == "{" else "value", 0, None])
+            pos += 1
+            safe = (len(out), [f[:] for f in stack])
+            continue
+        if char == '"':
+            match = _STRING_RE.match(body, pos)
+            token = match.group() if match is not None else None
+        elif char == "-" or char.isdigit():
+            match = _NUMBER_RE.match(body, pos)
+            # A number at the very end may have lost digits
+            token = match.group() if match is not None and match.end() < length else None
+        else:
+            token = next((literal for literal in _LITERALS if body.startswith(literal, pos)), None)
+        if token is None:
+            break
+        out.append(token)
+        pos += len(token)
+        value_done()
+
+    if not stack and safe is not None and safe[1] == [] and pos >= length:
+        return "".join(out), repairs
+    if safe is None:
+        raise OutputError("the answer stops before its first complete value")
+    cut, open_frames = safe
+    if not open_frames:
+        return "".join(out[:cut]), repairs + ["surrounding_text"]
+    closing = []
+    for depth, frame in enumerate(reversed(open_frames)):
+        if frame[0] == "{":
+            # The innermost container ends right after a complete member; the ones
+            # around it were in the middle of writing the member that holds it
+            if depth > 0:
+                closing.append(f',"{TRUNCATED_KEY}":true')
+            closing.append("}")
+        else:
+            closing.append("]")
+    return "".join(out[:cut]) + "".join(closing), repairs + ["truncated"]
+
+
+def _key(name) -> str:
+    return re.sub(r"[\s\-]+", "_", str(name).strip()).lower()
+
+
+def normalize_sentiment(value) -> str | None:
+    """'positive ' -> 'Positive'; None for anything that is not a sentiment."""
+    return SENTIMENTS.get(str(value).strip().lower()) if isinstance(value, str) else None
+
+
+def _normalize_wikidata_id(value) -> str | None:
+    if not isinstance(value, str):
+        return None
+    value = value.strip().rsplit("/", 1)[-1].upper()  # also 'https://www.wikidata.org/wiki/Q123'
+    return value if _WIKIDATA_RE.match(value) else None
+
+
+def _pick(item: dict, keys: tuple):
+    """The value under the first of `keys` found in `item` (compared after `_key`), or None."""
+    normalized = {_key(k): v for k, v in item.items()}
+    return next((normalized[k] for k in keys if k in normalized), None)
+
+
+def _normalize_entity(item, repairs: list) -> dict | None:
+    if isinstance(item, str):
+        repairs.append("coerced_types")
+        item = {"name": item}
+    if not isinstance(item, dict):
+        return None
+    name = _pick(item, ENTITY_NAME_KEYS)
+    if not isinstance(name, str) or not name.strip():
+        return None
+    wikidata_id = _pick(item, ENTITY_ID_KEYS)
+    sentiment = _pick(item, ENTITY_SENTIMENT_KEYS)
+    if ("name" not in item or wikidata_id is not None and "wikidata_id" not in item
+            or sentiment is not None and "sentiment" not in item):
+        repairs.append("renamed_keys")
+    return {"name": name.strip(), "wikidata_id": _normalize_wikidata_id(wikidata_id),
+            "sentiment": normalize_sentiment(sentiment)}
+
+
+def _normalize_entities(value, repairs: list) -> dict | None:
+    """The `entities` field in schema form (sentiments may be None), or None if it can't be read."""
+    if isinstance(value, list):
+        # [{"name": ..., "type": "PERSON"}, ...]
+        grouped = {}
+        for item in value:
+            entity_type = _pick(item, ENTITY_TYPE_KEYS) if isinstance(item, dict) else None
+            entity_type = ENTITY_TYPE_ALIASES.get(_key(entity_type)) if isinstance(entity_type, str) else None
+            if entity_type is not None:
+                grouped.setdefault(entity_type, []).append(item)
+        if not grouped and value:
+            return None
+        repairs.append("coerced_types")
+        value = grouped
+    if not isinstance(value, dict):
+        return None
+    value = {k: v for k, v in value.items() if k != TRUNCATED_KEY}
+    entities = {entity_type: [] for entity_type in ENTITY_TYPES}
+    for key, items in value.items():
+        entity_type = ENTITY_TYPE_ALIASES.get(_key(key))
+        if entity_type is None:
+            continue  # e.g. MISC or DATE; not part of the schema
+        if key != entity_type:
+            repairs.append("renamed_keys")
+        if isinstance(items, (str, dict)):
+            repairs.append("coerced_types")
+            items = [items]
+        if not isinstance(items, list):
+            continue
+        for item in items:
+            entity = _normalize_entity(item, repairs)
+            if entity is not None:
+                entities[entity_type].append(entity)
+    return entities
+
+
+def _normalize_keywords(value, repairs: list) -> list | None:
+    if isinstance(value, str):
+        repairs.append("coerced_types")
+        value = _KEYWORD_SPLIT_RE.split(value)
+    if not isinstance(value, list):
+        return None
+    keywords = [keyword.strip() for keyword in value if isinstance(keyword, str) and keyword.strip()]
+    return keywords or None
+
+
+def _normalize_summary(value, repairs: list) -> str | None:
+    if isinstance(value, list) and all(isinstance(part, str) for part in value):
+        repairs.append("coerced_types")
+        value = " ".join(part.strip() for part in value)
+    return value.strip() if isinstance(value, str) and value.strip() else None
+
+
+def _normalize_sentiment_map(value, repairs: list) -> dict:
+    """`{"name": "Positive"}` (or a list of `{name, sentiment}`) -> `{name: sentiment}` with valid sentiments only."""
+    if isinstance(value, list):
+        repairs.append("coerced_types")
+        value = {_pick(item, ENTITY_NAME_KEYS): _pick(item, ENTITY_SENTIMENT_KEYS)
+                 for item in value if isinstance(item, dict)}
+    if not isinstance(value, dict):
+        return {}
+    sentiments = {}
+    for name, sentiment in value.items():
+        sentiment = normalize_sentiment(sentiment)
+        if isinstance(name, str) and sentiment is not None:
+            sentiments[name.strip()] = sentiment
+    return sentiments
+
+
+def _normalize_fields(value, repairs: list) -> dict:
+    """Reads every known field of an answer; absent or unreadable fields are None."""
+    if isinstance(value, list) and len(value) == 1 and isinstance(value[0], dict):
+        repairs.append("coerced_types")
+        value = value[0]
+    if not isinstance(value, dict):
+        return {"summary": None, "keywords": None, "entities": None, "sentiment": {}}
+    if TRUNCATED_KEY in value:
+        # The last member was being written when the answer stopped
+        value = {k: v for k, v in value.items() if k != TRUNCATED_KEY}
+        value.pop(next(reversed(value), None), None)
+    raw = {}
+    for key, item in value.items():
+        field = FIELD_ALIASES.get(_key(key))
+        if field is None or field in raw:
+            continue
+        if key != field:
+            repairs.append("renamed_keys")
+        raw[field] = item
+    return {
+        "summary": _normalize_summary(raw.get("summary"), repairs),
+        "keywords": _normalize_keywords(raw.get("keywords"), repairs),
+        "entities": _normalize_entities(raw.get("entities"), repairs) if "entities" in raw else None,
+        "sentiment": _normalize_sentiment_map(raw.get("sentiment"), repairs),
+    }
+
+
+class OutputCheck:
+    """
+    One answer checked against a schema: `value` holds what could be used, `missing`
+    the fields still needed and `unrated` the entity names without a valid sentiment.
+    `kind` is 'enrichment' (the full schema) or 'second_pass' (summary, keywords and
+    a `sentiment` map for the local NER provider's entities).
+    """
+
+    def __init__(self, kind: str, value: dict, missing: list, unrated: list, repairs: list):
+        self.kind = kind
+        self.value = value
+        self.missing = missing
+        self.unrated = unrated
+        self.repairs = sorted(set(repairs))
+
+    @property
+    def complete(self) -> bool:
+        return not self.missing and not self.unrated
+
+    def merge(self, answer) -> int:
+        """Fills missing fields and sentiments from a follow-up answer; returns how many were filled."""
+        fields = _normalize_fields(answer, [])
+        filled = 0
+        for field in list(self.missing):
+            if fields.get(field) is not None:
+                self.value[field] = fields[field]
+                self.missing.remove(field)
+                filled += 1
+                if field == "entities":
+                    self.unrated = _unrated_entities(self.value["entities"])
+        # A follow-up may rate entities in a sentiment map or repeat them with sentiments
+        sentiments = dict(fields["sentiment"])
+        for items in (fields["entities"] or {}).values():
+            for entity in items:
+                if entity["sentiment"] is not None:
+                    sentiments.setdefault(entity["name"], entity["sentiment"])
+        rated = {name.lower(): sentiment for name, sentiment in sentiments.items()}
+        for name in list(self.unrated):
+            sentiment = rated.get(name.lower())
+            if sentiment is not None:
+                self._rate(name, sentiment)
+                self.unrated.remove(name)
+                filled += 1
+        return filled
+
+    def _rate(self, name: str, sentiment: str):
+        if self.kind == "second_pass":
+            self.value["sentiment"][name] = sentiment
+            return
+        for items in self.value["entities"].values():
+            for entity in items:
+                if entity["name"] == name and entity["sentiment"] is None:
+                    entity["sentiment"] = sentiment
+
+    def result(self) -> dict | None:
+        """The answer in schema form, unrated entities defaulting to Neutral; None while a field is missing."""
+        if self.missing:
+            return None
+        for name in self.unrated:
+            self._rate(name, DEFAULT_SENTIMENT)
+        return self.value
+
+    def describe(self) -> str:
+        parts = [f"missing {', '.join(self.missing)}"] if self.missing else []
+        if self.unrated:
+            parts.append(f"{len(self.unrated)} entit(ies) without a sentiment")
+        if self.repairs:
+            parts.append(f"repaired: {', '.join(self.repairs)}")
+        return "; ".join(parts) or "complete"
+
+
+def _unrated_entities(entities: dict) -> list:
+    names = []
+    for items in entities.values():
+        for entity in items:
+            if entity["sentiment"] is None and entity["name"] not in names:
+                names.append(entity["name"])
+    return names
+
+
+def check_enrichment(answer) -> OutputCheck:
+    """Checks an answer (or one batch entry) against the full enrichment schema."""
+    repairs = []
+    fields = _normalize_fields(answer, repairs)
+    value = {field: fields[field] for field in ENRICHMENT_FIELDS if fields[field] is not None}
+    missing = [field for field in ENRICHMENT_FIELDS if field not in value]
+    unrated = _unrated_entities(value["entities"]) if "entities" in value else []
+    if unrated and fields["sentiment"]:
+        # Sentiments given in a separate map rather than on the entities
+        check = OutputCheck("enrichment", value, missing, unrated, repairs + ["renamed_keys"])
+        check.merge({"sentiment": fields["sentiment"]})
+        return check
+    return OutputCheck("enrichment", value, missing, unrated, repairs)
+
+
+def check_second_pass(answer, names: list) -> OutputCheck:
+    """Checks a second-pass answer: summary, keywords and a sentiment for each of `names`."""
+    repairs = []
+    fields = _normalize_fields(answer, repairs)
+    value = {field: fields[field] for field in SECOND_PASS_FIELDS if fields[field] is not None}
+    missing = [field for field in SECOND_PASS_FIELDS if field not in value]
+    rated = {name.lower(): sentiment for name, sentiment in fields["sentiment"].items()}
+    for items in (fields["entities"] or {}).values():
+        for entity in items:
+            if entity["sentiment"] is not None:
+                rated.setdefault(entity["name"].lower(), entity["sentiment"])
+    value["sentiment"] = {name: rated[name.lower()] for name in names if name.lower() in rated}
+    unrated = [name for name in dict.fromkeys(names) if name not in value["sentiment"]]
+    return OutputCheck("second_pass", value, missing, unrated, repairs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parse, repair and check a saved model answer.")
+    parser.add_argument("file", help="File holding the raw answer text.")
+    parser.add_argument("--second-pass", nargs="*", metavar="NAME",
+                        help="Check against the second-pass schema for these entity names.")
+    args = parser.parse_args()
+
+    with open(args.file, encoding="utf-8") as f:
+        text = f.read()
+    try:
+        parsed, parse_repairs = parse_json(text)
+    except OutputError as e:
+        parser.exit(1, f"❌ {e}\n")
+    if args.second_pass is not None:
+        checked = check_second_pass(parsed, args.second_pass)
+    else:
+        checked = check_enrichment(parsed)
+    checked.repairs = sorted(set(checked.repairs) | set(parse_repairs))
+    print(f"{'✅' if checked.complete else '⚠️ '} {checked.describe()}")
+    print(json.dumps(checked.value, indent=2, ensure_ascii=False))
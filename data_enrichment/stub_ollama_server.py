@@ -0,0 +1,197 @@
+"""
+A tiny stand-in for an Ollama server, for exercising the enricher without a GPU.
+
+Answers POST /api/chat (non-streaming) with a fixed, schema-valid enrichment after
+a configurable delay, and can inject failures. Like a real server it only works
+on `--slots` requests at once; extra requests queue, which shows up as latency.
+GET /stats returns request counts and the peak number of concurrent requests.
+Batched prompts get one canned entry per article_id; `--batch-drop-rate` leaves
+some out to exercise the enricher's individual retries. `--malformed-rate` answers
+with a code fence, a truncated document, renamed keys or missing fields, to
+exercise the enricher's local repairs and follow-ups (structured_output.py).
+
+    python stub_ollama_server.py --port 11435 --latency 0.5 --slots 4
+    OLLAMA_API_URL=http://localhost:11435 ENRICHMENT_PROVIDER=ollama python enricher.py
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_ENRICHMENT = {
+    "summary": "Stub summary of the article.",
+    "keywords": ["stub", "keyword"],
+    "entities": {
+        "people": [{"name": "Stub Person", "wikidata_id": None, "sentiment": "Neutral"}],
+        "organizations": [],
+        "locations": [{"name": "Islamabad", "wikidata_id": "Q1362", "sentiment": "Neutral"}],
+    },
+}
+
+# Matches the article ids that `build_batch_prompt` splices into a batched prompt
+BATCH_ARTICLE_ID = re.compile(r'\{"article_id": ("(?:[^"\\]|\\.)*")')
+
+
+def malformed(content: dict) -> str:
+    """`content` as JSON with one of the mistakes models make."""
+    text = json.dumps(content)
+    mistake = random.choice(("fence", "truncate", "rename", "no_sentiment", "no_summary"))
+    if mistake == "fence":
+        return f"```json\n{text}\n```"
+    if mistake == "truncate":
+        return text[:random.randint(len(text) // 2, len(text) - 1)]
+    results = content["results"] if "results" in content else [content]
+    for entry in results:
+        if mistake == "rename":
+            entry["entities"] = {"persons": entry["entities"]["people"], "organisations": [],
+                                 "places": entry["entities"]["locations"]}
+        elif mistake == "no_sentiment":
+            entry["entities"] = {entity_type: [{k: v for k, v in entity.items() if k != "sentiment"}
+                                               for entity in items]
+                                 for entity_type, items in entry["entities"].items()}
+        else:
+            entry.pop("summary", None)
+    return json.dumps(content)
+
+
+def canned_response(user_prompt: str, drop_rate: float) -> dict:
+    """The canned enrichment, or a `{"results": [...]}` list of them for a batched prompt."""
+    article_ids = [json.loads(match) for match in BATCH_ARTICLE_ID.findall(user_prompt)]
+    if not article_ids:
+        return CANNED_ENRICHMENT
+    return {"results": [dict(CANNED_ENRICHMENT, article_id=article_id)
+                        for article_id in article_ids if random.random() >= drop_rate]}
+
+
+class StubState:
+    """Counters shared by all handler threads."""
+
+    def __init__(self, latency: float, jitter: float, failure_rate: float, slots: int, batch_drop_rate: float = 0.0,
+                 malformed_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.batch_drop_rate = batch_drop_rate
+        self.malformed_rate = malformed_rate
+        self.slots = threading.BoundedSemaphore(slots)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.malformed = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    @contextmanager
+    def tracking(self):
+        """Counts a request as in flight for the duration of the block."""
+        with self.lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {"requests": self.requests, "failures": self.failures, "malformed": self.malformed,
+                    "in_flight": self.in_flight, "peak_in_flight": self.peak_in_flight}
+
+
+def make_handler(state: StubState):
+    class StubOllamaHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real server
+
+        def log_message(self, format, *args):
+            pass  # keep the console quiet under load
+
+        def _send_json(self, status: int, payload: dict):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self._send_json(200, state.snapshot())
+            else:
+                self._send_json(200, {"status": "Ollama stub is running"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if self.path != "/api/chat":
+                self._send_json(404, {"error": f"unknown endpoint {self.path}"})
+                return
+
+            with state.tracking():
+                with state.slots:
+                    time.sleep(max(0.0, state.latency + random.uniform(-state.jitter, state.jitter)))
+                if random.random() < state.failure_rate:
+                    with state.lock:
+                        state.failures += 1
+                    self._send_json(503, {"error": "server busy"})
+                    return
+                user_prompt = next((m.get("content", "") for m in request.get("messages", [])
+                                    if m.get("role") == "user"), "")
+                content = json.dumps(canned_response(user_prompt, state.batch_drop_rate))
+                if random.random() < state.malformed_rate:
+                    with state.lock:
+                        state.malformed += 1
+                    content = malformed(json.loads(content))
+                self._send_json(200, {
+                    "model": request.get("model", "stub"),
+                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "message": {"role": "assistant", "content": content},
+                    "done": True,
+                })
+
+    return StubOllamaHandler
+
+
+def start_stub_server(host: str = "127.0.0.1", port: int = 0, latency: float = 0.2, jitter: float = 0.0,
+                      failure_rate: float = 0.0, slots: int = 4, batch_drop_rate: float = 0.0,
+                      malformed_rate: float = 0.0):
+    """
+    Starts the stub in a background thread and returns `(server, state)`.
+    With `port=0` a free port is picked; read it from `server.server_address`.
+    Call `server.shutdown()` when done.
+    """
+    state = StubState(latency, jitter, failure_rate, slots, batch_drop_rate, malformed_rate)
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a stub Ollama server for enricher testing.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds spent on each request (default: 0.5).")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Random +/- seconds added to the latency.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fraction of requests answered with HTTP 503.")
+    parser.add_argument("--slots", type=int, default=4, help="Requests processed in parallel, like OLLAMA_NUM_PARALLEL.")
+    parser.add_argument("--batch-drop-rate", type=float, default=0.0,
+                        help="Fraction of articles left out of batched responses.")
+    parser.add_argument("--malformed-rate", type=float, default=0.0,
+                        help="Fraction of answers fenced, truncated, with renamed keys or missing fields.")
+    args = parser.parse_args()
+
+    server, state = start_stub_server(args.host, args.port, args.latency, args.jitter, args.failure_rate, args.slots,
+                                      args.batch_drop_rate, args.malformed_rate)
+    print(f"🧪 Stub Ollama listening on http://{args.host}:{server.server_address[1]} "
+          f"(latency={args.latency}s, slots={args.slots}, failure_rate={args.failure_rate})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        print(f"\nStats: {state.snapshot()}")
+        server.shutdown()
@@ -0,0 +1,88 @@
+"""
+Checks `async_engine.AsyncEnrichmentEngine` against `stub_ollama_server.py`.
+Run with: python -m pytest data_enrichment/test_enrichment
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("httpx")
+
+HERE = Path(__file__).resolve().parent
+
+sys.path.insert(0, str(HERE.parent))
+import async_engine  # noqa: E402
+from async_engine import AsyncEnrichmentEngine, OllamaAsyncProvider, run_bounded  # noqa: E402
+from stub_ollama_server import CANNED_ENRICHMENT, start_stub_server  # noqa: E402
+
+PROVIDER_CAP = 3
+
+
+@pytest.fixture
+def stub():
+    # More server slots than the cap, so the stub's peak shows what the engine sent
+    server, state = start_stub_server(port=0, latency=0.05, slots=4 * PROVIDER_CAP)
+    yield f"http://127.0.0.1:{server.server_address[1]}", state
+    server.shutdown()
+
+
+def enrich_all(base_url: str, jobs: int, initial_backoff: float = 2.0, max_retries: int = 3) -> list:
+    async def run():
+        provider = OllamaAsyncProvider(base_url, "stub", max_connections=PROVIDER_CAP)
+        engine = AsyncEnrichmentEngine(provider, "system prompt", PROVIDER_CAP,
+                                       max_retries=max_retries, initial_backoff=initial_backoff)
+        results = []
+
+        async def handle(job):
+            results.append(await engine.get_response(f"article {job}", label=str(job)))
+
+        try:
+            # More workers than provider slots, like the enricher's `engine.max_concurrency * 2`
+            await run_bounded(range(jobs), handle, PROVIDER_CAP * 3)
+        finally:
+            await engine.aclose()
+        return results
+
+    return asyncio.run(run())
+
+
+def test_in_flight_requests_never_exceed_the_provider_cap(stub):
+    base_url, state = stub
+    results = enrich_all(base_url, 20)
+
+    assert results == [CANNED_ENRICHMENT] * 20
+    assert state.snapshot()["requests"] == 20
+    assert state.snapshot()["peak_in_flight"] == PROVIDER_CAP
+
+
+def test_failed_requests_are_retried_with_jittered_backoff(stub, monkeypatch):
+    base_url, state = stub
+    state.failure_rate = 0.5
+    delays = []
+    backoff_delay = async_engine.backoff_delay
+
+    def recording_backoff(attempt, initial_backoff, max_backoff=60.0):
+        delay = backoff_delay(attempt, initial_backoff, max_backoff)
+        delays.append((attempt, delay))
+        return delay
+
+    monkeypatch.setattr(async_engine, "backoff_delay", recording_backoff)
+    results = enrich_all(base_url, 20, initial_backoff=0.01, max_retries=20)
+
+    snapshot = state.snapshot()
+    assert results == [CANNED_ENRICHMENT] * 20
+    assert snapshot["failures"] > 0
+    assert len(delays) == snapshot["failures"]
+    assert snapshot["peak_in_flight"] <= PROVIDER_CAP
+    assert all(0 <= delay <= 0.01 * 2 ** attempt for attempt, delay in delays)
+    assert len({delay for _, delay in delays}) > 1  # full jitter, not a fixed schedule
+
+
+def test_retries_give_up_after_max_retries(stub):
+    base_url, state = stub
+    state.failure_rate = 1.0
+
+    assert enrich_all(base_url, 2, initial_backoff=0.01, max_retries=3) == [None, None]
+    assert state.snapshot()["requests"] == 2 * 3
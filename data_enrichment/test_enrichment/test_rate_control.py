@@ -0,0 +1,177 @@
+"""
+Checks `rate_control.AdaptiveRateController` with a fake clock.
+Run with: python -m pytest data_enrichment/test_enrichment
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+HERE = Path(__file__).resolve().parent
+
+sys.path.insert(0, str(HERE.parent))
+import rate_control  # noqa: E402
+from rate_control import AdaptiveRateController, classify_error  # noqa: E402
+
+
+class FakeClock:
+    """Stands in for the `time` module: `sleep` advances `monotonic` and is recorded."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(rate_control, "time", clock)
+    return clock
+
+
+def send(controller: AdaptiveRateController, clock: FakeClock, latency: float = 0.5,
+         error: Exception = None, estimated_tokens: int = 0, tokens_used: int = None):
+    """One request through `controller` that takes `latency` seconds and fails with `error`, if given."""
+    try:
+        with controller.request(estimated_tokens) as ticket:
+            clock.advance(latency)
+            ticket.tokens_used = tokens_used
+            if error is not None:
+                raise error
+    except Exception as e:
+        if e is not error:
+            raise
+
+
+@pytest.mark.parametrize("error, outcome", [
+    (HTTPError(429), "congestion"),
+    (HTTPError(503), "congestion"),
+    (HTTPError(504), "timeout"),
+    (TimeoutError(), "timeout"),
+    (HTTPError(400), "error"),
+    (ValueError("bad JSON"), "error"),
+])
+def test_errors_are_classified(error: Exception, outcome: str):
+    assert classify_error(error) == outcome
+
+
+def test_successes_increase_limits_additively_up_to_the_caps(clock: FakeClock):
+    controller = AdaptiveRateController("test", 4, initial_rps=1, max_rps=3)
+    controller.limit = 1.0
+
+    send(controller, clock)
+    assert controller.limit == pytest.approx(2.0)
+    assert controller.rps == pytest.approx(2.0)
+    send(controller, clock)
+    assert controller.limit == pytest.approx(2.5)  # +1/limit: one slot per window of successes
+    assert controller.rps == pytest.approx(2.5)
+
+    for _ in range(50):
+        send(controller, clock)
+    assert controller.limit == 4
+    assert controller.rps == 3
+    assert controller.stats["ok"] == 52
+
+
+@pytest.mark.parametrize("error", [HTTPError(429), HTTPError(502), TimeoutError()])
+def test_congestion_and_timeouts_halve_the_limits(clock: FakeClock, error: Exception):
+    controller = AdaptiveRateController("test", 8, initial_rps=10, max_rps=10)
+
+    send(controller, clock, error=error)
+    assert controller.limit == 4
+    assert controller.rps == 5
+
+
+def test_one_decrease_per_round_trip(clock: FakeClock):
+    controller = AdaptiveRateController("test", 8, initial_rps=10, max_rps=10)
+    send(controller, clock, latency=2.0)  # latency EWMA: 2s
+
+    send(controller, clock, latency=0.1, error=HTTPError(429))
+    limit, rps = controller.limit, controller.rps
+    send(controller, clock, latency=0.1, error=HTTPError(429))  # same overload, 0.1s later
+    assert (controller.limit, controller.rps) == (limit, rps)
+
+    clock.advance(2.0)
+    send(controller, clock, latency=0.1, error=HTTPError(429))
+    assert controller.limit == pytest.approx(limit / 2)
+    assert controller.stats["congestion"] == 3
+
+
+def test_other_errors_leave_the_limits_alone(clock: FakeClock):
+    controller = AdaptiveRateController("test", 8, initial_rps=10, max_rps=10)
+
+    send(controller, clock, error=HTTPError(400))
+    assert (controller.limit, controller.rps) == (8, 10)
+    assert controller.stats["error"] == 1
+
+
+def test_latency_above_the_target_trims_the_limits(clock: FakeClock):
+    controller = AdaptiveRateController("test", 10, initial_rps=10, max_rps=10, target_latency=1.0)
+
+    send(controller, clock, latency=0.5)
+    assert controller.limit == 10
+    send(controller, clock, latency=3.0)
+    assert controller.limit == pytest.approx(9.0)
+    assert controller.rps == pytest.approx(9.0)
+
+
+def test_limits_never_drop_below_their_floors(clock: FakeClock):
+    controller = AdaptiveRateController("test", 2, initial_rps=0.1, max_rps=1, min_rps=0.05)
+
+    for _ in range(5):
+        clock.advance(10)
+        send(controller, clock, error=HTTPError(503))
+    assert controller.limit == 1
+    assert controller.rps == 0.05
+
+
+def test_request_rate_is_paced_by_the_token_bucket(clock: FakeClock):
+    controller = AdaptiveRateController("test", 8, initial_rps=2, max_rps=2)
+
+    for _ in range(4):
+        send(controller, clock, latency=0.0)
+    # The bucket holds 2 requests, then refills at 2 per second
+    assert clock.sleeps == [pytest.approx(0.5), pytest.approx(0.5)]
+
+
+def test_in_flight_limit_blocks_admission(clock: FakeClock):
+    controller = AdaptiveRateController("test", 2, initial_rps=100, max_rps=100)
+
+    assert controller._try_admit(0) >= 0
+    assert controller._try_admit(0) >= 0
+    assert controller._try_admit(0) == -1
+
+
+def test_tokens_per_minute_budget(clock: FakeClock):
+    controller = AdaptiveRateController("test", 8, initial_rps=100, max_rps=100, tokens_per_minute=600)
+
+    send(controller, clock, latency=0.0, estimated_tokens=600)
+    assert clock.sleeps == []
+    # The budget is spent and refills at 10 tokens/s
+    send(controller, clock, latency=0.0, estimated_tokens=300)
+    assert clock.sleeps == [pytest.approx(30.0)]
+
+
+def test_reported_usage_corrects_the_budget(clock: FakeClock):
+    controller = AdaptiveRateController("test", 8, initial_rps=100, max_rps=100, tokens_per_minute=600)
+
+    # Estimated 600, but the provider reports only 300: the difference is credited back
+    send(controller, clock, latency=0.0, estimated_tokens=600, tokens_used=300)
+    send(controller, clock, latency=0.0, estimated_tokens=300)
+    assert clock.sleeps == []
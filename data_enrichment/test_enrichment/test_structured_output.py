@@ -0,0 +1,218 @@
+"""
+Checks the parsing, repair and schema checks in `structured_output.py`.
+Run with: python -m pytest data_enrichment/test_enrichment
+"""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+HERE = Path(__file__).resolve().parent
+
+sys.path.insert(0, str(HERE.parent))
+from structured_output import (TRUNCATED_KEY, OutputError, check_enrichment, check_second_pass,  # noqa: E402
+                               parse_json)
+
+ANSWER = {
+    "summary": "The cabinet approved the budget.",
+    "keywords": ["budget", "cabinet", "economy"],
+    "entities": {
+        "people": [{"name": "Shehbaz Sharif", "wikidata_id": "Q1369519", "sentiment": "Positive"}],
+        "organizations": [{"name": "IMF", "wikidata_id": None, "sentiment": "Neutral"}],
+        "locations": [{"name": "Islamabad", "wikidata_id": "Q1362", "sentiment": "Neutral"},
+                      {"name": "Karachi", "wikidata_id": "Q8660", "sentiment": "Negative"}],
+    },
+}
+ANSWER_TEXT = json.dumps(ANSWER, indent=2)
+
+
+# --- parse_json ---
+
+def test_valid_json_needs_no_repairs():
+    assert parse_json(ANSWER_TEXT) == (ANSWER, [])
+
+
+@pytest.mark.parametrize("text", [
+    f"```json\n{ANSWER_TEXT}\n```",
+    f"```\n{ANSWER_TEXT}\n```",
+    f"```JSON {ANSWER_TEXT}```",
+    f"Here is the analysis:\n```json\n{ANSWER_TEXT}\n```\nLet me know if you need more.",
+    f"```json\n{ANSWER_TEXT}",  # the closing fence was cut off
+])
+def test_code_fences_are_stripped(text: str):
+    value, repairs = parse_json(text)
+    assert value == ANSWER
+    assert "code_fence" in repairs
+
+
+def test_surrounding_prose_is_dropped():
+    value, repairs = parse_json(f"Sure! {ANSWER_TEXT} Hope this helps.")
+    assert value == ANSWER
+    assert repairs == ["surrounding_text"]
+
+
+def test_trailing_commas_are_dropped():
+    value, repairs = parse_json('{"summary": "S", "keywords": ["a", "b",], "entities": {},}')
+    assert value == {"summary": "S", "keywords": ["a", "b"], "entities": {}}
+    assert repairs == ["trailing_comma", "trailing_comma"]
+
+
+@pytest.mark.parametrize("text", ["", "I could not find any entities.", "```json\n```", "Entities: none (see above)."])
+def test_answers_without_a_complete_value_raise(text: str):
+    with pytest.raises(OutputError):
+        parse_json(text)
+
+
+def test_a_cut_answer_keeps_complete_members_and_marks_the_open_ones():
+    text = '{"summary": "S", "keywords": ["a", "b"], "entities": {"people": [{"name": "X", "sent'
+    value, repairs = parse_json(text)
+
+    assert repairs == ["truncated"]
+    assert value == {"summary": "S", "keywords": ["a", "b"],
+                     "entities": {"people": [{"name": "X"}], TRUNCATED_KEY: True}, TRUNCATED_KEY: True}
+
+
+@pytest.mark.parametrize("text", [ANSWER_TEXT, json.dumps(ANSWER), json.dumps(dict(reversed(ANSWER.items())))])
+def test_truncation_at_every_offset_never_trusts_a_half_written_field(text: str):
+    for cut in range(len(text)):
+        try:
+            value, _ = parse_json(text[:cut])
+        except OutputError:
+            continue
+        checked = check_enrichment(value)
+        for field, kept in checked.value.items():
+            assert kept == ANSWER[field], f"cut at {cut}: {field} = {kept!r}"
+        assert checked.missing == [f for f in ("summary", "keywords", "entities") if f not in checked.value]
+        assert checked.unrated == []
+    assert check_enrichment(parse_json(text)[0]).complete
+
+
+def test_a_cut_inside_the_first_member_leaves_an_empty_object():
+    value, repairs = parse_json('{"summary": "The cab')
+    assert (value, repairs) == ({}, ["truncated"])
+    assert check_enrichment(value).missing == ["summary", "keywords", "entities"]
+
+
+def test_a_number_at_the_cut_is_not_trusted():
+    # The innermost object ends after its last complete member, so it needs no marker
+    assert parse_json('{"keywords": ["a"], "count": 12') == ({"keywords": ["a"]}, ["truncated"])
+
+
+# --- check_enrichment ---
+
+def test_a_complete_answer_passes_unchanged():
+    checked = check_enrichment(ANSWER)
+    assert checked.complete
+    assert checked.repairs == []
+    assert checked.result() == ANSWER
+
+
+def test_field_and_entity_type_aliases_are_mapped():
+    checked = check_enrichment({
+        "Abstract": "The cabinet approved the budget.",
+        "key_words": "budget, cabinet; economy",
+        "named_entities": {
+            "persons": [{"entity": "Shehbaz Sharif", "QID": "Q1369519", "polarity": "positive"}],
+            "ORG": "IMF",
+            "places": [{"name": "Islamabad", "wikidata": "https://www.wikidata.org/wiki/Q1362", "tone": "neutral"},
+                       {"name": "Karachi", "wikidata_id": "q8660", "sentiment": "NEGATIVE"}],
+            "misc": [{"name": "Budget 2025"}],
+        },
+    })
+
+    assert checked.missing == []
+    assert checked.unrated == ["IMF"]
+    assert checked.value["summary"] == ANSWER["summary"]
+    assert checked.value["keywords"] == ANSWER["keywords"]
+    assert checked.value["entities"]["people"] == ANSWER["entities"]["people"]
+    assert checked.value["entities"]["locations"] == ANSWER["entities"]["locations"]
+    assert checked.repairs == ["coerced_types", "renamed_keys"]
+
+
+def test_typed_entity_lists_are_grouped():
+    checked = check_enrichment(dict(ANSWER, entities=[
+        {"name": "Shehbaz Sharif", "type": "PERSON", "sentiment": "Positive", "wikidata_id": "Q1369519"},
+        {"name": "IMF", "entity_type": "Organization", "sentiment": "Neutral"},
+        {"name": "Islamabad", "type": "GPE", "sentiment": "Neutral", "wikidata_id": "Q1362"},
+        {"name": "Karachi", "type": "LOC", "sentiment": "Negative", "wikidata_id": "Q8660"},
+    ]))
+    assert checked.complete
+    assert checked.value["entities"] == ANSWER["entities"]
+
+
+def test_missing_sentiments_are_listed_then_default_to_neutral():
+    entities = {entity_type: [{k: v for k, v in entity.items() if k != "sentiment"} for entity in items]
+                for entity_type, items in ANSWER["entities"].items()}
+    checked = check_enrichment(dict(ANSWER, entities=entities))
+
+    assert checked.missing == []
+    assert checked.unrated == ["Shehbaz Sharif", "IMF", "Islamabad", "Karachi"]
+    assert checked.merge({"sentiment": {"shehbaz sharif": "Positive", "Karachi": "negative", "IMF": "maybe"}}) == 2
+    assert checked.unrated == ["IMF", "Islamabad"]
+    result = checked.result()
+    assert [e["sentiment"] for items in result["entities"].values() for e in items] == \
+        ["Positive", "Neutral", "Neutral", "Negative"]
+
+
+def test_a_separate_sentiment_map_rates_the_entities():
+    entities = {"people": [{"name": "Shehbaz Sharif"}], "organizations": [], "locations": []}
+    checked = check_enrichment(dict(ANSWER, entities=entities, sentiments={"Shehbaz Sharif": "Positive"}))
+
+    assert checked.complete
+    assert checked.value["entities"]["people"][0]["sentiment"] == "Positive"
+
+
+def test_missing_fields_are_listed_for_the_follow_up():
+    checked = check_enrichment({"keywords": [], "entities": {"people": "Shehbaz Sharif"}})
+
+    assert checked.missing == ["summary", "keywords"]  # an empty keyword list has to be asked for again
+    assert checked.unrated == ["Shehbaz Sharif"]
+    assert checked.result() is None
+    assert "missing summary, keywords" in checked.describe()
+
+    filled = checked.merge({"summary": ["Part one.", "Part two."], "keywords": ["budget"],
+                            "entities": {"people": [{"name": "Shehbaz Sharif", "sentiment": "Negative"}]}})
+    assert filled == 3
+    assert checked.complete
+    assert checked.result()["summary"] == "Part one. Part two."
+
+
+def test_a_follow_up_that_still_lacks_a_field_leaves_it_missing():
+    checked = check_enrichment({"summary": "S"})
+    assert checked.merge({"keywords": ["a"]}) == 1
+    assert checked.missing == ["entities"]
+    assert checked.result() is None
+
+
+def test_a_single_entry_list_is_unwrapped():
+    checked = check_enrichment([ANSWER])
+    assert checked.complete
+    assert checked.repairs == ["coerced_types"]
+
+
+def test_non_objects_are_missing_everything():
+    assert check_enrichment("just text").missing == ["summary", "keywords", "entities"]
+
+
+# --- check_second_pass ---
+
+def test_second_pass_collects_sentiments_for_the_given_names():
+    checked = check_second_pass({"summary": "S", "keywords": ["a"],
+                                 "entity_sentiments": [{"name": "imran khan", "sentiment": "Negative"}],
+                                 "entities": {"locations": [{"name": "Lahore", "sentiment": "Positive"}]}},
+                                ["Imran Khan", "Lahore", "PTI"])
+
+    assert checked.missing == []
+    assert checked.value["sentiment"] == {"Imran Khan": "Negative", "Lahore": "Positive"}
+    assert checked.unrated == ["PTI"]
+    assert checked.result()["sentiment"] == {"Imran Khan": "Negative", "Lahore": "Positive", "PTI": "Neutral"}
+
+
+def test_second_pass_follow_up_fills_summary_and_sentiments():
+    checked = check_second_pass({"keywords": ["a"]}, ["PTI"])
+    assert checked.missing == ["summary"]
+
+    assert checked.merge({"summary": "S", "sentiment": {"pti": "Positive"}}) == 2
+    assert checked.complete
+    assert checked.result() == {"keywords": ["a"], "summary": "S", "sentiment": {"PTI": "Positive"}}
@@ -0,0 +1,121 @@
+"""
+Checks `work_journal.WorkJournal`: replay, resuming and the retry schedule.
+Run with: python -m pytest data_enrichment/test_enrichment
+"""
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+HERE = Path(__file__).resolve().parent
+
+sys.path.insert(0, str(HERE.parent))
+import work_journal  # noqa: E402
+from work_journal import MAX_RETRY_DELAY, WorkJournal  # noqa: E402
+
+ITEMS = ["2025/03/01/a.json", "2025/03/01/b.json", "2025/03/02/c.json"]
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1_750_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeTime:
+    clock = FakeTime()
+    monkeypatch.setattr(work_journal, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def path(tmp_path: Path) -> Path:
+    return tmp_path / "journal.jsonl"
+
+
+def killed_run(path: Path) -> None:
+    """A run that planned ITEMS, finished the first one and died."""
+    journal = WorkJournal(path)
+    journal.start("app", ITEMS)
+    journal.record_done("app", ITEMS[0])
+    journal.close(finished=False)
+
+
+def test_an_unfinished_run_is_resumed_without_listing(path: Path, clock: FakeTime):
+    killed_run(path)
+
+    journal = WorkJournal(path)
+    assert journal.resuming
+    assert journal.resume("app") == ITEMS[1:]
+    assert journal.resume("dawn") is None  # not planned: the run lists it as usual
+    journal.close()
+
+
+def test_replay_ignores_a_torn_last_line(path: Path, clock: FakeTime):
+    killed_run(path)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"event": "done", "source": "app", "item": "2025/03/01/b.js')
+
+    journal = WorkJournal(path)
+    assert journal.resume("app") == ITEMS[1:]
+    journal.record_done("app", ITEMS[1])
+    journal.close(finished=False)
+    # Events appended after the torn line still replay
+    assert WorkJournal(path, writable=False).resume("app") == ITEMS[2:]
+
+
+def test_a_finished_run_compacts_to_outstanding_failures(path: Path, clock: FakeTime):
+    journal = WorkJournal(path)
+    journal.start("app", ITEMS)
+    journal.record_done("app", ITEMS[0])
+    journal.record_failure("app", ITEMS[1], "no enrichment data from the model")
+    journal.close()
+
+    journal = WorkJournal(path)
+    assert not journal.resuming
+    assert journal.resume("app") is None
+    lines = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [(e["event"], e["item"]) for e in lines] == [("failed", ITEMS[1])]
+    journal.close()
+
+
+def test_failures_back_off_4x_up_to_a_day(path: Path, clock: FakeTime):
+    journal = WorkJournal(path, retry_minutes=30)
+    delays = []
+    for _ in range(6):
+        journal.record_failure("app", ITEMS[0], "HTTP 503")
+        delays.append(journal.failures[("app", ITEMS[0])]["retry_at"] - clock.now)
+    journal.close()
+
+    assert delays == [1800, 7200, 28800, MAX_RETRY_DELAY, MAX_RETRY_DELAY, MAX_RETRY_DELAY]
+    assert WorkJournal(path, writable=False).failures[("app", ITEMS[0])]["attempts"] == 6
+
+
+def test_failures_are_planned_only_once_due(path: Path, clock: FakeTime):
+    journal = WorkJournal(path, retry_minutes=30)
+    journal.record_failure("app", ITEMS[1], "HTTP 503")
+
+    assert journal.start("app", ITEMS) == [ITEMS[0], ITEMS[2]]
+    clock.now += 1800
+    assert journal.start("app", ITEMS) == ITEMS
+    journal.record_done("app", ITEMS[1])
+    assert ("app", ITEMS[1]) not in journal.failures
+    journal.close()
+
+
+def test_skipped_articles_are_done_and_never_scheduled(path: Path, clock: FakeTime):
+    journal = WorkJournal(path)
+    journal.start("app", ITEMS)
+    journal.record_failure("app", ITEMS[1], "corrupted JSON input")
+    journal.record_skipped("app", ITEMS[1], "article body is empty or too short")
+    journal.close(finished=False)
+
+    journal = WorkJournal(path)
+    assert journal.resume("app") == [ITEMS[0], ITEMS[2]]
+    assert not journal.failures
+    journal.close()
+    assert not WorkJournal(path, writable=False).failures
@@ -0,0 +1,188 @@
+"""
+Append-only journal of the enricher's work, for resuming runs and retrying failures.
+
+Each run appends JSON lines to `<output>/progress/enrichment/journal.jsonl`:
+
+    {"event": "plan", "source": "app", "items": ["2025/03/01/<id>.json", ...], "at": ...}
+    {"event": "done", "source": "app", "item": "2025/03/01/<id>.json", "at": ...}
+    {"event": "failed", "source": "app", "item": "...", "attempts": 2, "retry_at": ..., "error": "...", "at": ...}
+    {"event": "skipped", "source": "app", "item": "...", "reason": "...", "at": ...}
+    {"event": "end", "at": ...}
+
+A run that stops before its `end` line (a killed container, a crash) is resumed by
+the next one: each source's plan minus the items already done is the work list, so
+no directory has to be listed again. Articles planned after the crash are picked up
+by the run after that, which lists the trees as usual.
+
+A failed article is retried on a schedule rather than on every run: after the n-th
+failure it waits `retry_minutes * 4^(n-1)`, capped at a day. It stays in the journal
+until it succeeds, so nothing is dropped. An article that can never be enriched
+(e.g. an empty body) is recorded as skipped instead: it counts as done for the
+run, and is not retried on a schedule. When a run starts cleanly, the journal is
+compacted to the failures still outstanding.
+
+    python work_journal.py /app/data/progress/enrichment/journal.jsonl
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+MAX_RETRY_DELAY = 24 * 3600  # seconds
+
+
+class WorkJournal:
+    """
+    Thread-safe journal; every event is flushed as soon as it is recorded. With
+    `writable=False` the journal is only read (no compaction, nothing appended).
+    """
+
+    def __init__(self, path, retry_minutes: float = 30, writable: bool = True):
+        self.path = Path(path)
+        self.retry_seconds = retry_minutes * 60
+        self._lock = threading.Lock()
+        self.plans: dict[str, list[str]] = {}  # of the unfinished run, per source
+        self.done: dict[str, set[str]] = {}
+        self.failures: dict[tuple[str, str], dict] = {}
+        self.resuming = False
+        self._file = None
+        self._replay()
+        if not writable:
+            return
+        if not self.resuming:
+            self._compact()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        torn = self._ends_mid_line()
+        self._file = open(self.path, "a", encoding="utf-8")
+        if torn:
+            # End the killed run's partial line, or the next event would be glued onto it and lost
+            self._file.write("\n")
+            self._file.flush()
+
+    def _ends_mid_line(self) -> bool:
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    return False
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) != b"\n"
+        except FileNotFoundError:
+            return False
+
+    def _replay(self):
+        try:
+            f = open(self.path, "r", encoding="utf-8")
+        except FileNotFoundError:
+            return
+        with f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # partially written line from a killed run
+                kind = event.get("event")
+                if kind == "plan":
+                    self.plans[event["source"]] = event["items"]
+                    self.done[event["source"]] = set()
+                    self.resuming = True
+                elif kind in ("done", "skipped"):
+                    self.done.setdefault(event["source"], set()).add(event["item"])
+                    self.failures.pop((event["source"], event["item"]), None)
+                elif kind == "failed":
+                    self.failures[(event["source"], event["item"])] = event
+                elif kind == "end":
+                    self.plans.clear()
+                    self.done.clear()
+                    self.resuming = False
+
+    def _compact(self):
+        """Rewrites the journal as just the outstanding failures."""
+        if not self.path.exists():
+            return
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for event in self.failures.values():
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+
+    def _append(self, event: dict):
+        event["at"] = round(time.time(), 3)
+        line = json.dumps(event, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def resume(self, source: str) -> list[str] | None:
+        """The items of `source` left over from an unfinished run, or None if there is none."""
+        if source not in self.plans:
+            return None
+        done = self.done.get(source, set())
+        return [item for item in self.plans[source] if item not in done and self.is_due(source, item)]
+
+    def start(self, source: str, items: list[str]) -> list[str]:
+        """Records the work list of `source`; returns it without the failures that aren't due yet."""
+        due = [item for item in items if self.is_due(source, item)]
+        with self._lock:
+            self.plans[source] = due
+            self.done[source] = set()
+        self._append({"event": "plan", "source": source, "items": due})
+        return due
+
+    def is_due(self, source: str, item: str) -> bool:
+        failure = self.failures.get((source, item))
+        return failure is None or failure["retry_at"] <= time.time()
+
+    def record_done(self, source: str, item: str):
+        with self._lock:
+            self.done.setdefault(source, set()).add(item)
+            self.failures.pop((source, item), None)
+        self._append({"event": "done", "source": source, "item": item})
+
+    def record_skipped(self, source: str, item: str, reason: str):
+        """Like `record_done`, for an article there is nothing to enrich in; it is never retried."""
+        with self._lock:
+            self.done.setdefault(source, set()).add(item)
+            self.failures.pop((source, item), None)
+        self._append({"event": "skipped", "source": source, "item": item, "reason": reason[:500]})
+
+    def record_failure(self, source: str, item: str, error: str):
+        with self._lock:
+            previous = self.failures.get((source, item))
+            attempts = previous["attempts"] + 1 if previous else 1
+            delay = min(self.retry_seconds * 4 ** (attempts - 1), MAX_RETRY_DELAY)
+            event = {"event": "failed", "source": source, "item": item, "attempts": attempts,
+                     "retry_at": round(time.time() + delay, 3), "error": error[:500]}
+            self.failures[(source, item)] = event
+        self._append(dict(event))
+
+    def close(self, finished: bool = True):
+        """Appends the `end` marker (unless the run didn't finish) and closes the file."""
+        if finished:
+            self._append({"event": "end"})
+        with self._lock:
+            self._file.close()
+
+    def describe(self) -> str:
+        now = time.time()
+        due = sum(1 for failure in self.failures.values() if failure["retry_at"] <= now)
+        return f"{len(self.failures)} failed article(s) awaiting retry ({due} due now)"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize the enricher's work journal.")
+    parser.add_argument("journal", help="Path to journal.jsonl.")
+    args = parser.parse_args()
+
+    journal = WorkJournal(args.journal, writable=False)
+    if journal.resuming:
+        for source, items in journal.plans.items():
+            print(f"Unfinished run: {source} {len(journal.done.get(source, ()))}/{len(items)} done")
+    print(journal.describe())
+    for failure in sorted(journal.failures.values(), key=lambda f: f["retry_at"]):
+        retry_at = datetime.fromtimestamp(failure["retry_at"], timezone.utc).isoformat(timespec="minutes")
+        print(f"  {failure['source']}/{failure['item']}: {failure['attempts']} attempt(s), "
+              f"next {retry_at}: {failure['error']}")
@@ -24,4 +24,12 @@ node scrape_articles_app.js --fromDate "$TODAY" --toDate "$TODAY"
 echo "🔄 [4/5] Refetching null content..."
 node scripts/refetch_null_content.js --source both --dates "$TODAY"
 
+# Hand today's article folders to the cleaner so it can skip the full directory walk
+CHANGED_PATHS_FILE="data/progress/cleaner/changed_paths.txt"
+mkdir -p "$(dirname "$CHANGED_PATHS_FILE")"
+DAY_PATH="$(echo "$TODAY" | tr '-' '/')"
+for SOURCE in dawn app; do
+  echo "$SOURCE/articles/$DAY_PATH" >> "$CHANGED_PATHS_FILE"
+done
+
 echo "✅ Scraping pipeline complete for $TODAY!"
\ No newline at end of file
@@ -2,6 +2,7 @@ const fs = require('fs-extra')
 const path = require('path')
 const dayjs = require('dayjs')
 const { newPage, closeBrowser } = require('../utils/browser')
+const { replaceJSON } = require('../utils/helpers')
 
 const DATA_DIR = path.join(__dirname, '../data')
 const PROGRESS_DIR = path.join(DATA_DIR, 'progress/refetch_nulls')
@@ -206,7 +207,7 @@ async function refetchArticleContent(filePath, source, maxRetries, dryRun) {
         article.refetched = true
         article.refetchedAt = new Date().toISOString()
         
-        await fs.writeJson(filePath, article, { spaces: 2 })
+        await replaceJSON(filePath, article)
         console.log(`[${now()}] ✅ Updated: ${path.basename(filePath)}`)
         
         // Close page immediately after successful update
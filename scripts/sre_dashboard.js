@@ -358,6 +358,16 @@ async function handleApi(req, res, pathname) {
     }
   }
 
+  // --- Pipeline metrics (written by the cleaner and enricher, see data_common/stage_metrics.py) ---
+  if (pathname === '/api/metrics' && req.method === 'GET') {
+    try {
+      const stages = await loadStageMetrics()
+      return send(res, 200, { stages })
+    } catch (e) {
+      return send(res, 500, { error: e.message })
+    }
+  }
+
   const runMatch = pathname.match(/^\/api\/runs\/([^\/]+)$/)
   if (runMatch && req.method === 'GET') {
     const runId = runMatch[1]
@@ -405,6 +415,21 @@ async function handleApi(req, res, pathname) {
 const DATA_ROOT = path.join(ROOT, '..', 'data')
 const APP_ARTICLES_DIR = path.join(DATA_ROOT, 'app', 'articles')
 const DAWN_ARTICLES_DIR = path.join(DATA_ROOT, 'dawn', 'articles')
+const METRICS_DIR = process.env.METRICS_DIR || path.join(DATA_ROOT, 'progress', 'metrics')
+
+async function loadStageMetrics() {
+  if (!(await fs.pathExists(METRICS_DIR))) return []
+  const files = (await fs.readdir(METRICS_DIR)).filter((f) => f.endsWith('.json')).sort()
+  const stages = []
+  for (const f of files) {
+    try {
+      stages.push(await fs.readJson(path.join(METRICS_DIR, f)))
+    } catch {
+      // skip a snapshot that is being replaced
+    }
+  }
+  return stages
+}
 
 async function scanDirForBad(dir, sourceHint) {
   const files = []
@@ -564,6 +589,10 @@ pre { white-space: pre-wrap; background:#0b1220; border:1px solid #1f2937; paddi
     </div>
     <div id="badList" class="list"></div>
   </section>
+  <section class="card">
+    <h3>Pipeline metrics</h3>
+    <div id="metrics"><small>loading…</small></div>
+  </section>
   <section class="card">
     <h3>Run details</h3>
     <div id="detail"></div>
@@ -645,6 +674,32 @@ async function loadBad(){
   }
 }
 
+function ms(seconds){ return seconds === null || seconds === undefined ? '' : (seconds * 1000).toFixed(2); }
+
+async function loadMetrics(){
+  try {
+    const r = await fetchJSON('/api/metrics');
+    const stages = r.stages || [];
+    if (!stages.length){ $('#metrics').innerHTML = '<small>No metrics yet. They appear once the cleaner or enricher runs.</small>'; return; }
+    $('#metrics').innerHTML = stages.map(function(st){
+      const phases = Object.keys(st.phases||{}).map(function(name){
+        const h = st.phases[name];
+        return \`<tr><td>\${name}</td><td>\${h.count}</td><td>\${ms(h.mean)}</td><td>\${ms(h.p95)}</td><td>\${ms(h.max)}</td></tr>\`;
+      }).join('');
+      const counters = Object.keys(st.counters||{}).map(function(name){ return \`\${name}: \${st.counters[name]}\`; }).join(' • ');
+      return \`
+      <div style="margin-bottom:12px">
+        <div><strong>\${st.stage}</strong> — \${st.files} files, \${st.files_per_second||0}/s <small>(updated \${st.updated_at})</small></div>
+        <table class="mono" style="font-size:12px; width:100%"><tr><th align="left">phase</th><th>calls</th><th>mean ms</th><th>p95 ms</th><th>max ms</th></tr>\${phases}</table>
+        <div class="mono" style="font-size:12px;color:#9ca3af">\${counters}</div>
+      </div>\`;
+    }).join('');
+  } catch (e) {
+    console.error('Failed to load metrics', e);
+    $('#metrics').innerHTML = '<small>(failed to load metrics)</small>';
+  }
+}
+
 async function retryBad(filePath){
   const res = await fetch('/api/bad-articles/retry', { method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify({ filePath }) });
   if (!res.ok){ const t = await res.text(); alert('Failed to retry: ' + t); return; }
@@ -725,7 +780,9 @@ document.getElementById('retryAllBad').addEventListener('click', retryAllBad);
 loadPresets();
 loadRuns();
 loadBad();
+loadMetrics();
 setInterval(loadRuns, 4000);
+setInterval(loadMetrics, 5000);
 </script>
 </body>
 </html>`
@@ -3,7 +3,7 @@ const fs = require('fs-extra')
 const path = require('path')
 const dayjs = require('dayjs')
 const { normalizeListArray, normalizeArticle } = require('../utils/schema')
-const { walk } = require('../utils/helpers')
+const { walk, replaceJSON } = require('../utils/helpers')
 
 const ROOT = path.join(__dirname, '..')
 const DATA = path.join(ROOT, 'data')
@@ -31,7 +31,7 @@ async function normalizeArticleFile(file) {
     return { removed: true }
   }
   const norm = normalizeArticle(obj)
-  await fs.writeJson(file, norm, { spaces: 2 })
+  await replaceJSON(file, norm)
   return { ok: true }
 }
 
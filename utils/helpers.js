@@ -82,6 +82,19 @@ async function saveJSON(filePath, data) {
   await fs.writeJson(filePath, data, { spaces: 2 })
 }
 
+/**
+ * Rewrites an existing JSON file through a temp file + rename. Replacing the file
+ * (rather than truncating it) updates its directory's mtime, which is how the
+ * pipeline's cached directory listings notice re-fetched articles.
+ * @param {string} filePath - The path to the file.
+ * @param {object} data - The JSON data to write.
+ */
+async function replaceJSON(filePath, data) {
+  const tmpPath = `${filePath}.${process.pid}.tmp`
+  await fs.writeJson(tmpPath, data, { spaces: 2 })
+  await fs.rename(tmpPath, filePath)
+}
+
 /**
  * Normalize and sanitize text content for UTF-8 safety and reduced formatting issues.
  * @param {string} text - The text to sanitize.
@@ -175,6 +188,7 @@ module.exports = {
   chunkArray,
   readJSON,
   saveJSON,
+  replaceJSON,
   sanitizeContent,
   isArticleContentMissing,
   walk,